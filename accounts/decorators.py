@@ -1,45 +1,50 @@
 from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.shortcuts import redirect
 from django.contrib import messages
 
 
-def citizen_required(view_func):
-    """Decorator to restrict access to citizen users only"""
+def _denied(request, has_role):
+    """Redirect to the login page unless the user is signed in with the role"""
+    if not request.user.is_authenticated:
+        messages.error(request, 'You must be logged in to access this page.')
+        return redirect('login')
+    if not has_role(request.user):
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('login')
+    return None
+
+
+def _role_required(view_func, has_role):
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            # Loading the user from the session queries the database
+            response = await sync_to_async(_denied)(request, has_role)
+            if response is not None:
+                return response
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            messages.error(request, 'You must be logged in to access this page.')
-            return redirect('login')
-        if not request.user.is_citizen():
-            messages.error(request, 'You do not have permission to access this page.')
-            return redirect('login')
+        response = _denied(request, has_role)
+        if response is not None:
+            return response
         return view_func(request, *args, **kwargs)
     return wrapper
 
 
+def citizen_required(view_func):
+    """Decorator to restrict access to citizen users only"""
+    return _role_required(view_func, lambda user: user.is_citizen())
+
+
 def staff_required(view_func):
     """Decorator to restrict access to staff users only"""
-    @wraps(view_func)
-    def wrapper(request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            messages.error(request, 'You must be logged in to access this page.')
-            return redirect('login')
-        if not request.user.is_staff_user():
-            messages.error(request, 'You do not have permission to access this page.')
-            return redirect('login')
-        return view_func(request, *args, **kwargs)
-    return wrapper
+    return _role_required(view_func, lambda user: user.is_staff_user())
 
 
 def admin_required(view_func):
     """Decorator to restrict access to admin users only"""
-    @wraps(view_func)
-    def wrapper(request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            messages.error(request, 'You must be logged in to access this page.')
-            return redirect('login')
-        if not request.user.is_admin_user():
-            messages.error(request, 'You do not have permission to access this page.')
-            return redirect('login')
-        return view_func(request, *args, **kwargs)
-    return wrapper
+    return _role_required(view_func, lambda user: user.is_admin_user())
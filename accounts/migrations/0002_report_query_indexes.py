@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'username'], name='user_role_username_idx'),
+        ),
+    ]
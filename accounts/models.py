@@ -27,3 +27,7 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            # Covers role filters, role counts and username ordering within a role
+            models.Index(fields=['role', 'username'], name='user_role_username_idx'),
+        ]
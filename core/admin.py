@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import RecyclingCenter, WasteReport
+from .models import RecyclingCenter, ReportConfirmation, WasteReport
 
 
 @admin.register(RecyclingCenter)
@@ -48,3 +48,12 @@ class WasteReportAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         # Only citizens can add reports (through the form, not admin)
         return request.user.is_superuser
+
+
+@admin.register(ReportConfirmation)
+class ReportConfirmationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'report', 'citizen', 'distance', 'created_at')
+    list_filter = ('created_at',)
+    search_fields = ('citizen__username', 'description')
+    raw_id_fields = ('report', 'citizen')
+    readonly_fields = ('created_at',)
@@ -0,0 +1,261 @@
+"""
+Parquet snapshots of report data for analytics.
+
+The snapshot directory is self-contained, so analysts read it with pandas or
+pyarrow instead of querying the production database::
+
+    reports/month=2025-01/center=3/part-<run>.parquet
+    centers.parquet
+    users.parquet
+    _state.json
+
+Reports are partitioned by creation month and center (0 for unassigned)
+and appended incrementally. Each run exports the reports whose
+``updated_at`` falls between the previous run's cutoff (kept in
+``_state.json``) and ``SETTLE_DELAY`` before the current run. The delay
+leaves time for transactions that stamped ``updated_at`` but had not yet
+committed, so no change is skipped and none is exported twice. A report that
+changes is written again, so readers keep the row with the latest
+``updated_at`` per ``id``. Deleted reports only disappear on a ``full``
+rebuild, which writes a new ``reports`` directory next to the old one and
+swaps it in once complete. Deleting a center stamps ``updated_at`` on its
+reports (see ``core.signals``), so they are written again as unassigned.
+
+Centers and users are small and rewritten in full on every run. Users carry
+their role and activity only, with no names or contact details.
+
+Coordinates keep their exact decimal type and timestamps stay timezone
+aware (UTC). Files are written in record batches, one partition at a time,
+so memory stays bounded by ``BATCH_SIZE``.
+"""
+import json
+import os
+import shutil
+import uuid
+from datetime import timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .counters import UNASSIGNED
+from .models import RecyclingCenter, WasteReport
+
+BATCH_SIZE = 10000
+SETTLE_DELAY = timedelta(minutes=5)
+STATE_FILE = '_state.json'
+
+TIMESTAMP = pa.timestamp('us', tz='UTC')
+COORDINATE = pa.decimal128(9, 6)
+
+REPORT_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('citizen_id', pa.int64()),
+    ('center_id', pa.int64()),
+    ('status', pa.string()),
+    ('description', pa.string()),
+    ('image', pa.string()),
+    ('latitude', COORDINATE),
+    ('longitude', COORDINATE),
+    ('created_at', TIMESTAMP),
+    ('updated_at', TIMESTAMP),
+])
+
+CENTER_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('name', pa.string()),
+    ('address', pa.string()),
+    ('latitude', COORDINATE),
+    ('longitude', COORDINATE),
+    ('materials_accepted', pa.string()),
+    ('working_hours', pa.string()),
+    ('assigned_staff_id', pa.int64()),
+    ('created_at', TIMESTAMP),
+    ('updated_at', TIMESTAMP),
+])
+
+USER_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('role', pa.string()),
+    ('is_active', pa.bool_()),
+    ('date_joined', TIMESTAMP),
+    ('last_login', TIMESTAMP),
+])
+
+
+def read_state(directory):
+    path = os.path.join(directory, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_state(directory, state):
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def to_batch(rows, schema):
+    """Build a record batch from row tuples in ``schema`` column order"""
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def write_table(path, queryset, schema):
+    """Replace the Parquet file at ``path`` with the rows of ``queryset``"""
+    temporary = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.tmp')
+    rows = queryset.values_list(*schema.names).iterator(chunk_size=BATCH_SIZE)
+    count = 0
+    with pq.ParquetWriter(temporary, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                writer.write_batch(to_batch(batch, schema))
+                count += len(batch)
+                batch = []
+        writer.write_batch(to_batch(batch, schema))
+        count += len(batch)
+    os.replace(temporary, path)
+    return count
+
+
+class PartitionWriter:
+    """Append report rows to one Parquet file per (month, center) partition
+
+    Files are written with a leading dot, which pyarrow and pandas skip, and
+    renamed into place by ``commit`` once every partition is complete.
+    """
+
+    def __init__(self, directory, run_id):
+        self.directory = directory
+        self.run_id = run_id
+        self.writers = {}
+        self.buffers = {}
+        self.finished = []
+        self.rows = 0
+
+    def _path(self, partition):
+        month, center = partition
+        return os.path.join(self.directory, f'month={month}', f'center={center}')
+
+    def add(self, partition, row):
+        buffer = self.buffers.setdefault(partition, [])
+        buffer.append(row)
+        if len(buffer) >= BATCH_SIZE:
+            self._flush(partition)
+
+    def _flush(self, partition):
+        buffer = self.buffers.pop(partition, None)
+        if not buffer:
+            return
+        writer = self.writers.get(partition)
+        if writer is None:
+            path = self._path(partition)
+            os.makedirs(path, exist_ok=True)
+            temporary = os.path.join(path, f'.part-{self.run_id}.parquet')
+            writer = self.writers[partition] = pq.ParquetWriter(temporary, REPORT_SCHEMA)
+        writer.write_batch(to_batch(buffer, REPORT_SCHEMA))
+        self.rows += len(buffer)
+
+    def close_month(self, month):
+        """Close the files of every partition in ``month``"""
+        for partition in [p for p in set(self.buffers) | set(self.writers) if p[0] == month]:
+            self._flush(partition)
+            writer = self.writers.pop(partition, None)
+            if writer is not None:
+                writer.close()
+                self.finished.append(partition)
+
+    def close(self):
+        for month in {partition[0] for partition in set(self.buffers) | set(self.writers)}:
+            self.close_month(month)
+
+    def commit(self):
+        for partition in self.finished:
+            path = self._path(partition)
+            os.replace(
+                os.path.join(path, f'.part-{self.run_id}.parquet'),
+                os.path.join(path, f'part-{self.run_id}.parquet'),
+            )
+        return len(self.finished)
+
+
+def replace_directory(source, target):
+    """Move ``source`` to ``target``, replacing any directory there
+
+    Two renames: readers find either the old or the new directory, except
+    for the instant between them when there is none.
+    """
+    os.makedirs(source, exist_ok=True)
+    previous = None
+    if os.path.exists(target):
+        previous = os.path.join(os.path.dirname(target), f'.{os.path.basename(target)}-previous-{uuid.uuid4().hex[:8]}')
+        os.replace(target, previous)
+    os.replace(source, target)
+    if previous is not None:
+        shutil.rmtree(previous)
+
+
+def export_snapshot(directory, full=False, settle_delay=SETTLE_DELAY):
+    """Write or update the analytics snapshot in ``directory``
+
+    Returns a dict with the number of reports, partitions, centers and
+    users written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    reports_directory = os.path.join(directory, 'reports')
+    state = {} if full else read_state(directory)
+
+    started = timezone.now()
+    run_id = f'{started:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}'
+    since = parse_datetime(state['reports_cutoff']) if state.get('reports_cutoff') else None
+    cutoff = started - settle_delay
+
+    if full:
+        # Left by runs that failed; the leading dot hides them from readers
+        for name in os.listdir(directory):
+            if name.startswith('.reports-'):
+                shutil.rmtree(os.path.join(directory, name))
+        partitions = PartitionWriter(os.path.join(directory, f'.reports-{run_id}'), run_id)
+    else:
+        partitions = PartitionWriter(reports_directory, run_id)
+    # One transaction gives every file the same consistent view
+    with transaction.atomic():
+        reports = WasteReport.objects.filter(updated_at__lte=cutoff).order_by('created_at', 'id')
+        if since is not None:
+            reports = reports.filter(updated_at__gt=since)
+
+        month = None
+        try:
+            for row in reports.values_list(*REPORT_SCHEMA.names).iterator(chunk_size=BATCH_SIZE):
+                row_month = f'{row[-2]:%Y-%m}'
+                if row_month != month:
+                    if month is not None:
+                        partitions.close_month(month)
+                    month = row_month
+                partitions.add((row_month, row[2] or UNASSIGNED), row)
+        finally:
+            partitions.close()
+
+        centers = write_table(os.path.join(directory, 'centers.parquet'),
+                              RecyclingCenter.objects.order_by('id'), CENTER_SCHEMA)
+        users = write_table(os.path.join(directory, 'users.parquet'),
+                            get_user_model().objects.order_by('id'), USER_SCHEMA)
+
+    files = partitions.commit()
+    if full:
+        replace_directory(partitions.directory, reports_directory)
+    state['reports_cutoff'] = cutoff.isoformat()
+    state['last_run'] = started.isoformat()
+    write_state(directory, state)
+    return {'reports': partitions.rows, 'files': files, 'centers': centers, 'users': users}
@@ -0,0 +1,154 @@
+"""
+Reference counts and garbage collection for stored report images.
+
+Every ``WasteReport`` write adjusts the ``ImageBlob`` count of the image it
+adds or drops in the same transaction (see ``core.signals``). Files are never
+deleted while a request runs: ``collect_garbage`` later removes, in batches,
+the files whose count has been zero for longer than ``GRACE_PERIOD``,
+together with their thumbnails and previews (see ``core.derivatives``).
+
+The grace period protects uploads that are racing a collection. Storing a
+file that already exists refreshes its modification time, and a file touched
+within the grace period is kept even if its row was collected; the next
+reference recreates the row. ``sweep_untracked`` removes content-addressed
+files that never got a row, such as uploads whose transaction rolled back.
+"""
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .derivatives import derivative_files
+from .models import ImageBlob, WasteReport
+from .storage import INCOMING_DIRECTORY, is_content_address
+from .upsert import add_to_count
+
+BATCH_SIZE = 500
+GRACE_PERIOD = timedelta(hours=1)
+
+
+def image_storage():
+    field = WasteReport._meta.get_field('image')
+    return field.storage, field.upload_to
+
+
+def adjust_references(deltas):
+    """Atomically add a mapping of image name -> delta to the reference counts"""
+    now = timezone.now()
+    with transaction.atomic():
+        for name, delta in sorted(deltas.items()):
+            if not name or not delta:
+                continue
+            add_to_count(ImageBlob, {'name': name}, 'references', delta, updated_at=now)
+
+
+def image_deltas(old_name, new_name):
+    """Reference deltas for a report whose image changes from one name to another"""
+    deltas = Counter()
+    if old_name != new_name:
+        if old_name:
+            deltas[old_name] -= 1
+        if new_name:
+            deltas[new_name] += 1
+    return deltas
+
+
+def _is_recent(storage, name, cutoff):
+    try:
+        return storage.get_modified_time(name) >= cutoff
+    except FileNotFoundError:
+        return False
+
+
+def collect_garbage(batch_size=BATCH_SIZE, grace_period=GRACE_PERIOD):
+    """Delete files no report has referenced for ``grace_period``
+
+    Returns the number of files deleted.
+    """
+    storage, _ = image_storage()
+    cutoff = timezone.now() - grace_period
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                ImageBlob.objects.filter(references__lte=0, updated_at__lt=cutoff)
+                .order_by('references', 'updated_at')
+                .values_list('id', 'name')[:batch_size]
+            )
+            if not batch:
+                return deleted
+            ids = [blob_id for blob_id, _ in batch]
+            # The count is checked again so a reference taken meanwhile is kept
+            ImageBlob.objects.filter(id__in=ids, references__lte=0).delete()
+            kept = set(ImageBlob.objects.filter(id__in=ids).values_list('id', flat=True))
+
+        for name in (name for blob_id, name in batch if blob_id not in kept):
+            if not _is_recent(storage, name, cutoff) and storage.exists(name):
+                storage.delete(name)
+                deleted += 1
+                for derived in derivative_files(name):
+                    if storage.exists(derived):
+                        storage.delete(derived)
+
+
+def sweep_untracked(grace_period=GRACE_PERIOD, batch_size=BATCH_SIZE):
+    """Delete content-addressed files and leftover uploads that have no row
+
+    Returns the number of files deleted.
+    """
+    storage, prefix = image_storage()
+    prefix = prefix.rstrip('/')
+    root = storage.path(prefix)
+    cutoff = timezone.now() - grace_period
+    deleted = 0
+
+    def untracked(names):
+        tracked = set(ImageBlob.objects.filter(name__in=names).values_list('name', flat=True))
+        return [name for name in names if name not in tracked]
+
+    batch = []
+    for directory, subdirectories, files in os.walk(root):
+        relative = os.path.relpath(directory, storage.location).replace(os.sep, '/')
+        for file_name in files:
+            name = f'{relative}/{file_name}'
+            if os.path.basename(directory) == INCOMING_DIRECTORY:
+                # Left behind by an upload that crashed mid-write
+                if not _is_recent(storage, name, cutoff):
+                    storage.delete(name)
+                    deleted += 1
+            elif is_content_address(name, prefix):
+                batch.append(name)
+        if len(batch) >= batch_size:
+            deleted += _delete_untracked(storage, untracked(batch), cutoff)
+            batch = []
+    deleted += _delete_untracked(storage, untracked(batch), cutoff)
+    return deleted
+
+
+def _delete_untracked(storage, names, cutoff):
+    deleted = 0
+    for name in names:
+        if not _is_recent(storage, name, cutoff):
+            storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+def rebuild_references():
+    """Recompute every reference count from the reports; returns the number of images"""
+    expected = dict(
+        WasteReport.objects.exclude(image='').exclude(image__isnull=True)
+        .values('image').annotate(references=Count('id')).order_by()
+        .values_list('image', 'references')
+    )
+    with transaction.atomic():
+        stored = dict(ImageBlob.objects.values_list('name', 'references'))
+        deltas = Counter({
+            name: expected.get(name, 0) - stored.get(name, 0)
+            for name in set(expected) | set(stored)
+        })
+        adjust_references(deltas)
+    return len(expected)
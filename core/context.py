@@ -0,0 +1,111 @@
+"""
+Who is making a request, resolved at most once per request.
+
+``RequestActorMiddleware`` sets ``request.actor``, whose ``role`` and
+``center`` (the ``RecyclingCenter`` assigned to a staff member) are looked
+up lazily on first use and then reused by the decorators, views and
+templates handling the request.
+
+With ``STAFF_CENTER_SESSION_CACHE`` enabled, the center is also kept in the
+staff member's session, serialized together with a version token held in
+the cache. Saving or deleting any center replaces the token, so every
+cached center is looked up again on the next request. The token must live
+in a cache shared by all worker processes for this to be seen everywhere,
+so the session cache is skipped while the default cache is a per-process
+``LocMemCache``. Otherwise another worker would keep serving a staff
+member the center they were just removed from.
+Center changes made with ``QuerySet.update`` send no signals; call
+``invalidate_staff_centers`` after them.
+"""
+import uuid
+
+from django.conf import settings
+from django.core import serializers
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import cached_property
+
+from .models import RecyclingCenter
+
+SESSION_KEY = '_staff_center'
+VERSION_KEY = 'core:staff-center-version'
+
+
+def center_version():
+    """Token identifying the current state of center assignments"""
+    # A token lost from the cache is replaced, which only invalidates sessions
+    return cache.get_or_set(VERSION_KEY, lambda: uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_staff_centers():
+    """Make every session look its staff center up again"""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def session_cache_enabled():
+    """Whether staff centers may be kept in sessions"""
+    if not getattr(settings, 'STAFF_CENTER_SESSION_CACHE', False):
+        return False
+    # Invalidations would only reach the worker that saved the center
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def lookup_center(user):
+    """The center assigned to ``user``, or None"""
+    # Kept in sessions, so never read from a replica that may be behind
+    return RecyclingCenter.objects.using(DEFAULT_DB_ALIAS).filter(assigned_staff=user).order_by('id').first()
+
+
+def session_center(request):
+    """The center assigned to the requesting staff member, cached in the session"""
+    version = center_version()
+    cached = request.session.get(SESSION_KEY)
+    if cached and cached['user'] == request.user.pk and cached['version'] == version:
+        if cached['center'] is None:
+            return None
+        center = next(serializers.deserialize('json', cached['center'])).object
+        # Behave like an instance loaded from the database, e.g. when saved by a form
+        center._state.adding = False
+        center._state.db = DEFAULT_DB_ALIAS
+        return center
+
+    center = lookup_center(request.user)
+    request.session[SESSION_KEY] = {
+        'user': request.user.pk,
+        'version': version,
+        'center': serializers.serialize('json', [center]) if center is not None else None,
+    }
+    return center
+
+
+class Actor:
+    """The user behind a request, with their role and assigned center"""
+
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def role(self):
+        user = self.request.user
+        return user.role if user.is_authenticated else None
+
+    @property
+    def is_staff(self):
+        return self.role == 'staff'
+
+    @cached_property
+    def center(self):
+        """The ``RecyclingCenter`` assigned to a staff member; None otherwise"""
+        if not self.is_staff:
+            return None
+        if session_cache_enabled() and hasattr(self.request, 'session'):
+            return session_center(self.request)
+        return lookup_center(self.request.user)
+
+
+def get_actor(request):
+    """``request.actor``, created on demand where the middleware is not installed"""
+    if not hasattr(request, 'actor'):
+        request.actor = Actor(request)
+    return request.actor
@@ -0,0 +1,142 @@
+"""
+Materialized report counters.
+
+Every ``WasteReport`` write adjusts the matching ``ReportCounter`` rows in
+the same transaction (see ``core.signals``), so dashboards read at most one
+row per status instead of running ``COUNT(*)`` over the reports table.
+
+Signals do not fire for ``QuerySet.update()`` or ``bulk_create()``. Code that
+writes reports in bulk must call ``apply_deltas`` itself; ``manage.py
+rebuild_counters`` recomputes and verifies everything from scratch.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import ReportCounter, WasteReport
+from .upsert import add_to_count
+
+UNASSIGNED = 0
+
+
+def counter_keys(center_id, citizen_id):
+    """The (scope, key) pairs a report with these owners is counted under"""
+    return [
+        ('global', 0),
+        ('center', center_id or UNASSIGNED),
+        ('citizen', citizen_id),
+    ]
+
+
+def report_deltas(center_id, citizen_id, status, amount=1):
+    """Counter deltas for adding (or, with a negative amount, removing) a report"""
+    return Counter({
+        (scope, key, status): amount
+        for scope, key in counter_keys(center_id, citizen_id)
+    })
+
+
+def apply_deltas(deltas):
+    """Atomically add a mapping of (scope, key, status) -> delta to the counters"""
+    with transaction.atomic():
+        for (scope, key, status), delta in sorted(deltas.items()):
+            if not delta:
+                continue
+            add_to_count(ReportCounter, {'scope': scope, 'key': key, 'status': status}, 'count', delta)
+
+
+def _status_counts(rows):
+    counts = {status: 0 for status, _ in WasteReport.STATUS_CHOICES}
+    for status, count in rows:
+        counts[status] = count
+    counts['total'] = sum(counts.values())
+    return counts
+
+
+def get_counts(scope, key=0):
+    """Report counts per status plus ``total`` for one scope, in one query"""
+    return _status_counts(ReportCounter.objects.filter(scope=scope, key=key).values_list('status', 'count'))
+
+
+async def aget_counts(scope, key=0):
+    """``get_counts`` for async views"""
+    rows = ReportCounter.objects.filter(scope=scope, key=key).values_list('status', 'count')
+    return _status_counts([row async for row in rows])
+
+
+def _center_totals():
+    return (
+        ReportCounter.objects.filter(scope='center')
+        .values('key')
+        .annotate(total=Sum('count'))
+        .values_list('key', 'total')
+    )
+
+
+def get_center_totals():
+    """Total reports per center id, read from the counters"""
+    return dict(_center_totals())
+
+
+async def aget_center_totals():
+    """``get_center_totals`` for async views"""
+    return {key: total async for key, total in _center_totals()}
+
+
+def move_center_counts(center_id):
+    """Fold a deleted center's counts into the unassigned bucket"""
+    deltas = Counter()
+    for status, count in ReportCounter.objects.filter(scope='center', key=center_id).values_list('status', 'count'):
+        deltas[('center', UNASSIGNED, status)] += count
+    with transaction.atomic():
+        apply_deltas(deltas)
+        ReportCounter.objects.filter(scope='center', key=center_id).delete()
+
+
+def expected_counts():
+    """Recompute every counter from the reports table"""
+    expected = Counter()
+    reports = WasteReport.objects.order_by()
+    for row in reports.values('status').annotate(n=Count('id')):
+        expected[('global', 0, row['status'])] = row['n']
+    for row in reports.values('center_id', 'status').annotate(n=Count('id')):
+        expected[('center', row['center_id'] or UNASSIGNED, row['status'])] = row['n']
+    for row in reports.values('citizen_id', 'status').annotate(n=Count('id')):
+        expected[('citizen', row['citizen_id'], row['status'])] = row['n']
+    return expected
+
+
+def stored_counts():
+    """Every non-zero counter as stored"""
+    return Counter({
+        (scope, key, status): count
+        for scope, key, status, count in ReportCounter.objects.values_list('scope', 'key', 'status', 'count')
+        if count
+    })
+
+
+def verify_counts():
+    """Return {(scope, key, status): (stored, expected)} for every mismatch"""
+    with transaction.atomic():
+        expected = expected_counts()
+        stored = stored_counts()
+    return {
+        key: (stored[key], expected[key])
+        for key in set(expected) | set(stored)
+        if stored[key] != expected[key]
+    }
+
+
+def rebuild_counts():
+    """Replace every counter with values recomputed from the reports table"""
+    with transaction.atomic():
+        # Delete first so the write lock is held while counting
+        ReportCounter.objects.all().delete()
+        expected = expected_counts()
+        ReportCounter.objects.bulk_create([
+            ReportCounter(scope=scope, key=key, status=status, count=count)
+            for (scope, key, status), count in expected.items()
+        ], batch_size=1000)
+    return len(expected)
+
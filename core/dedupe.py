@@ -0,0 +1,91 @@
+"""
+Near-duplicate detection for new reports.
+
+During events many citizens report the same pile within minutes. A
+submission within ``DUPLICATE_RADIUS_M`` meters of an open (pending or in
+progress) report created in the last ``DUPLICATE_WINDOW_HOURS`` is recorded
+as a ``ReportConfirmation`` of that report instead of a new ``WasteReport``.
+
+Every report stores the geohash cell of its location. Candidates are the
+open reports in the cells around the point (the cell and its 8 neighbours
+for radii below the ~150 m cell size), found by equality seeks on the
+``(geohash, status, created_at)`` index rather than a scan. The few
+candidates are then checked with the exact haversine distance.
+
+The check is best effort: two submissions racing for the same spot may both
+create reports. Locations changed through ``QuerySet.update`` keep their old
+geohash; ``WasteReport.save`` keeps it current.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import geohash
+from .distance import haversine_matrix
+from .models import WasteReport
+
+OPEN_STATUSES = ('pending', 'in_progress')
+# Cells looked up per query; keeps it well under SQLite's parameter limit
+MAX_CELLS = 500
+
+
+def duplicate_radius():
+    return getattr(settings, 'DUPLICATE_RADIUS_M', 0)
+
+
+def open_reports_in(cells, since):
+    """Open reports in the geohash ``cells`` created since ``since``"""
+    return (
+        WasteReport.objects
+        .filter(geohash__in=cells, status__in=OPEN_STATUSES, created_at__gte=since)
+        .only('id', 'citizen_id', 'center_id', 'latitude', 'longitude', 'status', 'created_at')
+        .order_by()
+    )
+
+
+def _chunks(points, radius_m):
+    # Groups of (index, latitude, longitude) with the cells they need
+    chunk, cells = [], set()
+    for index, (latitude, longitude) in enumerate(points):
+        point_cells = geohash.cells_within(latitude, longitude, radius_m)
+        if chunk and len(cells | point_cells) > MAX_CELLS:
+            yield chunk, cells
+            chunk, cells = [], set()
+        chunk.append((index, float(latitude), float(longitude)))
+        cells |= point_cells
+    if chunk:
+        yield chunk, cells
+
+
+def find_duplicates(points, now=None):
+    """The open report each ``(latitude, longitude)`` point duplicates
+
+    Returns one ``(report, distance_m)`` pair per point, or None where the
+    point is not near an open report. Nearby points share cells, so a batch
+    usually needs a single query.
+    """
+    matches = [None] * len(points)
+    radius = duplicate_radius()
+    if not radius or not points:
+        return matches
+    since = (now or timezone.now()) - timedelta(hours=settings.DUPLICATE_WINDOW_HOURS)
+
+    for chunk, cells in _chunks(points, radius):
+        candidates = list(open_reports_in(cells, since))
+        if not candidates:
+            continue
+        distances = haversine_matrix(
+            [(latitude, longitude) for _, latitude, longitude in chunk],
+            [(report.latitude, report.longitude) for report in candidates],
+        ) * 1000
+        for (index, _, _), row in zip(chunk, distances):
+            nearest = int(row.argmin())
+            if row[nearest] <= radius:
+                matches[index] = (candidates[nearest], float(row[nearest]))
+    return matches
+
+
+def find_duplicate(latitude, longitude, now=None):
+    """``(report, distance_m)`` for the open report a point duplicates, or None"""
+    return find_duplicates([(latitude, longitude)], now)[0]
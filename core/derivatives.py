@@ -0,0 +1,190 @@
+"""
+Thumbnails and previews of report images.
+
+Uploaded photos are often several megabytes. Lists show a fixed-size
+thumbnail and detail pages a bounded preview, both rendered with Pillow in a
+small thread pool once the saving transaction commits, so requests never
+wait for image processing. Until a report's derivatives exist, templates
+fall back to the original through ``WasteReport.thumbnail_url`` and
+``preview_url``. With ``USE_JOB_QUEUE`` the work is queued on the database
+job queue instead (see ``core.jobs``), and survives restarts.
+
+JPEG sources are decoded at a reduced scale with ``Image.draft``, so the
+full-resolution bitmap is never materialized. Derivatives are attached with
+``QuerySet.update`` only if the report still has the image they were made
+from, so a replaced image never ends up with stale derivatives.
+
+Derivatives are named after the original's content hash, sharded like the
+originals::
+
+    waste_reports/thumbnails/3f/a9/3fa9c1...e2.webp
+
+so every report sharing an image shares its derivatives too, and they are
+rendered once. They live as long as the original: ``core.blobs`` deletes
+them when it collects the original's file.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps, features
+
+from . import jobs
+from .models import WasteReport
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (160, 160)
+PREVIEW_SIZE = (960, 960)
+QUALITY = 80
+DERIVATIVE_FIELDS = ('image_thumbnail', 'image_preview')
+EXTENSIONS = ('webp', 'jpg')
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def derivative_format():
+    """Configured output format, ``WEBP`` when Pillow supports it or ``JPEG``"""
+    image_format = getattr(settings, 'DERIVATIVE_FORMAT', 'WEBP').upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format
+
+
+def _encode(image, image_format):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    options = {'quality': QUALITY}
+    if image_format == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        options.update(method=4)
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def render_derivatives(source, image_format=None):
+    """Return ``(thumbnail, preview)`` encoded bytes for an image file
+
+    The thumbnail is cropped to exactly ``THUMBNAIL_SIZE``; the preview fits
+    within ``PREVIEW_SIZE`` and is never upscaled.
+    """
+    image_format = image_format or derivative_format()
+    with Image.open(source) as image:
+        # Both boxes are square, so the draft size is right for any orientation
+        image.draft('RGB', PREVIEW_SIZE)
+        image = ImageOps.exif_transpose(image)
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        preview = image.copy()
+        preview.thumbnail(PREVIEW_SIZE, Image.Resampling.LANCZOS)
+        thumbnail = ImageOps.fit(preview, THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        return _encode(thumbnail, image_format), _encode(preview, image_format)
+
+
+def derivative_key(image_name):
+    """Hex digest naming the derivatives of the original ``image_name``"""
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    if DIGEST_PATTERN.match(stem):
+        # Content-addressed originals are already named after their hash
+        return stem
+    return hashlib.sha256(image_name.encode()).hexdigest()
+
+
+def derivative_name(field_name, image_name, extension):
+    """Storage name of one derivative of ``image_name``"""
+    key = derivative_key(image_name)
+    upload_to = WasteReport._meta.get_field(field_name).upload_to.rstrip('/')
+    return f'{upload_to}/{key[:2]}/{key[2:4]}/{key}.{extension}'
+
+
+def derivative_files(image_name):
+    """Every name a derivative of ``image_name`` may be stored under, in any format"""
+    return [
+        derivative_name(field_name, image_name, extension)
+        for field_name in DERIVATIVE_FIELDS
+        for extension in EXTENSIONS
+    ]
+
+
+@jobs.task('generate_derivatives')
+def generate_derivatives(report_id):
+    """Render and attach the derivatives of one report's image
+
+    Derivatives already stored for the same image are reused. Returns True
+    when derivatives were attached.
+    """
+    report = WasteReport.objects.filter(pk=report_id).only('image', 'image_thumbnail', 'image_preview').first()
+    if report is None or not report.image:
+        return False
+
+    image_format = derivative_format()
+    extension = 'jpg' if image_format == 'JPEG' else image_format.lower()
+    fields = [report._meta.get_field(field_name) for field_name in DERIVATIVE_FIELDS]
+    names = {field.name: derivative_name(field.name, report.image.name, extension) for field in fields}
+    # Reports sharing the image share its derivatives
+    missing = [field for field in fields if not field.storage.exists(names[field.name])]
+    if missing:
+        with report.image.open('rb') as source:
+            rendered = dict(zip(DERIVATIVE_FIELDS, render_derivatives(source, image_format)))
+        for field in missing:
+            name = names[field.name]
+            saved = field.storage.save(name, ContentFile(rendered[field.name]), max_length=field.max_length)
+            if saved != name:
+                # Another worker stored the same derivative first
+                field.storage.delete(saved)
+
+    attached = WasteReport.objects.filter(pk=report_id, image=report.image.name).update(**names)
+    return bool(attached)
+
+
+def _run(report_id, close_connection):
+    try:
+        generate_derivatives(report_id)
+    except Exception:
+        logger.exception('Could not generate image derivatives for report %s', report_id)
+    finally:
+        if close_connection:
+            connection.close()
+
+
+def get_executor():
+    """The shared worker pool, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'DERIVATIVE_WORKERS', 2),
+                thread_name_prefix='derivatives',
+            )
+    return _executor
+
+
+def schedule_derivatives(report_id):
+    """Generate a report's derivatives in the background once the transaction commits
+
+    With ``USE_JOB_QUEUE`` a job is queued in the current transaction instead.
+    With ``DERIVATIVE_WORKERS = 0`` they are generated inline.
+    """
+    if getattr(settings, 'USE_JOB_QUEUE', False):
+        jobs.enqueue('generate_derivatives', report_id=report_id)
+        return
+
+    def submit():
+        if getattr(settings, 'DERIVATIVE_WORKERS', 2) > 0:
+            get_executor().submit(_run, report_id, True)
+        else:
+            _run(report_id, False)
+
+    transaction.on_commit(submit)
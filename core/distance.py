@@ -0,0 +1,42 @@
+"""
+Vectorized great-circle distance engine.
+
+All functions accept scalars or array-likes of latitudes/longitudes in
+degrees and follow NumPy broadcasting rules, so one call replaces a Python
+loop over ``calculate_distance``.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Haversine distance in kilometers between broadcastable coordinate arrays"""
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(value, dtype=np.float64))
+        for value in (lat1, lon1, lat2, lon2)
+    )
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_matrix(origins, destinations):
+    """Distance matrix in kilometers, shape (len(origins), len(destinations))
+
+    ``origins`` and ``destinations`` are sequences of (latitude, longitude).
+    """
+    origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+    destinations = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+    return haversine(
+        origins[:, 0, np.newaxis], origins[:, 1, np.newaxis],
+        destinations[np.newaxis, :, 0], destinations[np.newaxis, :, 1],
+    )
+
+
+def unit_vectors(latitudes, longitudes):
+    """Project coordinates onto the unit sphere, shape (N, 3)"""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
@@ -1,6 +1,11 @@
 from django import forms
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
+from django.core.files.uploadedfile import UploadedFile
 from .models import WasteReport, RecyclingCenter
+from .normalization import ImageNormalizer
 from accounts.models import User
+from PIL import Image
 
 
 class WasteReportForm(forms.ModelForm):
@@ -20,6 +25,30 @@ class WasteReportForm(forms.ModelForm):
                 'accept': 'image/*'
             }),
         }
+    
+    def __init__(self, *args, normalizer=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Uploads are normalized by IMAGE_NORMALIZATION unless a normalizer is given
+        self.normalizer = normalizer if normalizer is not None else ImageNormalizer.from_settings()
+        # Advertised to the submit page, which shrinks photos before uploading them
+        attrs = self.fields['image'].widget.attrs
+        attrs['data-max-bytes'] = settings.MAX_UPLOAD_SIZE
+        if self.normalizer:
+            attrs['data-max-edge'] = self.normalizer.max_edge
+            attrs['data-quality'] = self.normalizer.quality / 100
+    
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile) and image.size > settings.MAX_UPLOAD_SIZE:
+            raise forms.ValidationError(
+                f'The photo is too large. Please upload one smaller than {filesizeformat(settings.MAX_UPLOAD_SIZE)}.'
+            )
+        if image and self.normalizer and isinstance(image, UploadedFile):
+            try:
+                image = self.normalizer.normalize(image)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                raise forms.ValidationError('The image could not be processed. Please upload a different photo.')
+        return image
 
 
 class ReportStatusForm(forms.ModelForm):
@@ -0,0 +1,80 @@
+"""
+Geohash cells of coordinates.
+
+A geohash interleaves longitude and latitude bisection bits and writes them
+in base 32; each character narrows the cell down by a factor of 32. Reports
+store the hash of their cell at ``PRECISION`` characters, roughly 150 m
+across, so the reports near a point are found by looking up a few whole
+cells with equality on an index.
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 7
+METERS_PER_DEGREE = 111_320
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a point with ``precision`` characters"""
+    latitude, longitude = float(latitude), float(longitude)
+    lat_low, lat_high = -90.0, 90.0
+    lon_low, lon_high = -180.0, 180.0
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            middle = (lon_low + lon_high) / 2
+            if longitude >= middle:
+                value = value * 2 + 1
+                lon_low = middle
+            else:
+                value *= 2
+                lon_high = middle
+        else:
+            middle = (lat_low + lat_high) / 2
+            if latitude >= middle:
+                value = value * 2 + 1
+                lat_low = middle
+            else:
+                value *= 2
+                lat_high = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision=PRECISION):
+    """``(height, width)`` of a cell in degrees"""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def _samples(low, high, step):
+    # Evenly spaced points from low to high at most ``step`` apart, so every
+    # cell the interval touches contains one of them
+    count = math.ceil((high - low) / step) + 1
+    return [low + (high - low) * i / (count - 1) for i in range(count)] if count > 1 else [low]
+
+
+def cells_within(latitude, longitude, radius_m, precision=PRECISION):
+    """Hashes of all cells a point within ``radius_m`` meters may lie in
+
+    Covers the bounding box of the circle: the cell of the point and its 8
+    neighbours while the radius is below the cell size, more cells beyond.
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    height, width = cell_size(precision)
+    dlat = radius_m / METERS_PER_DEGREE
+    scale = math.cos(math.radians(min(abs(latitude) + dlat, 90.0)))
+    dlon = min(radius_m / (METERS_PER_DEGREE * scale), 180.0) if scale > 1e-6 else 180.0
+
+    cells = set()
+    for lat in _samples(max(latitude - dlat, -90.0), min(latitude + dlat, 90.0), height):
+        for lon in _samples(longitude - dlon, longitude + dlon, width):
+            # Cells wrap around the antimeridian
+            cells.add(encode(lat, (lon + 180) % 360 - 180, precision))
+    return cells
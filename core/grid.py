@@ -0,0 +1,171 @@
+"""
+Viewport and grid helpers for map endpoints.
+
+Map clients send a bounding box and a zoom level. Points are aggregated into
+square cells whose size halves with every zoom level, so a cluster covers
+roughly the same number of screen pixels at any zoom. Cells are computed in
+SQL by offsetting coordinates to be non-negative and truncating, which keeps
+the aggregation a single GROUP BY without per-row Python functions.
+
+For tiled layers every cell is owned by exactly one Web Mercator (slippy
+map) tile: the tile containing the cell's center. A tile's query therefore
+covers whole cells and a cell is never split across two tile responses.
+"""
+import math
+
+from django.db.models import Avg, Count, FloatField, IntegerField, Q
+from django.db.models.functions import Cast
+
+MAX_ZOOM = 20
+CELLS_PER_TILE = 8
+MERCATOR_MAX_LATITUDE = 85.0511287798
+
+
+class BoundingBox:
+    """A viewport given as south/west/north/east edges in degrees"""
+
+    def __init__(self, south, west, north, east):
+        if not -90 <= south <= north <= 90:
+            raise ValueError('south and north must satisfy -90 <= south <= north <= 90')
+        if not (-180 <= west <= 180 and -180 <= east <= 180):
+            raise ValueError('west and east must be between -180 and 180')
+        self.south, self.west, self.north, self.east = south, west, north, east
+
+    @classmethod
+    def from_query(cls, params):
+        """Build a bounding box from ``south``, ``west``, ``north`` and ``east`` parameters"""
+        try:
+            values = [float(params[key]) for key in ('south', 'west', 'north', 'east')]
+        except KeyError as e:
+            raise ValueError(f'Missing parameter {e.args[0]}')
+        south, west, north, east = values
+        # Leaflet reports longitudes past +/-180 once the map is panned around the world
+        if east - west >= 360:
+            west, east = -180, 180
+        else:
+            west, east = wrap_longitude(west), wrap_longitude(east)
+        return cls(south, west, north, east)
+
+    def q(self, prefix=''):
+        """Q object selecting rows whose latitude/longitude fall in the box"""
+        q = Q(**{f'{prefix}latitude__gte': self.south, f'{prefix}latitude__lte': self.north})
+        if self.west <= self.east:
+            return q & Q(**{f'{prefix}longitude__gte': self.west, f'{prefix}longitude__lte': self.east})
+        # The box crosses the antimeridian
+        return q & (Q(**{f'{prefix}longitude__gte': self.west}) |
+                    Q(**{f'{prefix}longitude__lte': self.east}))
+
+
+def wrap_longitude(longitude):
+    """Normalize a longitude to the [-180, 180] range"""
+    if -180 <= longitude <= 180:
+        return longitude
+    return (longitude + 180) % 360 - 180
+
+
+def parse_zoom(value):
+    """Parse a zoom query parameter"""
+    zoom = int(value)
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f'zoom must be between 0 and {MAX_ZOOM}')
+    return zoom
+
+
+def cell_size(zoom):
+    """Grid cell edge in degrees for a zoom level"""
+    return 360 / (2 ** zoom) / CELLS_PER_TILE
+
+
+def cell_annotations(zoom):
+    """Annotations assigning each row to a grid cell at ``zoom``"""
+    size = cell_size(zoom)
+    return {
+        'cell_y': Cast((Cast('latitude', FloatField()) + 90) / size, IntegerField()),
+        'cell_x': Cast((Cast('longitude', FloatField()) + 180) / size, IntegerField()),
+    }
+
+
+def cluster(queryset, zoom, **aggregates):
+    """Aggregate a queryset of located rows into grid cells with one GROUP BY
+
+    Returns dictionaries with the cell coordinates, the row ``count``, the
+    mean ``latitude``/``longitude`` of the cell and any extra ``aggregates``.
+    """
+    return (
+        queryset.order_by()
+        .annotate(**cell_annotations(zoom))
+        .values('cell_y', 'cell_x')
+        .annotate(
+            count=Count('id'),
+            avg_latitude=Avg(Cast('latitude', FloatField())),
+            avg_longitude=Avg(Cast('longitude', FloatField())),
+            **aggregates,
+        )
+    )
+
+
+def cell_id(zoom, cell_y, cell_x):
+    """Stable identifier for a grid cell"""
+    return f'{zoom}/{cell_y}/{cell_x}'
+
+
+
+def cell_for_point(zoom, latitude, longitude):
+    """The (cell_y, cell_x) grid cell containing a point, matching ``cell_annotations``"""
+    size = cell_size(zoom)
+    return int((float(latitude) + 90) / size), int((float(longitude) + 180) / size)
+
+
+def tile_row_for_latitude(zoom, latitude):
+    """Slippy map tile row containing a latitude, clamped to the valid rows"""
+    n = 2 ** zoom
+    latitude = max(-MERCATOR_MAX_LATITUDE, min(MERCATOR_MAX_LATITUDE, latitude))
+    row = int((1 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2 * n)
+    return max(0, min(n - 1, row))
+
+
+def _tile_row_for_cell(zoom, cell_y):
+    return tile_row_for_latitude(zoom, -90 + (cell_y + 0.5) * cell_size(zoom))
+
+
+def tile_for_point(zoom, latitude, longitude):
+    """The (x, y) slippy map tile that owns the grid cell containing a point"""
+    cell_y, cell_x = cell_for_point(zoom, latitude, longitude)
+    x = max(0, min(2 ** zoom - 1, cell_x // CELLS_PER_TILE))
+    return x, _tile_row_for_cell(zoom, cell_y)
+
+
+def tile_q(zoom, x, y, prefix=''):
+    """Q object selecting rows in the grid cells owned by tile (x, y), or None"""
+    rows = 2 ** zoom * CELLS_PER_TILE // 2
+    # Tile rows decrease as cell rows increase, so binary search for the band
+    low, high = 0, rows
+    while low < high:
+        middle = (low + high) // 2
+        if _tile_row_for_cell(zoom, middle) > y:
+            low = middle + 1
+        else:
+            high = middle
+    first = low
+    low, high = first, rows
+    while low < high:
+        middle = (low + high) // 2
+        if _tile_row_for_cell(zoom, middle) >= y:
+            low = middle + 1
+        else:
+            high = middle
+    last = low - 1
+    if last < first:
+        return None
+
+    size = cell_size(zoom)
+    west = -180 + x * CELLS_PER_TILE * size
+    east = west + CELLS_PER_TILE * size
+    q = Q(**{
+        f'{prefix}latitude__gte': -90 + first * size,
+        f'{prefix}longitude__gte': west,
+    })
+    # The last row and column are closed so points on +90/+180 are included
+    q &= Q(**{f'{prefix}latitude__lte': 90} if last == rows - 1 else {f'{prefix}latitude__lt': -90 + (last + 1) * size})
+    q &= Q(**{f'{prefix}longitude__lte': 180} if x == 2 ** zoom - 1 else {f'{prefix}longitude__lt': east})
+    return q
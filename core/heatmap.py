@@ -0,0 +1,61 @@
+"""
+Server-side clustering of waste reports for the admin heatmap layer.
+
+Reports are aggregated per grid cell (see ``core.grid``) with one GROUP BY
+per slippy map tile, and each tile's cells are cached. When a report is
+created, deleted, moved or changes status only the tiles owning its cell are
+evicted, one per zoom level.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .grid import cell_id, cluster, tile_for_point, tile_q
+from .models import WasteReport
+
+HEATMAP_MAX_ZOOM = 16
+HEATMAP_CACHE_TIMEOUT = 300
+
+
+def tile_cache_key(zoom, x, y):
+    return f'core:heatmap:{zoom}/{x}/{y}'
+
+
+def tile_cells(zoom, x, y):
+    """Report clusters for the grid cells owned by a tile, served from cache"""
+    key = tile_cache_key(zoom, x, y)
+    cells = cache.get(key)
+    if cells is not None:
+        return cells
+
+    q = tile_q(zoom, x, y)
+    cells = []
+    if q is not None:
+        statuses = {
+            status: Count('id', filter=Q(status=status))
+            for status, _ in WasteReport.STATUS_CHOICES
+        }
+        for cell in cluster(WasteReport.objects.filter(q), zoom, **statuses):
+            cells.append({
+                'id': cell_id(zoom, cell['cell_y'], cell['cell_x']),
+                'latitude': cell['avg_latitude'],
+                'longitude': cell['avg_longitude'],
+                'count': cell['count'],
+                'statuses': {status: cell[status] for status in statuses},
+            })
+
+    cache.set(key, cells, HEATMAP_CACHE_TIMEOUT)
+    return cells
+
+
+def invalidate_point(latitude, longitude):
+    """Evict the cached tiles covering a point at every zoom level"""
+    invalidate_points([(latitude, longitude)])
+
+
+def invalidate_points(points):
+    """Evict the cached tiles covering any of the (latitude, longitude) points"""
+    cache.delete_many(list({
+        tile_cache_key(zoom, *tile_for_point(zoom, latitude, longitude))
+        for latitude, longitude in points
+        for zoom in range(HEATMAP_MAX_ZOOM + 1)
+    }))
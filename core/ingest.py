@@ -0,0 +1,146 @@
+"""
+Batch ingestion of waste reports collected offline.
+
+Every item is validated like a submission through ``WasteReportForm``.
+Centers for all valid items come from one ``CenterIndex.nearest_many``
+call, and the reports are written with one ``bulk_create`` inside one
+transaction. Invalid items are skipped and reported back; they do not
+prevent the valid ones from being created. Items near an open report are
+linked to it as confirmations instead, see ``core.dedupe``.
+
+``bulk_create`` does not send ``post_save``, so ``reports_created`` does what
+the signal handlers in ``core.signals`` would: update the counters and image
+reference counts, schedule derivatives and evict heatmap tiles. The search
+index is kept by database triggers and needs nothing.
+"""
+import base64
+import binascii
+from collections import Counter
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+
+from . import blobs, counters, derivatives, heatmap
+from .dedupe import find_duplicates
+from .forms import WasteReportForm
+from .models import RecyclingCenter, ReportConfirmation, WasteReport
+from .signals import invalidate_now_and_on_commit
+from .spatial import get_center_index
+
+MAX_BATCH_SIZE = 500
+BULK_BATCH_SIZE = 250
+ITEM_FIELDS = ('description', 'latitude', 'longitude')
+
+
+def item_form(item):
+    """Bind a ``WasteReportForm`` to one JSON item
+
+    Items carry ``description``, ``latitude`` and ``longitude``, and
+    optionally a base64 encoded ``image`` with an ``image_name``.
+    """
+    if not isinstance(item, dict):
+        raise ValueError('Each report must be a JSON object')
+    data = {field: item[field] for field in ITEM_FIELDS if item.get(field) is not None}
+    files = {}
+    if item.get('image'):
+        try:
+            content = base64.b64decode(item['image'], validate=True)
+        except (binascii.Error, TypeError, ValueError):
+            raise ValueError('image must be base64 encoded')
+        files['image'] = SimpleUploadedFile(str(item.get('image_name') or 'photo.jpg'), content)
+    return WasteReportForm(data, files)
+
+
+def reports_created(reports):
+    """Apply the side effects of saving ``reports`` that ``bulk_create`` skipped"""
+    deltas = Counter()
+    references = Counter()
+    for report in reports:
+        deltas.update(counters.report_deltas(report.center_id, report.citizen_id, report.status))
+        if report.image:
+            references[report.image.name] += 1
+    counters.apply_deltas(deltas)
+    blobs.adjust_references(references)
+    for report in reports:
+        if report.image:
+            derivatives.schedule_derivatives(report.pk)
+    invalidate_now_and_on_commit(
+        heatmap.invalidate_points, [(report.latitude, report.longitude) for report in reports]
+    )
+
+
+def assign_centers(reports):
+    """Set the nearest center and the geohash of unsaved reports"""
+    if not reports:
+        return
+    center_ids = get_center_index().nearest_many(
+        [report.latitude for report in reports], [report.longitude for report in reports]
+    )
+    # The index may still list a center deleted since it was built
+    existing = set(RecyclingCenter.objects.filter(pk__in=set(center_ids) - {None}).values_list('pk', flat=True))
+    for report, center_id in zip(reports, center_ids):
+        report.center_id = center_id if center_id in existing else None
+        # bulk_create does not call save()
+        report.set_geohash()
+
+
+def save_reports(reports, confirmations=()):
+    """Insert reports and confirmations in one transaction, with the reports' side effects"""
+    if not reports and not confirmations:
+        return
+    with transaction.atomic():
+        WasteReport.objects.bulk_create(reports, batch_size=BULK_BATCH_SIZE)
+        ReportConfirmation.objects.bulk_create(confirmations, batch_size=BULK_BATCH_SIZE)
+        if reports:
+            reports_created(reports)
+
+
+def ingest_reports(citizen, items):
+    """Validate and create reports for ``citizen``; returns one result per item
+
+    Results are dicts with the item ``index`` and a ``status`` of
+    ``created`` (with ``id`` and ``center``), ``duplicate`` (with the
+    ``duplicate_of`` report id) or ``invalid`` (with ``errors``).
+    """
+    results = [None] * len(items)
+    reports = []
+    indexes = []
+    for index, item in enumerate(items):
+        try:
+            form = item_form(item)
+        except ValueError as e:
+            errors = {'__all__': [{'message': str(e), 'code': 'invalid'}]}
+            results[index] = {'index': index, 'status': 'invalid', 'errors': errors}
+            continue
+        if not form.is_valid():
+            results[index] = {'index': index, 'status': 'invalid', 'errors': form.errors.get_json_data()}
+            continue
+        report = form.save(commit=False)
+        report.citizen = citizen
+        reports.append(report)
+        indexes.append(index)
+
+    # Items near an open report confirm it instead of becoming reports
+    matches = find_duplicates([(report.latitude, report.longitude) for report in reports])
+    confirmations = []
+    new_reports = []
+    new_indexes = []
+    for index, report, match in zip(indexes, reports, matches):
+        if match is None:
+            new_reports.append(report)
+            new_indexes.append(index)
+            continue
+        duplicate_of, distance = match
+        confirmations.append(ReportConfirmation(
+            report=duplicate_of, citizen=citizen, description=report.description,
+            latitude=report.latitude, longitude=report.longitude, distance=distance,
+        ))
+        results[index] = {'index': index, 'status': 'duplicate', 'duplicate_of': duplicate_of.pk}
+    reports, indexes = new_reports, new_indexes
+
+    assign_centers(reports)
+    save_reports(reports, confirmations)
+
+    for index, report in zip(indexes, reports):
+        results[index] = {'index': index, 'status': 'created', 'id': report.pk, 'center': report.center_id}
+    return results
@@ -0,0 +1,142 @@
+"""
+Durable background jobs in the database, with no broker.
+
+Work is enqueued as a ``Job`` row, normally inside the transaction that made
+it necessary, so a job exists exactly when its cause was committed.
+``manage.py run_workers`` claims due jobs and runs them in a process pool.
+
+Claiming uses a visibility timeout instead of locks. A claim is a
+conditional ``UPDATE`` that marks the job ``running``, stamps a fresh token
+and sets ``locked_until``; only one worker's update can match. A worker that
+dies leaves the job locked until the timeout passes, after which another
+worker claims it. Outcomes are recorded only with the matching token, so a
+worker that overran its timeout cannot overwrite the newer claim. Tasks may
+therefore run more than once and must be idempotent.
+
+Finished jobs are deleted. A failed job is retried with exponential backoff
+and jitter until ``max_attempts``, then kept as ``failed`` with its error.
+
+Tasks are plain functions registered with ``@task``; the payload passed to
+``enqueue`` becomes their keyword arguments and must be JSON serializable.
+"""
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+VISIBILITY_TIMEOUT = timedelta(minutes=5)
+BACKOFF_BASE = timedelta(seconds=10)
+BACKOFF_MAX = timedelta(hours=1)
+MAX_ATTEMPTS = 5
+ERROR_LENGTH = 4000
+
+TASKS = {}
+
+
+def task(name, max_attempts=MAX_ATTEMPTS):
+    """Register a function as the task ``name``"""
+    def register(func):
+        TASKS[name] = func
+        func.task_name = name
+        func.max_attempts = max_attempts
+        return func
+    return register
+
+
+def enqueue(name, delay=None, **payload):
+    """Queue task ``name`` to run with ``payload`` after an optional ``delay``"""
+    if name not in TASKS:
+        raise ValueError(f'Unknown task {name!r}')
+    return Job.objects.create(
+        task=name,
+        payload=payload,
+        max_attempts=TASKS[name].max_attempts,
+        run_at=timezone.now() + (delay or timedelta(0)),
+    )
+
+
+def backoff(attempts):
+    """Delay before retrying after ``attempts`` failures: exponential with jitter"""
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim(limit=1, visibility_timeout=VISIBILITY_TIMEOUT):
+    """Claim up to ``limit`` due jobs; returns ``(job_id, token)`` pairs"""
+    now = timezone.now()
+    claimable = Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+    candidates = Job.objects.filter(claimable).order_by('run_at', 'id').values_list('id', flat=True)
+
+    claimed = []
+    for job_id in candidates[:limit * 2]:
+        token = uuid.uuid4().hex
+        updated = Job.objects.filter(claimable, id=job_id).update(
+            status='running',
+            token=token,
+            locked_until=now + visibility_timeout,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        # Zero rows means another worker claimed it first
+        if updated:
+            claimed.append((job_id, token))
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def _fail(job, error):
+    now = timezone.now()
+    claimed = Job.objects.filter(id=job.id, token=job.token)
+    if job.attempts >= job.max_attempts:
+        claimed.update(status='failed', locked_until=None, last_error=error, updated_at=now)
+        logger.error('Job %s (%s) failed permanently after %d attempts', job.id, job.task, job.attempts)
+    else:
+        claimed.update(
+            status='queued', locked_until=None, last_error=error,
+            run_at=now + backoff(job.attempts), updated_at=now,
+        )
+
+
+def run_job(job_id, token):
+    """Run a claimed job and record the outcome; returns True if it succeeded
+
+    Does nothing if the claim was lost.
+    """
+    job = Job.objects.filter(id=job_id, token=token, status='running').first()
+    if job is None:
+        return False
+    if job.attempts > job.max_attempts:
+        # Claimed again after timing out on its last attempt
+        job.attempts = job.max_attempts
+        _fail(job, job.last_error or 'Timed out')
+        return False
+
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task {job.task!r}')
+        func(**job.payload)
+    except Exception:
+        logger.exception('Job %s (%s) raised on attempt %d', job.id, job.task, job.attempts)
+        _fail(job, traceback.format_exc()[-ERROR_LENGTH:])
+        return False
+
+    Job.objects.filter(id=job.id, token=token).delete()
+    return True
+
+
+def run_pending(limit=100, visibility_timeout=VISIBILITY_TIMEOUT):
+    """Claim and run due jobs in this process; returns the number that succeeded"""
+    succeeded = 0
+    for job_id, token in claim(limit, visibility_timeout):
+        succeeded += run_job(job_id, token)
+    return succeeded
@@ -0,0 +1,70 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from core.distance import haversine, haversine_matrix
+from core.views import calculate_distance
+
+
+def best_of(repeat, func):
+    """Fastest wall-clock time of ``repeat`` runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark the vectorized haversine engine against calculate_distance loops'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--n', type=int, default=100000,
+                            help='Number of destinations')
+        parser.add_argument('--m', type=int, default=100,
+                            help='Number of origins for the M x N workload')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        n, m, repeat = options['n'], options['m'], options['repeat']
+
+        destinations = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(n)]
+        origins = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(m)]
+        dest_array = np.array(destinations)
+        lat, lon = origins[0]
+
+        def scalar_vector():
+            return [calculate_distance(lat, lon, d_lat, d_lon) for d_lat, d_lon in destinations]
+
+        def numpy_vector():
+            return haversine(lat, lon, dest_array[:, 0], dest_array[:, 1])
+
+        scalar_time = best_of(repeat, scalar_vector)
+        numpy_time = best_of(repeat, numpy_vector)
+        self._report(f'1 x {n}', scalar_time, numpy_time)
+        max_error = float(np.max(np.abs(np.array(scalar_vector()) - numpy_vector())))
+
+        # The scalar M x N run is extrapolated from a slice to keep runtime sane
+        sample = max(1, min(m, 1000000 // max(n, 1)))
+
+        def scalar_matrix():
+            return [
+                [calculate_distance(o_lat, o_lon, d_lat, d_lon) for d_lat, d_lon in destinations]
+                for o_lat, o_lon in origins[:sample]
+            ]
+
+        scalar_time = best_of(1, scalar_matrix) * m / sample
+        numpy_time = best_of(repeat, lambda: haversine_matrix(origins, dest_array))
+        self._report(f'{m} x {n}', scalar_time, numpy_time)
+
+        self.stdout.write(f'\nMax absolute difference vs calculate_distance: {max_error:.3e} km')
+
+    def _report(self, label, scalar_time, numpy_time):
+        self.stdout.write(f'\n{label}')
+        self.stdout.write(f'  calculate_distance loop: {scalar_time * 1000:10.2f} ms')
+        self.stdout.write(f'  haversine (NumPy):       {numpy_time * 1000:10.2f} ms')
+        self.stdout.write(f'  speedup:                 {scalar_time / numpy_time:10.1f}x')
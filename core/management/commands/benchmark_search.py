@@ -0,0 +1,110 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from accounts.models import User
+from core.models import WasteReport
+from core.pagination import paginate
+from core.search import SEARCH_ORDERING, fts_available, search_reports
+from core.views import REPORT_ORDERING
+
+COMMON_WORDS = ['plastic', 'bottles', 'garbage', 'overflowing', 'street', 'bins', 'cardboard',
+                'glass', 'metal', 'cans', 'broken', 'furniture', 'dumped', 'near', 'park']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Benchmark FTS5 report search against the icontains path on synthetic reports. '
+            'Data is inserted inside a transaction that is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reports', type=int, default=500000,
+                            help='Number of synthetic reports to insert')
+        parser.add_argument('--users', type=int, default=2000,
+                            help='Number of synthetic citizens')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per search term')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError('The FTS5 search index is not available on this database')
+
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS('\n✓ Synthetic data rolled back'))
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        vocabulary = [
+            ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 9)))
+            for _ in range(20000)
+        ]
+
+        start = time.perf_counter()
+        User.objects.bulk_create([
+            User(username=f'bench_{i}_{rng.choice(vocabulary)}', email=f'bench_{i}@example.com',
+                 password='!', role='citizen')
+            for i in range(options['users'])
+        ], batch_size=1000)
+        citizens = list(User.objects.filter(username__startswith='bench_').values_list('id', 'username'))
+
+        batch = []
+        for _ in range(options['reports']):
+            words = rng.sample(COMMON_WORDS, 3) + rng.choices(vocabulary, k=rng.randint(5, 15))
+            rng.shuffle(words)
+            batch.append(WasteReport(
+                citizen_id=rng.choice(citizens)[0],
+                description=' '.join(words).capitalize() + '.',
+                latitude=round(rng.uniform(-60, 60), 6),
+                longitude=round(rng.uniform(-180, 180), 6),
+            ))
+            if len(batch) == 5000:
+                WasteReport.objects.bulk_create(batch)
+                batch = []
+        WasteReport.objects.bulk_create(batch)
+        self.stdout.write(f'Inserted {options["reports"]} reports in {time.perf_counter() - start:.1f} s')
+
+        terms = {
+            'common word': 'plastic',
+            'two words': 'broken furniture',
+            'rare word': rng.choice(vocabulary),
+            'prefix': rng.choice(vocabulary)[:4],
+            'username': citizens[0][1],
+            'no match': 'zzzzzzzzzz',
+        }
+        reports = WasteReport.objects.select_related('citizen', 'center')
+
+        self.stdout.write(f'\nFirst page of 25, best of {options["repeat"]} runs')
+        self.stdout.write(f'  {"term":<12} {"matches":>8} {"icontains":>12} {"fts5":>10} {"speedup":>8}')
+        for label, term in terms.items():
+            def icontains():
+                return paginate(reports.filter(
+                    Q(citizen__username__icontains=term) |
+                    Q(description__icontains=term)
+                ), REPORT_ORDERING)
+
+            def fts():
+                return paginate(search_reports(reports, term), SEARCH_ORDERING)
+
+            icontains_time = self._best(options['repeat'], icontains)
+            fts_time = self._best(options['repeat'], fts)
+            matches = search_reports(WasteReport.objects.all(), term).count()
+            self.stdout.write(f'  {label:<12} {matches:>8} {icontains_time * 1000:>9.1f} ms '
+                              f'{fts_time * 1000:>7.1f} ms {icontains_time / fts_time:>7.1f}x')
+
+    def _best(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
@@ -0,0 +1,124 @@
+import math
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from core.spatial import CenterIndex
+from core.views import calculate_distance
+
+
+# Share of centers accepting each synthetic material, for the filtered queries
+MATERIAL_SHARES = {'plastic': 0.5, 'glass': 0.2, 'batteries': 0.001}
+
+
+def random_point(rng):
+    """Uniformly distributed point on the sphere as (latitude, longitude)"""
+    latitude = math.degrees(math.asin(2 * rng.random() - 1))
+    longitude = rng.uniform(-180, 180)
+    return latitude, longitude
+
+
+def linear_nearest(rows, latitude, longitude):
+    """The original find_nearest_center scan, minus the ORM"""
+    min_distance = float('inf')
+    nearest = None
+    for center_id, center_lat, center_lon, _ in rows:
+        distance = calculate_distance(latitude, longitude, center_lat, center_lon)
+        if distance < min_distance:
+            min_distance = distance
+            nearest = center_id
+    return nearest, min_distance
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the spatial center index against the linear haversine scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                            help='Number of synthetic centers to index')
+        parser.add_argument('--queries', type=int, default=100,
+                            help='Number of nearest-center lookups per size')
+        parser.add_argument('--radius', type=float, default=10,
+                            help='Radius in km for the radius query timing')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        for size in options['sizes']:
+            rows = [
+                (i, *random_point(rng), ', '.join(
+                    material for material, share in MATERIAL_SHARES.items() if rng.random() < share
+                ))
+                for i in range(size)
+            ]
+            queries = [random_point(rng) for _ in range(options['queries'])]
+
+            start = time.perf_counter()
+            index = CenterIndex(rows)
+            build_time = time.perf_counter() - start
+
+            # Material trees are built by the first query for each material
+            start = time.perf_counter()
+            for material in MATERIAL_SHARES:
+                index.material_tree(material)
+            material_build_time = time.perf_counter() - start
+
+            index_times, linear_times, knn_times, radius_times = [], [], [], []
+            material_times = {material: [] for material in (*MATERIAL_SHARES, 'unknown')}
+            mismatches = 0
+            for latitude, longitude in queries:
+                start = time.perf_counter()
+                center_id, distance = index.nearest(latitude, longitude)[0]
+                index_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                expected_id, expected_distance = linear_nearest(rows, latitude, longitude)
+                linear_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                index.nearest(latitude, longitude, k=5)
+                knn_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                index.nearest(latitude, longitude, k=100, radius_km=options['radius'])
+                radius_times.append(time.perf_counter() - start)
+
+                for material, times in material_times.items():
+                    start = time.perf_counter()
+                    index.nearest(latitude, longitude, k=5, materials=[material])
+                    times.append(time.perf_counter() - start)
+
+                if center_id != expected_id and not math.isclose(distance, expected_distance, abs_tol=1e-6):
+                    mismatches += 1
+
+            index_mean = statistics.mean(index_times)
+            linear_mean = statistics.mean(linear_times)
+            self.stdout.write(f'\n{size} centers, {len(queries)} queries')
+            self.stdout.write(f'  index build:  {build_time * 1000:10.1f} ms')
+            self.stdout.write(f'  material trees:{material_build_time * 1000:9.1f} ms (built on first use)')
+            self.stdout.write(f'  index query:  {index_mean * 1000:10.3f} ms mean, '
+                              f'{percentile(index_times, 99) * 1000:.3f} ms p99')
+            self.stdout.write(f'  linear scan:  {linear_mean * 1000:10.3f} ms mean, '
+                              f'{percentile(linear_times, 99) * 1000:.3f} ms p99')
+            self.stdout.write(f'  speedup:      {linear_mean / index_mean:10.1f}x')
+            self.stdout.write(f'  k=5 query:    {statistics.mean(knn_times) * 1000:10.3f} ms mean, '
+                              f'{percentile(knn_times, 99) * 1000:.3f} ms p99')
+            self.stdout.write(f'  radius query: {statistics.mean(radius_times) * 1000:10.3f} ms mean, '
+                              f'{percentile(radius_times, 99) * 1000:.3f} ms p99 '
+                              f'({options["radius"]:g} km)')
+            for material, times in material_times.items():
+                share = f'{MATERIAL_SHARES[material]:.1%} of centers' if material in MATERIAL_SHARES else 'no centers'
+                self.stdout.write(f'  {material + ":":<13} {statistics.mean(times) * 1000:10.3f} ms mean, '
+                                  f'{percentile(times, 99) * 1000:.3f} ms p99 (k=5, {share})')
+
+            if mismatches:
+                self.stdout.write(self.style.ERROR(f'  {mismatches} lookups disagreed with the linear scan'))
+            else:
+                self.stdout.write(self.style.SUCCESS('  ✓ All lookups match the linear scan'))
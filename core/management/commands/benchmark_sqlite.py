@@ -0,0 +1,177 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from core.sqlite import apply_pragmas, configured_pragmas
+
+SCHEMA = '''
+CREATE TABLE report (
+    id INTEGER PRIMARY KEY,
+    citizen_id INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX report_status_created ON report (status, created_at DESC, id DESC);
+CREATE INDEX report_citizen_created ON report (citizen_id, created_at DESC, id DESC);
+'''
+STATUSES = ('pending', 'in_progress', 'completed')
+
+
+def connect(path, pragmas):
+    # Same driver settings as Django: autocommit and a 5 s lock timeout
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    apply_pragmas(connection, pragmas)
+    return connection
+
+
+class Worker(threading.Thread):
+    def __init__(self, path, pragmas, deadline, action, seed):
+        super().__init__(daemon=True)
+        self.connection = connect(path, pragmas)
+        self.deadline = deadline
+        self.action = action
+        self.rng = random.Random(seed)
+        self.done = self.locked = 0
+        self.latencies = []
+
+    def run(self):
+        try:
+            while time.perf_counter() < self.deadline:
+                start = time.perf_counter()
+                try:
+                    self.action(self.connection, self.rng)
+                except sqlite3.OperationalError as e:
+                    if 'locked' not in str(e) and 'busy' not in str(e):
+                        raise
+                    self.locked += 1
+                    continue
+                self.latencies.append(time.perf_counter() - start)
+                self.done += 1
+        finally:
+            self.connection.close()
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def read(connection, rng):
+    """List pages: a page of reports with a status, and a page of a citizen's reports"""
+    connection.execute(
+        'SELECT id, citizen_id, description, status, created_at FROM report '
+        'WHERE status = ? ORDER BY created_at DESC, id DESC LIMIT 25', (rng.choice(STATUSES),)
+    ).fetchall()
+    connection.execute(
+        'SELECT id, description, status, created_at FROM report '
+        'WHERE citizen_id = ? ORDER BY created_at DESC, id DESC LIMIT 25', (rng.randint(1, 1000),)
+    ).fetchall()
+
+
+def write(connection, rng):
+    """A citizen submission or a staff status update, each its own commit"""
+    if rng.random() < 0.5:
+        connection.execute(
+            'INSERT INTO report (citizen_id, description, latitude, longitude, status, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (rng.randint(1, 1000), 'Overflowing bins near the park', rng.uniform(-60, 60),
+             rng.uniform(-180, 180), 'pending', now()),
+        )
+    else:
+        connection.execute(
+            'UPDATE report SET status = ? WHERE id = (SELECT MAX(id) FROM report) - ?',
+            (rng.choice(STATUSES), rng.randint(0, 1000)),
+        )
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Benchmark concurrent reads and writes on a scratch SQLite database, with the '
+            'library defaults and with SQLITE_PRAGMAS')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Reading threads')
+        parser.add_argument('--writers', type=int, default=4, help='Writing threads')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+        parser.add_argument('--rows', type=int, default=50000, help='Reports inserted before each run')
+        parser.add_argument('--directory', help='Where to create the scratch databases (default: a temporary directory)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['readers'] < 0 or options['writers'] < 0 or options['readers'] + options['writers'] == 0:
+            raise CommandError('At least one reader or writer is needed')
+        if options['seconds'] <= 0:
+            raise CommandError('--seconds must be positive')
+
+        pragmas = configured_pragmas()
+        configurations = [('defaults', {}), ('SQLITE_PRAGMAS', pragmas)]
+        self.stdout.write(f'{options["readers"]} readers, {options["writers"]} writers, '
+                          f'{options["seconds"]:g} s per run, {options["rows"]} rows')
+        self.stdout.write(f'SQLITE_PRAGMAS: {pragmas or "(none)"}\n')
+        self.stdout.write(f'  {"configuration":<15} {"reads/s":>9} {"writes/s":>9} '
+                          f'{"write p50":>10} {"write p99":>10} {"locked":>7}')
+
+        results = {}
+        with tempfile.TemporaryDirectory(dir=options['directory']) as directory:
+            for label, config in configurations:
+                path = os.path.join(directory, f'{label.lower()}.sqlite3')
+                results[label] = self._run(path, config, options)
+                reads, writes, p50, p99, locked = results[label]
+                self.stdout.write(f'  {label:<15} {reads:>9.0f} {writes:>9.0f} '
+                                  f'{p50 * 1000:>7.2f} ms {p99 * 1000:>7.2f} ms {locked:>7}')
+
+        before, after = results['defaults'], results['SQLITE_PRAGMAS']
+        for name, index in (('Reads', 0), ('Writes', 1)):
+            if before[index]:
+                self.stdout.write(f'{name}: {after[index] / before[index]:.1f}x')
+        self.stdout.write(self.style.SUCCESS('\n✓ Scratch databases removed'))
+
+    def _run(self, path, pragmas, options):
+        rng = random.Random(options['seed'])
+        setup = connect(path, pragmas)
+        setup.executescript(SCHEMA)
+        start = datetime.now(timezone.utc) - timedelta(days=365)
+        setup.execute('BEGIN')
+        setup.executemany(
+            'INSERT INTO report (citizen_id, description, latitude, longitude, status, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            ((rng.randint(1, 1000), 'Overflowing bins near the park', rng.uniform(-60, 60),
+              rng.uniform(-180, 180), rng.choice(STATUSES),
+              (start + timedelta(seconds=i * 600)).isoformat())
+             for i in range(options['rows'])),
+        )
+        setup.execute('COMMIT')
+        setup.close()
+
+        deadline = time.perf_counter() + options['seconds']
+        workers = (
+            [Worker(path, pragmas, deadline, read, options['seed'] + i) for i in range(options['readers'])] +
+            [Worker(path, pragmas, deadline, write, options['seed'] + 1000 + i) for i in range(options['writers'])]
+        )
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        readers, writers = workers[:options['readers']], workers[options['readers']:]
+        latencies = [latency for worker in writers for latency in worker.latencies]
+        return (
+            sum(worker.done for worker in readers) / options['seconds'],
+            sum(worker.done for worker in writers) / options['seconds'],
+            percentile(latencies, 0.5),
+            percentile(latencies, 0.99),
+            sum(worker.locked for worker in workers),
+        )
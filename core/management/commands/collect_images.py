@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from core.blobs import BATCH_SIZE, GRACE_PERIOD, collect_garbage, rebuild_references, sweep_untracked
+
+
+class Command(BaseCommand):
+    help = 'Delete stored report images that no report references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Images deleted per transaction')
+        parser.add_argument('--grace-minutes', type=int, default=int(GRACE_PERIOD.total_seconds() // 60),
+                            help='Keep images that were unreferenced or uploaded more recently than this')
+        parser.add_argument('--sweep', action='store_true',
+                            help='Also delete stored files that have no reference count, such as rolled back uploads')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute the reference counts from the reports first')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if options['grace_minutes'] < 0:
+            raise CommandError('--grace-minutes cannot be negative')
+        grace_period = timedelta(minutes=options['grace_minutes'])
+
+        if options['rebuild']:
+            images = rebuild_references()
+            self.stdout.write(f'  Recounted references to {images} images')
+
+        deleted = collect_garbage(batch_size=options['batch_size'], grace_period=grace_period)
+        if options['sweep']:
+            deleted += sweep_untracked(grace_period=grace_period, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Deleted {deleted} unreferenced images'))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from core.analytics import SETTLE_DELAY, export_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Write or update the partitioned Parquet snapshot of reports, centers and users for analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', nargs='?', default='analytics',
+                            help='Snapshot directory (default: analytics)')
+        parser.add_argument('--full', action='store_true',
+                            help='Discard the existing report partitions and export everything again')
+        parser.add_argument('--settle-seconds', type=float, default=SETTLE_DELAY.total_seconds(),
+                            help='Leave out reports updated within this many seconds of the run')
+
+    def handle(self, *args, **options):
+        result = export_snapshot(
+            options['directory'],
+            full=options['full'],
+            settle_delay=timedelta(seconds=options['settle_seconds']),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Exported {result["reports"]} reports into {result["files"]} partition files, '
+            f'{result["centers"]} centers and {result["users"]} users to {options["directory"]}'
+        ))
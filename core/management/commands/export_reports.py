@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, parse_filters, stream_reports
+
+
+class Command(BaseCommand):
+    help = 'Stream waste reports to a CSV or JSON Lines file with constant memory use'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--status', help='Only export reports with this status')
+        parser.add_argument('--center', help='Only export reports assigned to this center id')
+        parser.add_argument('--since', help='Only export reports created on or after this date')
+        parser.add_argument('--until', help='Only export reports created on or before this date')
+        parser.add_argument('--output', '-o', help='File to write; defaults to standard output')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='Rows fetched from the database per round trip')
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_filters(options)
+            chunks = stream_reports(options['format'], chunk_size=options['chunk_size'], **filters)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f'✓ Exported reports to {options["output"]}'))
@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from core.derivatives import generate_derivatives
+from core.models import WasteReport
+
+
+def _generate(report_id):
+    try:
+        return report_id, generate_derivatives(report_id), None
+    except Exception as e:
+        return report_id, False, e
+
+
+def _generate_in_thread(report_id):
+    try:
+        return _generate(report_id)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails and previews for report images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Regenerate derivatives for every report image')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Images processed in parallel; 1 processes them in this thread')
+
+    def handle(self, *args, **options):
+        reports = WasteReport.objects.exclude(Q(image='') | Q(image__isnull=True))
+        if not options['all']:
+            reports = reports.filter(Q(image_thumbnail='') | Q(image_thumbnail__isnull=True) |
+                                     Q(image_preview='') | Q(image_preview__isnull=True))
+        report_ids = list(reports.order_by('id').values_list('id', flat=True))
+        if not report_ids:
+            self.stdout.write(self.style.SUCCESS('✓ Every report image already has derivatives'))
+            return
+
+        generated = failed = 0
+        if options['workers'] > 1:
+            executor = ThreadPoolExecutor(max_workers=options['workers'])
+            results = executor.map(_generate_in_thread, report_ids)
+        else:
+            executor = None
+            results = map(_generate, report_ids)
+        try:
+            for report_id, written, error in results:
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f'  Report #{report_id}: {error}')
+                elif written:
+                    generated += 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Generated derivatives for {generated} of {len(report_ids)} reports'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} images could not be processed'))
@@ -0,0 +1,264 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from importlib import import_module
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+
+SERVERS = ('wsgi', 'asgi')
+READY_TIMEOUT = 60
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """A WSGI server handling connections on a fixed pool of threads, like gunicorn's gthread workers"""
+    request_queue_size = 1024
+
+    def __init__(self, address, threads):
+        super().__init__(address, QuietHandler)
+        self.pool = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def request_head(path, cookie):
+    return (f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n'
+            f'Cookie: {cookie}\r\n').encode()
+
+
+async def read_status(reader):
+    line = await reader.readline()
+    await reader.read()
+    parts = line.split()
+    return int(parts[1]) if len(parts) > 1 else 0
+
+
+async def slow_client(port, path, cookie, deadline, interval):
+    """A client trickling its headers until the deadline, then reading the response"""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return False
+    try:
+        writer.write(request_head(path, cookie))
+        while time.monotonic() < deadline:
+            await asyncio.sleep(interval)
+            writer.write(b'X-Slow: 1\r\n')
+            await writer.drain()
+        writer.write(b'\r\n')
+        await writer.drain()
+        return await asyncio.wait_for(read_status(reader), 30) == 200
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        writer.close()
+
+
+async def fast_request(port, path, cookie):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(request_head(path, cookie) + b'\r\n')
+        await writer.drain()
+        return await read_status(reader)
+    finally:
+        writer.close()
+
+
+async def fast_client(port, path, cookie, deadline, timeout, latencies, failures):
+    """A client sending complete requests back to back"""
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        try:
+            status = await asyncio.wait_for(fast_request(port, path, cookie), timeout)
+        except (OSError, asyncio.TimeoutError):
+            status = None
+        if status == 200:
+            latencies.append(time.monotonic() - start)
+        else:
+            failures.append(status)
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Measure how many concurrent connections the JSON endpoints sustain under WSGI '
+            '(fixed thread pool) and under uvicorn (ASGI), with slow clients holding connections open')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slow-clients', type=int, default=200,
+                            help='Connections trickling their headers for the whole run')
+        parser.add_argument('--fast-clients', type=int, default=8,
+                            help='Clients sending complete requests back to back')
+        parser.add_argument('--threads', type=int, default=16, help='WSGI worker threads')
+        parser.add_argument('--seconds', type=float, default=10.0, help='Duration of each run')
+        parser.add_argument('--timeout', type=float, default=5.0,
+                            help='Seconds after which a fast request counts as failed')
+        parser.add_argument('--path', help='Endpoint to request (default: the statistics API)')
+        # Internal: run one server on a scratch database
+        parser.add_argument('--serve', choices=SERVERS, help='(internal) run a server')
+        parser.add_argument('--database-file', help='(internal) scratch database')
+        parser.add_argument('--port', type=int, help='(internal) port to listen on')
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return self.serve(options)
+        if options['slow_clients'] < 0 or options['fast_clients'] < 1 or options['threads'] < 1:
+            raise CommandError('Need at least one fast client and one thread, and no negative counts')
+        if options['seconds'] <= 0 or options['timeout'] <= 0:
+            raise CommandError('--seconds and --timeout must be positive')
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise CommandError('The ASGI run needs uvicorn: pip install uvicorn')
+
+        path = options['path'] or reverse('statistics_api')
+        self.stdout.write(f'{options["slow_clients"]} slow clients, {options["fast_clients"]} fast clients, '
+                          f'{options["seconds"]:g} s per run, GET {path}')
+        self.stdout.write(f'  {"server":<26} {"fast req/s":>10} {"p50":>9} {"p99":>9} {"failed":>7} {"slow ok":>8}')
+
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, 'loadtest.sqlite3')
+            for server in SERVERS:
+                label = f'WSGI, {options["threads"]} threads' if server == 'wsgi' else 'uvicorn (ASGI)'
+                rate, p50, p99, failed, slow_ok = self._run(server, database, path, options)
+                self.stdout.write(f'  {label:<26} {rate:>10.1f} {p50 * 1000:>6.1f} ms {p99 * 1000:>6.1f} ms '
+                                  f'{failed:>7} {slow_ok:>4}/{options["slow_clients"]}')
+        self.stdout.write(self.style.SUCCESS('\n✓ Scratch database removed'))
+
+    def _run(self, server, database, path, options):
+        port = free_port()
+        command = [
+            sys.executable, '-m', 'django', 'loadtest', '--serve', server,
+            '--database-file', database, '--port', str(port), '--threads', str(options['threads']),
+        ]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'waste_management_system.settings'))
+        with tempfile.TemporaryFile() as errors:
+            process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE,
+                                       stderr=errors, text=True)
+            try:
+                cookie = process.stdout.readline().strip()
+                if not cookie or not self._wait_for(port, process):
+                    errors.seek(0)
+                    raise CommandError(f'The {server} server did not start:\n{errors.read().decode()[-2000:]}')
+                return asyncio.run(self._load(port, path, cookie, options))
+            finally:
+                process.terminate()
+                try:
+                    process.wait(10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+
+    def _wait_for(self, port, process):
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline and process.poll() is None:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return True
+            except OSError:
+                time.sleep(0.05)
+        return False
+
+    async def _load(self, port, path, cookie, options):
+        # Warm up imports and the database connection
+        await asyncio.wait_for(fast_request(port, path, cookie), READY_TIMEOUT)
+        deadline = time.monotonic() + options['seconds']
+        latencies, failures = [], []
+        slow = [
+            asyncio.create_task(slow_client(port, path, cookie, deadline, 1.0))
+            for _ in range(options['slow_clients'])
+        ]
+        # Let the slow clients connect first, as they would on a busy server
+        await asyncio.sleep(min(0.5, options['seconds'] / 4))
+        await asyncio.gather(*(
+            fast_client(port, path, cookie, deadline, options['timeout'], latencies, failures)
+            for _ in range(options['fast_clients'])
+        ))
+        slow_ok = sum(await asyncio.gather(*slow))
+        return (
+            len(latencies) / options['seconds'],
+            percentile(latencies, 0.5),
+            percentile(latencies, 0.99),
+            len(failures),
+            slow_ok,
+        )
+
+    def serve(self, options):
+        """Serve the project on a scratch database; prints an admin session cookie once ready"""
+        connection = connections['default']
+        connection.close()
+        connection.settings_dict['NAME'] = options['database_file']
+        call_command('migrate', verbosity=0)
+        cookie = self._seed()
+        self.stdout.write(cookie)
+        self.stdout.flush()
+
+        if options['serve'] == 'wsgi':
+            from django.core.wsgi import get_wsgi_application
+            server = PooledWSGIServer(('127.0.0.1', options['port']), options['threads'])
+            server.set_app(get_wsgi_application())
+            server.serve_forever()
+        else:
+            import uvicorn
+            from django.core.asgi import get_asgi_application
+            uvicorn.run(get_asgi_application(), host='127.0.0.1', port=options['port'],
+                        log_level='warning', lifespan='off')
+
+    def _seed(self):
+        from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+        from accounts.models import User
+        from core.models import RecyclingCenter
+
+        user = User.objects.filter(username='loadtest').first()
+        if user is None:
+            user = User.objects.create_user('loadtest', 'loadtest@example.com', None, role='admin')
+            RecyclingCenter.objects.bulk_create(
+                RecyclingCenter(
+                    name=f'Load Test Center {i}', address=f'{i} Test St',
+                    latitude=Decimal('40.7') + Decimal(i) / 100, longitude=Decimal('-74.0'),
+                    materials_accepted='All', working_hours='24/7',
+                )
+                for i in range(50)
+            )
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
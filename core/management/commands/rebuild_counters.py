@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.counters import rebuild_counts, verify_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild and verify the materialized report counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Report mismatches without rewriting the counters')
+
+    def handle(self, *args, **options):
+        mismatches = verify_counts()
+        for (scope, key, status), (stored, expected) in sorted(mismatches.items()):
+            self.stdout.write(f'  {scope}:{key} {status}: stored {stored}, expected {expected}')
+
+        if options['verify_only']:
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} counters are out of date')
+            self.stdout.write(self.style.SUCCESS('✓ All report counters are exact'))
+            return
+
+        rows = rebuild_counts()
+        remaining = verify_counts()
+        if remaining:
+            raise CommandError(f'{len(remaining)} counters still differ after rebuild')
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Rebuilt {rows} report counters ({len(mismatches)} were out of date)'
+        ))
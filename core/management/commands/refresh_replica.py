@@ -0,0 +1,55 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from core.replica import refresh_replica
+
+
+class Command(BaseCommand):
+    help = 'Write a replica heartbeat on the primary and refresh a SQLite snapshot replica'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help='Replica alias (default: REPLICA_DATABASE)')
+        parser.add_argument('--every', type=float,
+                            help='Keep refreshing every this many seconds instead of once')
+
+    def handle(self, *args, **options):
+        alias = options['database'] or getattr(settings, 'REPLICA_DATABASE', None)
+        if not alias:
+            raise CommandError('Pass --database or set REPLICA_DATABASE')
+        if alias not in connections:
+            raise CommandError(f'No database {alias!r} in DATABASES')
+        if options['every'] is not None and options['every'] <= 0:
+            raise CommandError('--every must be positive')
+
+        self.stopping = False
+        previous_handler = signal.signal(signal.SIGTERM, self.stop)
+        refreshes, copied = 0, False
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    copied = refresh_replica(alias)
+                except ImproperlyConfigured as e:
+                    raise CommandError(str(e))
+                finally:
+                    close_old_connections()
+                refreshes += 1
+                if options['every'] is None or self.stopping:
+                    break
+                time.sleep(max(options['every'] - (time.monotonic() - started), 0))
+                if self.stopping:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+
+        action = 'Copied the primary to' if copied else 'Wrote heartbeats for'
+        self.stdout.write(self.style.SUCCESS(f'✓ {action} replica {alias!r} ({refreshes} refreshes)'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
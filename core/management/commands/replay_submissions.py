@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.writebuffer import recover_segments
+
+
+class Command(BaseCommand):
+    help = 'Write the buffered submissions left in the submission log by processes that stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory',
+                            help="Log directory (default: SUBMISSION_BUFFER['DIRECTORY'])")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Submissions committed per transaction')
+
+    def handle(self, *args, **options):
+        directory = options['directory'] or (getattr(settings, 'SUBMISSION_BUFFER', None) or {}).get('DIRECTORY')
+        if not directory:
+            raise CommandError('Pass --directory or configure SUBMISSION_BUFFER')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        try:
+            segments, submissions = recover_segments(str(directory), options['batch_size'])
+        except FileNotFoundError:
+            raise CommandError(f'{directory} does not exist')
+        self.stdout.write(self.style.SUCCESS(f'✓ Replayed {submissions} submissions from {segments} logs'))
@@ -0,0 +1,116 @@
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from core.jobs import VISIBILITY_TIMEOUT, claim, run_job
+
+
+def _init_process():
+    # Processes that are spawned rather than forked start without Django set up
+    django.setup()
+    connections.close_all()
+
+
+def _run_in_process(job_id, token):
+    close_old_connections()
+    try:
+        return run_job(job_id, token)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database job queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 2,
+                            help='Worker processes; 0 runs jobs in this process')
+        parser.add_argument('--visibility-timeout', type=int, default=int(VISIBILITY_TIMEOUT.total_seconds()),
+                            help='Seconds before a job claimed by a worker that stopped responding is retried')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait before checking an empty queue again')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no jobs are due instead of waiting for more')
+
+    def handle(self, *args, **options):
+        if options['processes'] < 0:
+            raise CommandError('--processes cannot be negative')
+        if options['visibility_timeout'] < 1:
+            raise CommandError('--visibility-timeout must be at least 1 second')
+        self.visibility_timeout = timedelta(seconds=options['visibility_timeout'])
+        self.stopping = False
+        previous_handler = signal.signal(signal.SIGTERM, self.stop)
+
+        try:
+            if options['processes'] == 0:
+                succeeded, failed = self.run_inline(options)
+            else:
+                succeeded, failed = self.run_pool(options)
+        except KeyboardInterrupt:
+            self.stdout.write('Interrupted; unfinished jobs will be retried after the visibility timeout')
+            return
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+        self.stdout.write(self.style.SUCCESS(f'✓ Ran {succeeded + failed} jobs ({failed} failed)'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def run_inline(self, options):
+        succeeded = failed = 0
+        while not self.stopping:
+            claimed = claim(1, self.visibility_timeout)
+            if not claimed:
+                if options['burst']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            if run_job(*claimed[0]):
+                succeeded += 1
+            else:
+                failed += 1
+        return succeeded, failed
+
+    def run_pool(self, options):
+        processes = options['processes']
+        succeeded = failed = 0
+        # Forked processes must not share the parent's database connections
+        connections.close_all()
+        executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_process)
+        running = set()
+        try:
+            while True:
+                if not self.stopping and len(running) < processes:
+                    for job_id, token in claim(processes - len(running), self.visibility_timeout):
+                        running.add(executor.submit(_run_in_process, job_id, token))
+                if not running:
+                    if self.stopping or options['burst']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        ok = future.result()
+                    except BrokenProcessPool:
+                        # A process died mid-job; its job is retried after the timeout
+                        self.stderr.write('A worker process died; restarting the pool')
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_process)
+                        running = set()
+                        failed += 1
+                        break
+                    if ok:
+                        succeeded += 1
+                    else:
+                        failed += 1
+        finally:
+            executor.shutdown(wait=True)
+        return succeeded, failed
@@ -0,0 +1,136 @@
+"""
+Serving of uploaded media after a permission check.
+
+Django only decides whether a file may be served. With
+``MEDIA_SENDFILE_BACKEND`` set, the response carries no body and the front
+server sends the bytes itself:
+
+* ``'nginx'`` sets ``X-Accel-Redirect`` to ``MEDIA_ACCEL_PREFIX`` + name,
+  which must be an ``internal`` location aliased to ``MEDIA_ROOT``;
+* ``'sendfile'`` sets ``X-Sendfile`` to the absolute path (Apache
+  mod_xsendfile, lighttpd).
+
+Without a front server the file is streamed in blocks by ``FileResponse``,
+with ``ETag``/``Last-Modified`` validation and single ``Range`` requests.
+Under ASGI the blocks are read in worker threads as they are sent.
+Report media never changes under a given name (originals are content
+addressed and derivatives get fresh names), so every response may be cached
+privately for a year.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
+
+from .streaming import stream_for
+
+CACHE_CONTROL = 'private, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(stat):
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive for a single byte range, None to send the whole file
+
+    Raises ``ValueError`` when the range cannot be satisfied.
+    """
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        # Malformed or multiple ranges; the full file is a valid answer
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or end < start:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, storage, name):
+    """Response delivering ``name`` from a file system ``storage``"""
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('File not found')
+
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+    backend = getattr(settings, 'MEDIA_SENDFILE_BACKEND', None)
+
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/') + quote(name)
+    elif backend == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    elif backend is None:
+        response = _stream_file(request, path, stat, content_type)
+    else:
+        raise ValueError(f'Unknown MEDIA_SENDFILE_BACKEND {backend!r}')
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
+def _stream_file(request, path, stat, content_type):
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or etag in parse_etags(if_range):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response.block_size = CHUNK_SIZE
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(path, start, end - start + 1), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Reading a file needs no database connection, so any thread will do
+    return stream_for(request, response, thread_sensitive=False)
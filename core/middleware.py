@@ -0,0 +1,168 @@
+import math
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.template.defaultfilters import filesizeformat
+from django.urls import Resolver404, resolve
+
+from .context import Actor
+from .ratelimit import CacheBuckets, LocalBuckets, Rate
+from .replica import pin_to_primary, replica_database
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class RequestSizeLimitMiddleware:
+    """Reject request bodies larger than ``MAX_UPLOAD_SIZE`` before they are read
+
+    The declared ``Content-Length`` is checked, so an oversized upload is
+    refused with 413 without parsing or spooling any of it to disk.
+    """
+
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.refuse(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.refuse(request) or await self.get_response(request)
+
+    def refuse(self, request):
+        limit = getattr(settings, 'MAX_UPLOAD_SIZE', None)
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if limit is not None and length > limit:
+            return HttpResponse(
+                f'Request body too large; uploads are limited to {filesizeformat(limit)}.',
+                status=413,
+                content_type='text/plain',
+            )
+        return None
+
+
+class RequestActorMiddleware:
+    """Expose the requesting user's role and assigned center as ``request.actor``
+
+    Both are resolved lazily and at most once per request; see
+    ``core.context``.
+    """
+
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.actor = Actor(request)
+        return self.get_response(request)
+
+
+class ReplicaPinMiddleware:
+    """Record when a client last wrote, so they read their writes
+
+    Views reading from the replica fall back to the primary for a client
+    until the replica has copied their last write; see ``core.replica``.
+    """
+
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not replica_database():
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and hasattr(request, 'session'):
+            pin_to_primary(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.method not in SAFE_METHODS and hasattr(request, 'session'):
+            # Loading the session queries the database
+            await sync_to_async(pin_to_primary)(request)
+        return response
+
+
+class RateLimitMiddleware:
+    """Throttle writes to the views named in ``RATE_LIMITS`` with token buckets
+
+    Runs once the user is known, resolving the URL itself rather than
+    waiting for ``process_view``: by then ``CsrfViewMiddleware`` has read
+    ``request.POST``, parsing the whole body and spooling uploads to disk.
+    A refused request costs one bucket lookup: the body is never parsed, no
+    form is bound, no password hashed and nothing written. Refusals are 429
+    responses with a ``Retry-After`` header. Signed-in users get a bucket
+    per view each; anonymous clients are keyed by IP address. Safe methods
+    are never limited. See ``core.ratelimit`` for where buckets are kept.
+    """
+
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rates = {name: Rate.parse(rate) for name, rate in getattr(settings, 'RATE_LIMITS', {}).items()}
+        if not self.rates:
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        alias = getattr(settings, 'RATE_LIMIT_CACHE', None)
+        if alias:
+            self.buckets = CacheBuckets(alias)
+        else:
+            self.buckets = LocalBuckets(getattr(settings, 'RATE_LIMIT_MAX_KEYS', 10000))
+        self.ip_meta = getattr(settings, 'RATE_LIMIT_IP_META', 'REMOTE_ADDR')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.refuse(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # Safe methods skip the thread hop; the bucket lookup may hit the cache
+        if request.method in SAFE_METHODS:
+            return await self.get_response(request)
+        return await sync_to_async(self.refuse)(request) or await self.get_response(request)
+
+    def client_key(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        # A proxy header may list several addresses; the first is the client
+        address = request.META.get(self.ip_meta) or request.META.get('REMOTE_ADDR', '')
+        return f'ip:{address.split(",")[0].strip()}'
+
+    def refuse(self, request):
+        if request.method in SAFE_METHODS:
+            return None
+        try:
+            view_name = resolve(request.path_info, getattr(request, 'urlconf', None)).view_name
+        except Resolver404:
+            return None
+        rate = self.rates.get(view_name)
+        if rate is None:
+            return None
+        wait = self.buckets.take(f'{view_name}:{self.client_key(request)}', rate)
+        if not wait:
+            return None
+        response = HttpResponse('Too many requests; please try again later.', status=429, content_type='text/plain')
+        response['Retry-After'] = max(math.ceil(wait), 1)
+        return response
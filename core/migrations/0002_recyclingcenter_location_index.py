@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recyclingcenter',
+            index=models.Index(fields=['latitude', 'longitude'], name='center_location_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_recyclingcenter_location_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['latitude', 'longitude'], name='report_location_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.20 on 2026-10-18 02:58
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    WasteReport = apps.get_model('core', 'WasteReport')
+    ReportCounter = apps.get_model('core', 'ReportCounter')
+    reports = WasteReport.objects.order_by()
+    counters = []
+    for row in reports.values('status').annotate(n=Count('id')):
+        counters.append(ReportCounter(scope='global', key=0, status=row['status'], count=row['n']))
+    for row in reports.values('center_id', 'status').annotate(n=Count('id')):
+        counters.append(ReportCounter(scope='center', key=row['center_id'] or 0, status=row['status'], count=row['n']))
+    for row in reports.values('citizen_id', 'status').annotate(n=Count('id')):
+        counters.append(ReportCounter(scope='citizen', key=row['citizen_id'], status=row['status'], count=row['n']))
+    ReportCounter.objects.bulk_create(counters, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_wastereport_location_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('global', 'Global'), ('center', 'Center'), ('citizen', 'Citizen')], max_length=10)),
+                ('key', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('completed', 'Completed')], max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Report Counter',
+                'verbose_name_plural': 'Report Counters',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reportcounter',
+            constraint=models.UniqueConstraint(fields=('scope', 'key', 'status'), name='unique_report_counter'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
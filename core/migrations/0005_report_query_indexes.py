@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_reportcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['-created_at'], name='report_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['status', '-created_at'], name='report_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['center', '-created_at'], name='report_center_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['center', 'status', '-created_at'], name='report_center_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['citizen', '-created_at'], name='report_citizen_created_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_report_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='wastereport',
+            name='report_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='wastereport',
+            name='report_status_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='wastereport',
+            name='report_center_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='wastereport',
+            name='report_center_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='wastereport',
+            name='report_citizen_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='recyclingcenter',
+            index=models.Index(fields=['name', 'id'], name='center_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['-created_at', '-id'], name='report_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='report_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['center', '-created_at', '-id'], name='report_center_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['center', 'status', '-created_at', '-id'], name='report_center_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['citizen', '-created_at', '-id'], name='report_citizen_created_idx'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+# The index stores its own copy of each report's description and citizen
+# username keyed by report id. Triggers keep it current for every write path,
+# including bulk_create(), QuerySet.update() and username changes.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE core_wastereport_search USING fts5(
+        description, username,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER core_wastereport_search_insert AFTER INSERT ON core_wastereport BEGIN
+        INSERT INTO core_wastereport_search (rowid, description, username)
+        SELECT new.id, new.description, username FROM accounts_user WHERE id = new.citizen_id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_wastereport_search_update
+    AFTER UPDATE OF description, citizen_id ON core_wastereport BEGIN
+        DELETE FROM core_wastereport_search WHERE rowid = old.id;
+        INSERT INTO core_wastereport_search (rowid, description, username)
+        SELECT new.id, new.description, username FROM accounts_user WHERE id = new.citizen_id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_wastereport_search_delete AFTER DELETE ON core_wastereport BEGIN
+        DELETE FROM core_wastereport_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER accounts_user_search_rename AFTER UPDATE OF username ON accounts_user BEGIN
+        UPDATE core_wastereport_search SET username = new.username
+        WHERE rowid IN (SELECT id FROM core_wastereport WHERE citizen_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO core_wastereport_search (rowid, description, username)
+    SELECT r.id, r.description, u.username
+    FROM core_wastereport r JOIN accounts_user u ON u.id = r.citizen_id
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS accounts_user_search_rename',
+    'DROP TRIGGER IF EXISTS core_wastereport_search_delete',
+    'DROP TRIGGER IF EXISTS core_wastereport_search_update',
+    'DROP TRIGGER IF EXISTS core_wastereport_search_insert',
+    'DROP TABLE IF EXISTS core_wastereport_search',
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(CREATE_SQL[0])
+        except OperationalError:
+            # SQLite built without FTS5; search falls back to icontains
+            return
+        for sql in CREATE_SQL[1:]:
+            cursor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_report_query_indexes'),
+        ('core', '0006_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.CreateModel(
+            name='ReportSearch',
+            fields=[
+                ('report', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='core.wastereport')),
+                ('description', models.TextField()),
+                ('username', models.TextField()),
+                ('document', models.TextField(db_column='core_wastereport_search')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'core_wastereport_search',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_report_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['updated_at'], name='report_updated_idx'),
+        ),
+    ]
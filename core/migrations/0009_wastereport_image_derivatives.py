@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_wastereport_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wastereport',
+            name='image_preview',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='waste_reports/previews/'),
+        ),
+        migrations.AddField(
+            model_name='wastereport',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='waste_reports/thumbnails/'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:36
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_references(apps, schema_editor):
+    """Track the images existing reports already reference"""
+    WasteReport = apps.get_model('core', 'WasteReport')
+    ImageBlob = apps.get_model('core', 'ImageBlob')
+    references = (
+        WasteReport.objects.exclude(image='').exclude(image__isnull=True)
+        .values('image').annotate(references=Count('id')).order_by()
+    )
+    ImageBlob.objects.bulk_create(
+        (ImageBlob(name=row['image'], references=row['references']) for row in references.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_wastereport_image_derivatives'),
+    ]
+
+    operations = [
+        # Storage does not change the column; altering it for real would make
+        # SQLite rebuild the table and break the search triggers
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='wastereport',
+                    name='image',
+                    field=models.ImageField(blank=True, null=True, storage=core.storage.report_image_storage, upload_to='waste_reports/'),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('references', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Image Blob',
+                'verbose_name_plural': 'Image Blobs',
+                'indexes': [models.Index(fields=['references', 'updated_at'], name='blob_references_idx')],
+            },
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['image'], name='report_image_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['image_thumbnail'], name='report_thumbnail_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['image_preview'], name='report_preview_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:57
+
+from core import geohash
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_geohashes(apps, schema_editor):
+    """Hash the locations of existing reports"""
+    WasteReport = apps.get_model('core', 'WasteReport')
+    reports = WasteReport.objects.only('id', 'latitude', 'longitude').order_by('id')
+    batch = []
+    for report in reports.iterator(chunk_size=1000):
+        report.geohash = geohash.encode(report.latitude, report.longitude)
+        batch.append(report)
+        if len(batch) == 1000:
+            WasteReport.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    WasteReport.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0012_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportConfirmation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.TextField()),
+                ('latitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('longitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('distance', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Report Confirmation',
+                'verbose_name_plural': 'Report Confirmations',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='wastereport',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.RunPython(backfill_geohashes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='wastereport',
+            index=models.Index(fields=['geohash', 'status', 'created_at'], name='report_geohash_idx'),
+        ),
+        migrations.AddField(
+            model_name='reportconfirmation',
+            name='citizen',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_confirmations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='reportconfirmation',
+            name='report',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='confirmations', to='core.wastereport'),
+        ),
+    ]
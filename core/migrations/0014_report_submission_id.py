@@ -0,0 +1,22 @@
+# Generated by Django 4.2.20 on 2026-10-18 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_report_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wastereport',
+            name='submission_id',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='wastereport',
+            constraint=models.UniqueConstraint(condition=models.Q(('submission_id__isnull', False)), fields=('submission_id',), name='report_submission_unique'),
+        ),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.conf import settings
+from . import geohash
+from .storage import report_image_storage
 
 
 class RecyclingCenter(models.Model):
@@ -27,6 +29,10 @@ class RecyclingCenter(models.Model):
         verbose_name = 'Recycling Center'
         verbose_name_plural = 'Recycling Centers'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='center_location_idx'),
+            models.Index(fields=['name', 'id'], name='center_name_idx'),
+        ]
 
 
 class WasteReport(models.Model):
@@ -49,18 +55,254 @@ class WasteReport(models.Model):
         blank=True,
         related_name='reports'
     )
-    image = models.ImageField(upload_to='waste_reports/', blank=True, null=True)
+    # Stored under the hash of their content, see core.storage
+    image = models.ImageField(upload_to='waste_reports/', storage=report_image_storage, blank=True, null=True)
+    # Generated in the background from image, see core.derivatives
+    image_thumbnail = models.ImageField(upload_to='waste_reports/thumbnails/', blank=True, null=True, editable=False)
+    image_preview = models.ImageField(upload_to='waste_reports/previews/', blank=True, null=True, editable=False)
     description = models.TextField()
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Geohash cell of latitude/longitude, kept in step by save(); see core.dedupe
+    geohash = models.CharField(max_length=12, null=True, blank=True, editable=False)
+    # Set on reports written through the submission buffer, see core.writebuffer
+    submission_id = models.UUIDField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Report by {self.citizen.username} - {self.status}"
     
+    @property
+    def thumbnail_url(self):
+        """Thumbnail URL, or the original image until the thumbnail exists"""
+        if self.image_thumbnail:
+            return self.image_thumbnail.url
+        return self.image.url if self.image else ''
+    
+    @property
+    def preview_url(self):
+        """Preview URL, or the original image until the preview exists"""
+        if self.image_preview:
+            return self.image_preview.url
+        return self.image.url if self.image else ''
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so signal handlers can tell what changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def set_geohash(self):
+        self.geohash = geohash.encode(self.latitude, self.longitude)
+    
+    def save(self, *args, **kwargs):
+        self.set_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        # The pre_save handler locks the row until the counters are updated
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+    
+    def loaded_value(self, field_name, default=None):
+        """The value of a field as last loaded from the database"""
+        value = getattr(self, '_loaded_values', {}).get(field_name, default)
+        return default if value is models.DEFERRED else value
+    
     class Meta:
         verbose_name = 'Waste Report'
         verbose_name_plural = 'Waste Reports'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='report_location_idx'),
+            models.Index(fields=['-created_at', '-id'], name='report_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='report_status_created_idx'),
+            models.Index(fields=['center', '-created_at', '-id'], name='report_center_created_idx'),
+            models.Index(fields=['center', 'status', '-created_at', '-id'], name='report_center_status_idx'),
+            models.Index(fields=['citizen', '-created_at', '-id'], name='report_citizen_created_idx'),
+            models.Index(fields=['updated_at'], name='report_updated_idx'),
+            # Media requests look reports up by file name, see core.views.serve_media
+            models.Index(fields=['image'], name='report_image_idx'),
+            models.Index(fields=['image_thumbnail'], name='report_thumbnail_idx'),
+            models.Index(fields=['image_preview'], name='report_preview_idx'),
+            # Near-duplicate lookups by geohash cell, see core.dedupe
+            models.Index(fields=['geohash', 'status', 'created_at'], name='report_geohash_idx'),
+        ]
+        constraints = [
+            # Partial, so SQLite adds it as an index instead of rebuilding the table
+            models.UniqueConstraint(
+                fields=['submission_id'],
+                condition=models.Q(submission_id__isnull=False),
+                name='report_submission_unique',
+            ),
+        ]
+
+
+class ReportConfirmation(models.Model):
+    """A submission about the same spot as an open report, linked to it instead of filed anew
+    
+    See ``core.dedupe`` for how duplicates are detected.
+    """
+    report = models.ForeignKey(WasteReport, on_delete=models.CASCADE, related_name='confirmations')
+    citizen = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='report_confirmations'
+    )
+    description = models.TextField()
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    # Meters from the confirmed report
+    distance = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Confirmation of report #{self.report_id} by {self.citizen.username}"
+    
+    class Meta:
+        verbose_name = 'Report Confirmation'
+        verbose_name_plural = 'Report Confirmations'
+        ordering = ['created_at']
+
+
+class ReportCounter(models.Model):
+    """Materialized number of reports per status, kept exact on every write
+    
+    Rows are keyed by scope: a single ``global`` row per status (key 0), one
+    per ``center`` (key 0 holds unassigned reports) and one per ``citizen``.
+    See ``core.counters`` for how they are maintained.
+    """
+    SCOPE_CHOICES = (
+        ('global', 'Global'),
+        ('center', 'Center'),
+        ('citizen', 'Citizen'),
+    )
+    
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    key = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=WasteReport.STATUS_CHOICES)
+    count = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.scope}:{self.key} {self.status} = {self.count}"
+    
+    class Meta:
+        verbose_name = 'Report Counter'
+        verbose_name_plural = 'Report Counters'
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key', 'status'], name='unique_report_counter'),
+        ]
+
+
+class ImageBlob(models.Model):
+    """Number of reports referencing a stored image file
+    
+    Identical uploads share one content-addressed file, which is deleted by
+    ``manage.py collect_images`` once no report references it. See
+    ``core.blobs`` for how the counts are maintained.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    references = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+    
+    class Meta:
+        verbose_name = 'Image Blob'
+        verbose_name_plural = 'Image Blobs'
+        indexes = [
+            models.Index(fields=['references', 'updated_at'], name='blob_references_idx'),
+        ]
+
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by ``manage.py run_workers``
+    
+    See ``core.jobs`` for the claim protocol, retries and registered tasks.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    )
+    
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    # Set when claimed; the job can be claimed again once locked_until passes
+    locked_until = models.DateTimeField(null=True, blank=True)
+    token = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+    
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            models.Index(fields=['status', 'run_at', 'id'], name='job_queued_idx'),
+            models.Index(fields=['status', 'locked_until'], name='job_locked_idx'),
+        ]
+
+
+class ReplicaHeartbeat(models.Model):
+    """A single row the primary timestamps and the read replica copies
+
+    How far the replica lags is measured from its copy. See ``core.replica``.
+    """
+    written_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Heartbeat at {self.written_at}"
+
+
+class Match(models.Lookup):
+    """FTS5 ``MATCH`` against the hidden column named after the table"""
+    lookup_name = 'match'
+    
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class ReportSearch(models.Model):
+    """Read-only view of the SQLite FTS5 report search index
+    
+    The virtual table and the triggers that keep it in sync are created by
+    migration 0007 on SQLite only. See ``core.search``.
+    """
+    report = models.OneToOneField(
+        WasteReport,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_entry'
+    )
+    description = models.TextField()
+    username = models.TextField()
+    document = models.TextField(db_column='core_wastereport_search')
+    rank = models.FloatField()
+    
+    class Meta:
+        managed = False
+        db_table = 'core_wastereport_search'
+
+
+ReportSearch._meta.get_field('document').register_lookup(Match)
@@ -0,0 +1,120 @@
+"""
+Normalization of uploaded report images.
+
+Phone cameras upload multi-megabyte photos carrying EXIF metadata, often
+including the GPS position of the citizen's home. ``WasteReportForm`` passes
+each new upload through an ``ImageNormalizer``, which
+
+* rotates the pixels according to the EXIF orientation,
+* drops EXIF, XMP and comments (the colour profile is kept),
+* caps the long edge at ``max_edge`` pixels, and
+* re-encodes at ``quality``, as JPEG, or as PNG when the image has alpha.
+
+Pillow decodes from the upload file in blocks, and JPEGs larger than the cap
+are decoded at a reduced scale with ``Image.draft``, so neither the upload nor
+its full-resolution bitmap is held in memory. The output goes to a spooled
+temporary file that moves to disk past ``FILE_UPLOAD_MAX_MEMORY_SIZE``.
+
+An upload that needs no change is kept as it is when re-encoding would not
+make it smaller. Every upload logs the bytes saved on the ``core.normalization``
+logger, with ``bytes_saved`` available as a log record attribute.
+"""
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_EDGE = 2560
+DEFAULT_QUALITY = 82
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+ORIENTATION_TAG = 0x0112
+
+
+class ImageNormalizer:
+    """Orient, strip, downscale and recompress uploaded images"""
+
+    def __init__(self, max_edge=DEFAULT_MAX_EDGE, quality=DEFAULT_QUALITY, image_format='JPEG'):
+        self.max_edge = max_edge
+        self.quality = quality
+        self.image_format = image_format.upper()
+
+    @classmethod
+    def from_settings(cls):
+        """The normalizer configured by ``IMAGE_NORMALIZATION``, or None when disabled"""
+        options = getattr(settings, 'IMAGE_NORMALIZATION', {})
+        if options is None:
+            return None
+        return cls(
+            max_edge=options.get('MAX_EDGE', DEFAULT_MAX_EDGE),
+            quality=options.get('QUALITY', DEFAULT_QUALITY),
+            image_format=options.get('FORMAT', 'JPEG'),
+        )
+
+    def _encode(self, image, output, icc_profile):
+        options = {}
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        if 'A' in image.getbands():
+            image_format = 'PNG'
+            options['optimize'] = True
+        else:
+            image_format = self.image_format
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            options['quality'] = self.quality
+            if image_format == 'JPEG':
+                options.update(optimize=True, progressive=True)
+        image.save(output, image_format, **options)
+        return image_format
+
+    def normalize(self, upload):
+        """Return the normalized upload, or ``upload`` itself when it cannot be improved
+
+        Raises ``OSError``, ``ValueError`` or ``Image.DecompressionBombError``
+        when Pillow cannot process the image.
+        """
+        original_size = upload.size
+        upload.seek(0)
+        output = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            with Image.open(upload) as image:
+                oversized = max(image.size) > self.max_edge
+                changed = oversized or any(key in image.info for key in METADATA_KEYS)
+                changed = changed or image.getexif().get(ORIENTATION_TAG, 1) != 1
+                icc_profile = image.info.get('icc_profile')
+                if oversized:
+                    image.draft('RGB', (self.max_edge, self.max_edge))
+                image = ImageOps.exif_transpose(image)
+                if image.mode not in ('RGB', 'RGBA', 'L'):
+                    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+                    image = image.convert('RGBA' if has_alpha else 'RGB')
+                image.thumbnail((self.max_edge, self.max_edge), Image.Resampling.LANCZOS)
+                image_format = self._encode(image, output, icc_profile)
+        except BaseException:
+            output.close()
+            raise
+
+        size = output.tell()
+        if not changed and size >= original_size:
+            output.close()
+            upload.seek(0)
+            self._log(upload.name, original_size, original_size)
+            return upload
+
+        output.seek(0)
+        extension = 'png' if image_format == 'PNG' else image_format.lower().replace('jpeg', 'jpg')
+        name = f'{os.path.splitext(os.path.basename(upload.name))[0]}.{extension}'
+        normalized = UploadedFile(output, name, Image.MIME[image_format], size)
+        self._log(upload.name, original_size, size)
+        return normalized
+
+    def _log(self, name, original_size, size):
+        logger.info(
+            'Normalized upload %s: %d -> %d bytes (%d saved)', name, original_size, size, original_size - size,
+            extra={'bytes_saved': original_size - size},
+        )
@@ -0,0 +1,174 @@
+"""
+Keyset (cursor) pagination for list views.
+
+Rows are ordered by a unique key such as ``(created_at, id)``. A cursor holds
+the key of the last row shown (or the first one, when paging backwards) and
+the next page is selected with a range condition on that key, so every page
+is an index range read of ``page_size`` rows, however deep the user goes.
+OFFSET paging instead reads and discards every row before the page.
+
+Cursors are opaque URL-safe strings; filter and search parameters stay in
+the query string alongside them.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import QueryDict
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, backwards=False):
+    """Opaque cursor for a row key"""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    payload = json.dumps({'k': values, 'b': backwards}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    """Return ``(values, backwards)`` from a cursor made for ``ordering``"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values, backwards = data['k'], data['b']
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor('Cursor does not match the list ordering')
+    return values, bool(backwards)
+
+
+def keyset_q(ordering, values, backwards=False):
+    """Q object selecting rows strictly after ``values`` in ``ordering``
+
+    Expands the row comparison ``(a, b) > (x, y)`` to
+    ``a >= x AND (a > x OR (a = x AND b > y))``; the leading range on the
+    first column is what lets the database seek the index.
+    """
+    fields = [(name.lstrip('-'), name.startswith('-') != backwards) for name in ordering]
+    after = Q()
+    for i in reversed(range(len(fields))):
+        name, descending = fields[i]
+        q = Q(**{f'{name}__{"lt" if descending else "gt"}': values[i]})
+        if i < len(fields) - 1:
+            q |= Q(**{name: values[i]}) & after
+        after = q
+    name, descending = fields[0]
+    return Q(**{f'{name}__{"lte" if descending else "gte"}': values[0]}) & after
+
+
+def reverse_ordering(ordering):
+    return [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+
+class KeysetPage:
+    """One page of rows plus the cursors for its neighbours
+
+    Iterating a page yields its rows, so templates can keep treating it as
+    the list itself.
+    """
+
+    def __init__(self, items, ordering, page_size, has_next, has_previous, params=None):
+        self.items = items
+        self.ordering = ordering
+        self.page_size = page_size
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.params = params
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def _key(self, item):
+        return [getattr(item, name.lstrip('-')) for name in self.ordering]
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.items:
+            return encode_cursor(self._key(self.items[-1]))
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.items:
+            return encode_cursor(self._key(self.items[0]), backwards=True)
+        return None
+
+    def _query(self, cursor):
+        params = self.params.copy() if self.params is not None else QueryDict(mutable=True)
+        params['cursor'] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        """Query string for the next page, keeping the other parameters"""
+        cursor = self.next_cursor
+        return self._query(cursor) if cursor else None
+
+    @property
+    def previous_query(self):
+        """Query string for the previous page, keeping the other parameters"""
+        cursor = self.previous_cursor
+        return self._query(cursor) if cursor else None
+
+
+def paginate(queryset, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE, params=None):
+    """Return the ``KeysetPage`` of ``queryset`` following ``cursor``
+
+    ``ordering`` must end in a unique field so every row has a distinct key.
+    Raises ``InvalidCursor`` for cursors this function did not produce.
+    """
+    ordering = list(ordering)
+    backwards = False
+    if cursor:
+        values, backwards = decode_cursor(cursor, ordering)
+        try:
+            queryset = queryset.filter(keyset_q(ordering, values, backwards))
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor('Cursor values do not fit the list ordering')
+
+    order = reverse_ordering(ordering) if backwards else ordering
+    rows = list(queryset.order_by(*order)[:page_size + 1])
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if backwards:
+        rows.reverse()
+        return KeysetPage(rows, ordering, page_size, has_next=True, has_previous=more, params=params)
+    return KeysetPage(rows, ordering, page_size, has_next=more, has_previous=bool(cursor), params=params)
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Parse a page size query parameter, clamped to ``MAX_PAGE_SIZE``"""
+    try:
+        return max(1, min(MAX_PAGE_SIZE, int(value)))
+    except (TypeError, ValueError):
+        return default
+
+
+def paginate_request(request, queryset, ordering, page_size=DEFAULT_PAGE_SIZE):
+    """Paginate ``queryset`` from the ``cursor`` and ``page_size`` GET parameters
+
+    A cursor that cannot be decoded restarts from the first page.
+    """
+    page_size = parse_page_size(request.GET.get('page_size'), page_size)
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    try:
+        return paginate(queryset, ordering, request.GET.get('cursor'), page_size, params)
+    except InvalidCursor:
+        return paginate(queryset, ordering, None, page_size, params)
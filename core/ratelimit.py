@@ -0,0 +1,96 @@
+"""
+Token buckets for rate limiting, see ``core.middleware.RateLimitMiddleware``.
+
+A bucket holds up to ``capacity`` tokens and refills continuously at
+``capacity / period`` tokens per second; each request takes one token. A
+client may therefore burst ``capacity`` requests and is then held to the
+average rate. Only the token count and the time it was computed are
+stored, so a bucket is two numbers.
+
+Buckets live either in this process, in a bounded LRU (``LocalBuckets``),
+or in a Django cache shared by all workers (``CacheBuckets``). Evicting a
+bucket from the LRU forgets it, which only ever lets a client through
+sooner; keep ``RATE_LIMIT_MAX_KEYS`` above the number of clients active
+within one period. The cache variant reads and writes without a lock, so
+concurrent requests from one client in different workers may each take
+the same token; the limit is approximate but cannot drift by more than the
+number of workers.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class Rate:
+    """``capacity`` requests per ``period`` seconds, parsed from e.g. ``'10/m'``"""
+
+    def __init__(self, capacity, period):
+        if capacity < 1 or period <= 0:
+            raise ValueError('A rate needs at least one request per positive period')
+        self.capacity, self.period = capacity, period
+
+    @classmethod
+    def parse(cls, value):
+        try:
+            count, unit = value.split('/')
+            return cls(int(count), PERIODS[unit[-1]] * int(unit[:-1] or 1))
+        except (KeyError, ValueError):
+            raise ValueError(f'Invalid rate {value!r}; expected e.g. "10/m" or "100/5m"')
+
+    @property
+    def refill(self):
+        """Tokens added per second"""
+        return self.capacity / self.period
+
+
+def take(state, rate, now):
+    """Take a token from a bucket in ``state``
+
+    ``state`` is ``(tokens, updated)`` or None for a full bucket. Returns
+    the new state and the seconds to wait, which is 0 if the token was taken.
+    """
+    tokens, updated = state if state is not None else (rate.capacity, now)
+    tokens = min(rate.capacity, tokens + max(now - updated, 0) * rate.refill)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / rate.refill
+
+
+class LocalBuckets:
+    """Buckets in this process, at most ``max_keys`` of them, least recently used evicted first"""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, rate):
+        now = time.monotonic()
+        with self.lock:
+            state, wait = take(self.buckets.get(key), rate, now)
+            self.buckets[key] = state
+            self.buckets.move_to_end(key)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class CacheBuckets:
+    """Buckets in the Django cache ``alias``, shared between processes"""
+
+    def __init__(self, alias='default', prefix='ratelimit'):
+        self.cache = caches[alias]
+        self.prefix = prefix
+
+    def take(self, key, rate):
+        key = f'{self.prefix}:{key}'
+        # Wall clock time, comparable between processes
+        state, wait = take(self.cache.get(key), rate, time.time())
+        # A bucket left alone for a period is full again and need not be kept
+        self.cache.set(key, state, timeout=math.ceil(rate.period))
+        return wait
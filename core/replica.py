@@ -0,0 +1,221 @@
+"""
+Read replica routing.
+
+Views decorated with ``replica_reads`` (dashboards, statistics, exports and
+report lists) run their queries on the database alias named by
+``REPLICA_DATABASE``; everything else, and every write, uses the primary.
+Without ``REPLICA_DATABASE`` nothing is routed.
+
+The replica is only used while it is fresh enough. The primary keeps a
+``ReplicaHeartbeat`` row timestamped by ``manage.py refresh_replica``, and
+the replica's copy of that row says how old its data is. A request reads
+from the replica when:
+
+* the copied heartbeat is at most ``REPLICA_MAX_LAG`` seconds old, and
+* for a client that wrote something, it is newer than their last write.
+
+``ReplicaPinMiddleware`` records the time of each client's last write in
+their session, so a citizen sent to ``track_reports`` after submitting a
+report reads from the primary until the replica has caught up. The choice
+is made once per request, so a page never mixes the two databases.
+
+Heartbeats read from the replica are reused for ``CHECK_INTERVAL``
+seconds. That only makes the data look older than it is, so the staleness
+bound still holds. A replica that cannot be queried counts as stale.
+
+With a SQLite replica, ``refresh_replica`` also copies the primary into it
+with SQLite's online backup, which is enough for a snapshot kept locally.
+Run it every few seconds with ``--every``. Another kind of replica gets
+the heartbeat through its own replication.
+"""
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+from .models import ReplicaHeartbeat
+from .sqlite import apply_pragmas, configured_pragmas
+
+logger = logging.getLogger(__name__)
+
+PIN_KEY = '_replica_not_before'
+CHECK_INTERVAL = 1.0
+SQLITE_ENGINE = 'django.db.backends.sqlite3'
+
+# Alias the current request reads from; None reads from the primary
+_reading_from = ContextVar('replica_reads', default=None)
+# Per replica: (monotonic time checked, heartbeat timestamp or None)
+_heartbeats = {}
+
+
+def replica_database():
+    return getattr(settings, 'REPLICA_DATABASE', None)
+
+
+def write_heartbeat():
+    """Timestamp the primary's heartbeat row"""
+    ReplicaHeartbeat.objects.using(DEFAULT_DB_ALIAS).update_or_create(pk=1, defaults={'written_at': timezone.now()})
+
+
+def replica_heartbeat(alias):
+    """Timestamp of the heartbeat copied to ``alias``; None if unknown"""
+    checked_at, heartbeat = _heartbeats.get(alias, (None, None))
+    if checked_at is not None and time.monotonic() - checked_at < CHECK_INTERVAL:
+        return heartbeat
+    try:
+        written_at = ReplicaHeartbeat.objects.using(alias).filter(pk=1).values_list('written_at', flat=True).first()
+    except DatabaseError:
+        logger.warning('Cannot read the heartbeat on replica %r', alias, exc_info=True)
+        written_at = None
+    heartbeat = written_at.timestamp() if written_at is not None else None
+    _heartbeats[alias] = (time.monotonic(), heartbeat)
+    return heartbeat
+
+
+def choose_database(not_before=None):
+    """The replica alias if it is fresh enough, else None for the primary
+
+    ``not_before`` is the time of the client's last write, which the
+    replica must have copied.
+    """
+    alias = replica_database()
+    if not alias:
+        return None
+    heartbeat = replica_heartbeat(alias)
+    if heartbeat is None or time.time() - heartbeat > getattr(settings, 'REPLICA_MAX_LAG', 30):
+        return None
+    if not_before is not None and heartbeat < not_before:
+        return None
+    return alias
+
+
+@contextmanager
+def reading_from_replica(not_before=None):
+    """Route reads to the replica within the block, if it is fresh enough"""
+    token = _reading_from.set(choose_database(not_before))
+    try:
+        yield _reading_from.get()
+    finally:
+        _reading_from.reset(token)
+
+
+def _stream(content, alias):
+    token = _reading_from.set(alias)
+    try:
+        yield from content
+    finally:
+        _reading_from.reset(token)
+
+
+async def _astream(content, alias):
+    token = _reading_from.set(alias)
+    try:
+        async for chunk in content:
+            yield chunk
+    finally:
+        _reading_from.reset(token)
+
+
+def _session_pin(request):
+    session = getattr(request, 'session', None)
+    return session.get(PIN_KEY) if session is not None else None
+
+
+def replica_reads(view_func):
+    """Decorator running a read-only view's queries on the replica when fresh"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            # Loading the session and the heartbeat query the database
+            alias = await sync_to_async(lambda: choose_database(_session_pin(request)))()
+            token = _reading_from.set(alias)
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _reading_from.reset(token)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with reading_from_replica(_session_pin(request)) as alias:
+            response = view_func(request, *args, **kwargs)
+        if alias and response.streaming:
+            # Streamed content is generated after the view returns
+            stream = _astream if response.is_async else _stream
+            response.streaming_content = stream(response.streaming_content, alias)
+        return response
+    return wrapper
+
+
+def pin_to_primary(request):
+    """Keep the client reading from the primary until the replica has its writes"""
+    request.session[PIN_KEY] = time.time()
+
+
+def copy_database(source, target):
+    """Copy the SQLite database file ``source`` into ``target``
+
+    The backup reads one consistent snapshot of ``source`` and writes it to
+    ``target`` in a single transaction, so readers of ``target`` see either
+    the old copy or the new one.
+    """
+    source_connection = sqlite3.connect(source)
+    try:
+        target_connection = sqlite3.connect(target)
+        try:
+            apply_pragmas(target_connection, configured_pragmas())
+            source_connection.backup(target_connection)
+        finally:
+            target_connection.close()
+    finally:
+        source_connection.close()
+
+
+def refresh_replica(alias):
+    """Write a heartbeat and copy the primary into a SQLite replica
+
+    Returns whether a copy was made; other replicas only get the heartbeat.
+    """
+    primary = connections[DEFAULT_DB_ALIAS].settings_dict
+    replica = connections[alias].settings_dict
+    if replica['ENGINE'] == SQLITE_ENGINE:
+        if primary['ENGINE'] != SQLITE_ENGINE:
+            raise ImproperlyConfigured('A SQLite replica can only copy a SQLite primary')
+        if str(primary['NAME']) == str(replica['NAME']):
+            raise ImproperlyConfigured(f'Replica {alias!r} is the primary database file')
+    write_heartbeat()
+    if replica['ENGINE'] != SQLITE_ENGINE:
+        return False
+    copy_database(str(primary['NAME']), str(replica['NAME']))
+    return True
+
+
+class ReplicaRouter:
+    """Send reads inside ``replica_reads`` views to the replica, and all writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        return _reading_from.get()
+
+    def db_for_write(self, model, **hints):
+        # Instances read from the replica are saved to the primary too
+        return DEFAULT_DB_ALIAS if replica_database() else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, replica_database()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db != DEFAULT_DB_ALIAS and db == replica_database():
+            return False
+        return None
@@ -0,0 +1,67 @@
+"""
+Full-text search over waste reports.
+
+On SQLite the ``core_wastereport_search`` FTS5 table (created and kept in
+sync by triggers, see migration 0007) indexes each report's description and
+citizen username. Queries are split into words, every word is matched as a
+prefix and all words must match; results are ranked by BM25 and recency.
+
+Reports are joined to the index through ``ReportSearch`` so SQLite drives
+the query from the full-text match and computes each match's rank once.
+
+Databases without FTS5 fall back to the original ``icontains`` filter.
+"""
+import re
+
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+
+from .models import ReportSearch
+
+# Best match first, then newest; ends in a unique column for keyset paging
+SEARCH_ORDERING = ('search_rank', '-created_at', '-id')
+
+_available = {}
+
+
+def fts_available():
+    """Whether the FTS5 index exists on the default database"""
+    key = connection.settings_dict['NAME']
+    if key not in _available:
+        _available[key] = (
+            connection.vendor == 'sqlite'
+            and ReportSearch._meta.db_table in connection.introspection.table_names()
+        )
+    return _available[key]
+
+
+def match_expression(query):
+    """FTS5 MATCH expression requiring every word of ``query`` as a prefix
+
+    Words are quoted, so FTS5 operators and column filters typed by the user
+    are treated as plain text. Returns None when there is nothing to match.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_reports(queryset, query):
+    """Filter a report queryset by ``query`` and annotate ``search_rank``
+
+    Order the result by ``SEARCH_ORDERING``; a lower rank is a better match.
+    """
+    if not fts_available():
+        return queryset.filter(
+            Q(citizen__username__icontains=query) |
+            Q(description__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    expression = match_expression(query)
+    if expression is None:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    return queryset.filter(
+        search_entry__document__match=expression
+    ).annotate(search_rank=F('search_entry__rank'))
@@ -0,0 +1,164 @@
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from . import blobs, counters, derivatives, heatmap, sqlite
+from .context import invalidate_staff_centers
+from .models import RecyclingCenter, ReportCounter, WasteReport
+from .spatial import invalidate_center_index
+
+COUNTED_FIELDS = ('center_id', 'citizen_id', 'status')
+LOADED_FIELDS = (*COUNTED_FIELDS, 'latitude', 'longitude', 'image')
+
+
+def invalidate_now_and_on_commit(func, *args):
+    """Run an invalidation now for this process, and again on commit
+    
+    The second run stops other workers from caching data read from a
+    snapshot taken before the transaction committed.
+    """
+    func(*args)
+    transaction.on_commit(lambda: func(*args))
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    """Tune every new SQLite connection with ``SQLITE_PRAGMAS``"""
+    sqlite.configure_connection(connection)
+
+
+@receiver([post_save, post_delete], sender=RecyclingCenter)
+def center_changed(sender, **kwargs):
+    """Rebuild the spatial index and drop cached staff centers after a center is saved or deleted"""
+    invalidate_now_and_on_commit(invalidate_center_index)
+    invalidate_now_and_on_commit(invalidate_staff_centers)
+
+
+@receiver(pre_delete, sender=RecyclingCenter)
+def center_deleting(sender, instance, **kwargs):
+    """Reports of a deleted center become unassigned without save signals"""
+    counters.move_center_counts(instance.pk)
+    # SET_NULL does not touch updated_at, which incremental analytics snapshots follow
+    WasteReport.objects.filter(center_id=instance.pk).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    """Drop the emptied counters of a deleted citizen"""
+    ReportCounter.objects.filter(scope='citizen', key=instance.pk).delete()
+
+
+@receiver(pre_save, sender=WasteReport)
+def report_saving(sender, instance, using, **kwargs):
+    """Read the stored values an update replaces, locking the row
+    
+    The counted fields are read again even when the instance was loaded
+    earlier, under a lock ``WasteReport.save`` holds until it commits, so
+    saves of two stale copies of a report still leave the counters exact.
+    """
+    if instance.pk is None:
+        return
+    rows = WasteReport.objects.using(using).filter(pk=instance.pk)
+    if connections[using].features.has_select_for_update:
+        rows = rows.select_for_update()
+    else:
+        # SQLite has no row locks; a first write takes the database write lock
+        rows.update(status=F('status'))
+    fields = COUNTED_FIELDS if hasattr(instance, '_loaded_values') else LOADED_FIELDS
+    stored = rows.values(*fields).first() or {}
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), **stored}
+
+
+def _written(field, update_fields):
+    return update_fields is None or field in update_fields or field.removesuffix('_id') in update_fields
+
+
+@receiver(post_save, sender=WasteReport)
+def report_counted(sender, instance, created, update_fields, **kwargs):
+    """Keep the report counters exact as reports are created and updated"""
+    new = tuple(getattr(instance, field) for field in COUNTED_FIELDS)
+    if created:
+        counters.apply_deltas(counters.report_deltas(*new))
+        return
+    
+    old = tuple(instance.loaded_value(field) for field in COUNTED_FIELDS)
+    # Fields left out of update_fields keep their stored values
+    new = tuple(
+        value if _written(field, update_fields) else stored
+        for field, value, stored in zip(COUNTED_FIELDS, new, old)
+    )
+    if old != new:
+        deltas = counters.report_deltas(*new)
+        if old[1] is not None:
+            deltas.update(counters.report_deltas(*old, amount=-1))
+        counters.apply_deltas(deltas)
+
+
+@receiver(post_save, sender=WasteReport)
+def report_saved(sender, instance, created, **kwargs):
+    """Evict heatmap tiles when a report is created, moved or changes status"""
+    old_location = (instance.loaded_value('latitude'), instance.loaded_value('longitude'))
+    new_location = (instance.latitude, instance.longitude)
+    
+    points = set()
+    if created or instance.loaded_value('status') != instance.status:
+        points.add(new_location)
+    if not created and old_location != new_location:
+        points.add(new_location)
+        if None not in old_location:
+            points.add(old_location)
+    for point in points:
+        invalidate_now_and_on_commit(heatmap.invalidate_point, *point)
+
+
+def _file_name(value):
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_save, sender=WasteReport)
+def report_image_saved(sender, instance, created, **kwargs):
+    """Count references to a new or replaced image and render its derivatives"""
+    new = _file_name(instance.image)
+    old = '' if created else _file_name(instance.loaded_value('image', new))
+    if old == new:
+        return
+    blobs.adjust_references(blobs.image_deltas(old, new))
+    if new:
+        derivatives.schedule_derivatives(instance.pk)
+
+
+@receiver(post_delete, sender=WasteReport)
+def report_uncounted(sender, instance, **kwargs):
+    """Remove a deleted report from the counters"""
+    counters.apply_deltas(counters.report_deltas(
+        instance.loaded_value('center_id', instance.center_id),
+        instance.loaded_value('citizen_id', instance.citizen_id),
+        instance.loaded_value('status', instance.status),
+        amount=-1,
+    ))
+
+
+@receiver(post_delete, sender=WasteReport)
+def report_image_deleted(sender, instance, **kwargs):
+    """Release a deleted report's image and remove derivatives it does not share"""
+    name = _file_name(instance.loaded_value('image', instance.image))
+    blobs.adjust_references(blobs.image_deltas(name, ''))
+    # Shared derivatives are collected with the image; older ones had their own names
+    shared = set(derivatives.derivative_files(name)) if name else set()
+    derived = [field for field in (instance.image_thumbnail, instance.image_preview) if field and field.name not in shared]
+    
+    def delete_derived():
+        for field in derived:
+            field.storage.delete(field.name)
+    
+    if derived:
+        transaction.on_commit(delete_derived)
+
+
+@receiver(post_delete, sender=WasteReport)
+def report_deleted(sender, instance, **kwargs):
+    """Evict the heatmap tiles that counted a deleted report"""
+    invalidate_now_and_on_commit(heatmap.invalidate_point, instance.latitude, instance.longitude)
@@ -0,0 +1,223 @@
+"""
+In-process spatial index for recycling center lookups.
+
+Centers are projected onto the unit sphere and stored in a KD-tree, so the
+straight-line (chord) distance between two points orders them exactly like
+the great-circle distance and no special handling is needed at the poles or
+the antimeridian.
+
+Queries filtered by material search a tree over just the centers accepting
+the rarest requested material, built the first time that material is asked
+for, so a rare material never walks the whole index. A material no center
+accepts is answered without a search.
+
+The index is built once per process on first use and rebuilt lazily after a
+``RecyclingCenter`` is saved or deleted (see ``core.signals``). Invalidation
+is published through Django's cache framework, so every worker sharing a
+cache backend picks up changes made by the others.
+"""
+import heapq
+import math
+import threading
+import uuid
+
+import numpy as np
+from django.core.cache import cache
+
+from .distance import EARTH_RADIUS_KM, haversine, unit_vectors
+
+LEAF_SIZE = 16
+# Largest points x centers block compared at once by CenterIndex.nearest_many
+BLOCK_ELEMENTS = 1 << 20
+INDEX_VERSION_KEY = 'core:center_index:version'
+
+
+def to_unit_vector(latitude, longitude):
+    """Convert latitude/longitude in degrees to a point on the unit sphere"""
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat))
+
+
+class KDTree:
+    """Static KD-tree over 3D points answering k-nearest queries"""
+
+    def __init__(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.root = self._build(points, np.arange(len(points))) if len(points) else None
+        # Queries walk the tree in pure Python, where tuples beat array indexing
+        self.points = [tuple(point) for point in points.tolist()]
+
+    def _build(self, points, indices):
+        if len(indices) <= LEAF_SIZE:
+            return indices.tolist()
+
+        # Split on the axis with the largest spread
+        subset = points[indices]
+        axis = int(np.argmax(np.ptp(subset, axis=0)))
+        middle = len(indices) // 2
+        order = np.argpartition(subset[:, axis], middle)
+        split = float(subset[order[middle], axis])
+        return (
+            axis, split,
+            self._build(points, indices[order[:middle]]),
+            self._build(points, indices[order[middle:]]),
+        )
+
+    def query(self, point, k=1, max_distance=None, accept=None):
+        """Return up to ``k`` (squared chord distance, index) pairs, closest first
+
+        ``max_distance`` bounds the squared chord distance of the results and
+        ``accept`` is an optional predicate on point indices.
+        """
+        if self.root is None or k < 1:
+            return []
+
+        points = self.points
+        px, py, pz = point
+        bound = float('inf') if max_distance is None else max_distance
+        heap = []  # max-heap of (-squared distance, index)
+
+        def worst():
+            return -heap[0][0] if len(heap) == k else bound
+
+        def visit(node):
+            if isinstance(node, list):
+                for i in node:
+                    x, y, z = points[i]
+                    d = (x - px) ** 2 + (y - py) ** 2 + (z - pz) ** 2
+                    if d > worst() or (accept is not None and not accept(i)):
+                        continue
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-d, i))
+                    else:
+                        heapq.heapreplace(heap, (-d, i))
+                return
+
+            axis, split, left, right = node
+            diff = point[axis] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if diff * diff <= worst():
+                visit(far)
+
+        visit(self.root)
+        return sorted((-d, i) for d, i in heap)
+
+
+def parse_materials(materials_accepted):
+    """Split a comma-separated materials list into normalized tokens"""
+    return frozenset(
+        material.strip().lower()
+        for material in (materials_accepted or '').split(',')
+        if material.strip()
+    )
+
+
+class CenterIndex:
+    """Spatial index over (id, latitude, longitude[, materials]) center rows"""
+
+    def __init__(self, rows):
+        rows = list(rows)
+        self.ids = [row[0] for row in rows]
+        self.latitudes = np.array([float(row[1]) for row in rows], dtype=np.float64)
+        self.longitudes = np.array([float(row[2]) for row in rows], dtype=np.float64)
+        self.materials = [parse_materials(row[3]) if len(row) > 3 else frozenset() for row in rows]
+        self.vectors = unit_vectors(self.latitudes, self.longitudes)
+        self.tree = KDTree(self.vectors)
+        # Indices of the centers accepting each material, and trees over them built on demand
+        self.material_members = {}
+        for i, accepted in enumerate(self.materials):
+            for material in accepted:
+                self.material_members.setdefault(material, []).append(i)
+        self.material_trees = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nearest(self, latitude, longitude, k=1, radius_km=None, materials=None):
+        """Return up to ``k`` (center id, distance in km) pairs, closest first
+
+        Results can be limited to centers within ``radius_km`` and to centers
+        accepting every material in ``materials``.
+        """
+        point = to_unit_vector(float(latitude), float(longitude))
+
+        max_distance = None
+        if radius_km is not None:
+            angle = min(math.pi, radius_km / EARTH_RADIUS_KM)
+            max_distance = (2 * math.sin(angle / 2)) ** 2
+
+        wanted = parse_materials(','.join(materials or ()))
+        if not wanted:
+            found = [i for _, i in self.tree.query(point, k, max_distance)]
+        elif not all(material in self.material_members for material in wanted):
+            found = []
+        else:
+            # Search the centers accepting the rarest material, checking the others on them
+            rarest = min(wanted, key=lambda material: len(self.material_members[material]))
+            tree, members = self.material_tree(rarest)
+            accept = None
+            if len(wanted) > 1:
+                def accept(j):
+                    return wanted <= self.materials[members[j]]
+            found = [members[j] for _, j in tree.query(point, k, max_distance, accept)]
+        distances = haversine(latitude, longitude, self.latitudes[found], self.longitudes[found])
+        return [(self.ids[i], distance) for i, distance in zip(found, distances.tolist())]
+
+    def material_tree(self, material):
+        """``(KDTree, center indices)`` over the centers accepting ``material``"""
+        entry = self.material_trees.get(material)
+        if entry is None:
+            members = self.material_members[material]
+            # Built at most once per material, or twice if threads race, which is harmless
+            entry = self.material_trees[material] = (KDTree(self.vectors[members]), members)
+        return entry
+
+    def nearest_many(self, latitudes, longitudes):
+        """Return the nearest center id for each point (None when there are no centers)
+
+        Points are compared against every center with one matrix product per
+        block; the largest dot product of unit vectors is the shortest
+        great-circle distance.
+        """
+        points = unit_vectors(latitudes, longitudes)
+        if not len(self) or not len(points):
+            return [None] * len(points)
+        block = max(1, BLOCK_ELEMENTS // len(self))
+        nearest = []
+        for start in range(0, len(points), block):
+            nearest.extend(np.argmax(points[start:start + block] @ self.vectors.T, axis=1).tolist())
+        return [self.ids[i] for i in nearest]
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_center_index():
+    """Return the process-wide center index, rebuilding it if it is stale"""
+    global _index, _index_version
+    from .models import RecyclingCenter
+
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(INDEX_VERSION_KEY, version, None)
+        version = cache.get(INDEX_VERSION_KEY, version)
+
+    with _lock:
+        if _index is None or _index_version != version:
+            rows = RecyclingCenter.objects.values_list(
+                'id', 'latitude', 'longitude', 'materials_accepted'
+            )
+            _index = CenterIndex(rows)
+            _index_version = version
+        return _index
+
+
+def invalidate_center_index():
+    """Mark the center index stale in this and every other process"""
+    cache.set(INDEX_VERSION_KEY, uuid.uuid4().hex, None)
@@ -0,0 +1,70 @@
+"""
+Connection tuning for SQLite.
+
+Every new SQLite connection is given the pragmas in ``SQLITE_PRAGMAS`` from
+the ``connection_created`` signal (see ``core.signals``). The defaults suit
+many concurrent readers with a steady stream of small writes:
+
+* ``journal_mode=WAL`` lets readers carry on while a writer commits, and a
+  commit appends to the log instead of rewriting pages. The mode is stored
+  in the database file, so it stays on for every later connection.
+* ``synchronous=NORMAL`` syncs the log at checkpoints rather than on every
+  commit. A power cut may lose the last commits but cannot corrupt the file.
+* ``busy_timeout`` waits up to that many milliseconds for a lock instead of
+  failing at once with "database is locked".
+* ``cache_size`` (negative values are KiB), ``mmap_size`` (bytes) and
+  ``temp_store=MEMORY`` keep hot pages and sort buffers out of syscalls.
+
+Pragmas run on the raw connection, so they do not show up in query logs
+or query counts.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_PRAGMAS = {
+    # First, so switching the journal mode waits for other connections' locks
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Pragmas that only tune performance and durability; others are refused
+ALLOWED_PRAGMAS = {
+    'busy_timeout', 'cache_size', 'journal_mode', 'journal_size_limit', 'mmap_size',
+    'synchronous', 'temp_store', 'wal_autocheckpoint',
+}
+KEYWORD_VALUE = re.compile(r'^[A-Za-z]+$')
+
+
+def pragma_statements(pragmas):
+    """``PRAGMA`` statements for a mapping of names to values, validated"""
+    statements = []
+    for name, value in pragmas.items():
+        if name not in ALLOWED_PRAGMAS:
+            raise ImproperlyConfigured(f'Unsupported SQLite pragma {name!r}')
+        if isinstance(value, bool) or not (isinstance(value, int) or KEYWORD_VALUE.match(str(value))):
+            raise ImproperlyConfigured(f'Invalid value {value!r} for SQLite pragma {name!r}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def apply_pragmas(raw_connection, pragmas):
+    """Run the pragmas on a DB-API ``sqlite3`` connection"""
+    for statement in pragma_statements(pragmas):
+        raw_connection.execute(statement).fetchall()
+
+
+def configured_pragmas():
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_PRAGMAS)
+    return pragmas or {}
+
+
+def configure_connection(connection):
+    """Apply ``SQLITE_PRAGMAS`` to a newly opened Django connection"""
+    if connection.vendor != 'sqlite':
+        return
+    apply_pragmas(connection.connection, configured_pragmas())
@@ -0,0 +1,101 @@
+"""
+Content-addressed storage for report images.
+
+Uploads are hashed with SHA-256 while they are written to disk and stored
+under their digest, sharded two levels deep so no directory grows past a few
+thousand entries::
+
+    waste_reports/3f/a9/3fa9c1...e2.jpg
+
+A photo that is uploaded again resolves to the file that already exists, so
+it takes no extra space. Since several reports can share one file, the file
+is only deleted once no report references it; ``core.blobs`` keeps the
+reference counts and collects unreferenced files.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+HASH_ALGORITHM = 'sha256'
+INCOMING_DIRECTORY = '.incoming'
+SHARD_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w{1,5})?$')
+
+
+def is_content_address(name, prefix):
+    """Whether ``name`` is a sharded content-addressed file under ``prefix``"""
+    prefix = prefix.rstrip('/') + '/'
+    return name.startswith(prefix) and bool(SHARD_PATTERN.match(name[len(prefix):]))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names files after the hash of their content"""
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content in _save, so a taken name is never renamed
+        return name
+
+    def content_name(self, name, digest):
+        """The storage name for content with ``digest`` uploaded as ``name``"""
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        if not re.fullmatch(r'\.\w{1,5}', extension):
+            extension = ''
+        return '/'.join(filter(None, [directory, digest[:2], digest[2:4], digest + extension]))
+
+    def _make_directory(self, directory):
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def _save(self, name, content):
+        incoming = self.path(os.path.join(os.path.dirname(name), INCOMING_DIRECTORY))
+        self._make_directory(incoming)
+
+        digest = hashlib.new(HASH_ALGORITHM)
+        if hasattr(content, 'temporary_file_path'):
+            # Large uploads are already on disk; hash them and move them into place
+            source = content.temporary_file_path()
+            for chunk in content.chunks():
+                digest.update(chunk)
+            temporary = os.path.join(incoming, os.path.basename(source))
+            file_move_safe(source, temporary, allow_overwrite=True)
+        else:
+            fd, temporary = tempfile.mkstemp(dir=incoming)
+            with os.fdopen(fd, 'wb') as output:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    output.write(chunk)
+
+        name = self.content_name(name, digest.hexdigest())
+        full_path = self.path(name)
+        self._make_directory(os.path.dirname(full_path))
+        if os.path.exists(full_path):
+            # Already stored; refresh the time so garbage collection leaves it alone
+            os.remove(temporary)
+            os.utime(full_path)
+        else:
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            else:
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(temporary, 0o666 & ~umask)
+            os.replace(temporary, full_path)
+            self._ensure_location_group_id(full_path)
+        return name
+
+
+def report_image_storage():
+    """Storage of original report images"""
+    return ContentAddressedStorage()
@@ -0,0 +1,34 @@
+"""
+Streaming responses under ASGI.
+
+Django 4.2 serves a synchronous iterator to an ASGI server by reading all of
+it into a list first (``StreamingHttpResponse.__aiter__``), so an export or
+a media file would be held in memory before the first byte is sent.
+``stream_for`` hands such responses an async iterator that pulls one chunk
+at a time from the synchronous one in a worker thread. Under WSGI the
+response is left as it is.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_DONE = object()
+
+
+async def iterate_async(iterator, thread_sensitive=True):
+    """Yield the chunks of a synchronous ``iterator``, each read in a thread
+
+    Keep ``thread_sensitive`` for iterators that query the database, so
+    they use the request's connection; file reads may run in any thread.
+    """
+    iterator = iter(iterator)
+    next_chunk = sync_to_async(next, thread_sensitive=thread_sensitive)
+    while (chunk := await next_chunk(iterator, _DONE)) is not _DONE:
+        yield chunk
+
+
+def stream_for(request, response, thread_sensitive=True):
+    """Make a streaming ``response`` yield chunk by chunk to an ASGI server"""
+    if isinstance(request, ASGIRequest) and response.streaming and not response.is_async:
+        # The original iterator stays registered to be closed with the response
+        response.streaming_content = iterate_async(response.streaming_content, thread_sensitive)
+    return response
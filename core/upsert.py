@@ -0,0 +1,31 @@
+"""
+Concurrent-safe increments of counter rows.
+
+Counter tables such as ``ReportCounter`` and ``ImageBlob`` hold one row per
+key, created by the first write that needs it. ``add_to_count`` adds to the
+row with an ``F()`` update and only inserts when no row matched. Two writers
+can both miss the row and race to insert it; the loser's insert fails on the
+unique constraint inside its own savepoint, so the surrounding transaction
+survives and the delta is applied to the winner's row instead.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def add_to_count(model, lookup, field, delta, **updates):
+    """Add ``delta`` to ``field`` of the ``model`` row matching ``lookup``
+
+    The row is created with ``field`` set to ``delta`` if it does not exist.
+    ``updates`` are extra values written when an existing row is changed.
+    ``lookup`` must match at most one row through a unique constraint.
+    """
+    rows = model.objects.filter(**lookup)
+    values = {field: F(field) + delta, **updates}
+    if rows.update(**values):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **{field: delta})
+    except IntegrityError:
+        # Another writer created the row first
+        rows.update(**values)
@@ -11,6 +11,10 @@ urlpatterns = [
     path('citizen/track-reports/', views.track_reports, name='track_reports'),
     path('citizen/map-centers/', views.map_centers, name='map_centers'),
     path('citizen/center/<int:pk>/', views.center_detail, name='center_detail'),
+    path('citizen/api/centers/map/', views.map_centers_api, name='map_centers_api'),
+    path('citizen/api/centers/nearby/', views.nearby_centers_api, name='nearby_centers_api'),
+    path('citizen/api/reports/status/', views.report_status_api, name='report_status_api'),
+    path('citizen/api/reports/batch/', views.batch_reports_api, name='batch_reports_api'),
     
     # Staff URLs
     path('staff/dashboard/', views.staff_dashboard, name='staff_dashboard'),
@@ -21,6 +25,7 @@ urlpatterns = [
     # Admin URLs
     path('admin-panel/dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('admin-panel/reports/', views.manage_reports, name='manage_reports'),
+    path('admin-panel/reports/export/', views.export_reports, name='export_reports'),
     path('admin-panel/report/<int:pk>/delete/', views.delete_report, name='delete_report'),
     path('admin-panel/centers/', views.manage_centers, name='manage_centers'),
     path('admin-panel/center/add/', views.add_center, name='add_center'),
@@ -29,4 +34,5 @@ urlpatterns = [
     path('admin-panel/users/', views.manage_users, name='manage_users'),
     path('admin-panel/user/<int:pk>/assign-role/', views.assign_role, name='assign_role'),
     path('admin-panel/api/statistics/', views.statistics_api, name='statistics_api'),
+    path('admin-panel/api/report-heatmap/<int:z>/<int:x>/<int:y>/', views.report_heatmap_api, name='report_heatmap_api'),
 ]
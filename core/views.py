@@ -1,14 +1,63 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.db.models import Q, Count
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.db.models import Q
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_POST
 from accounts.decorators import citizen_required, staff_required, admin_required
 from accounts.models import User
-from .models import RecyclingCenter, WasteReport
+from .models import RecyclingCenter, ReportConfirmation, WasteReport
 from .forms import WasteReportForm, ReportStatusForm, RecyclingCenterForm, UserRoleForm
-import math
+from .context import get_actor
+from .counters import aget_center_totals, aget_counts, get_counts
+from .dedupe import find_duplicate
+from .exports import parse_filters, stream_reports
+from .grid import BoundingBox, cell_id, cluster, parse_zoom
+from .heatmap import HEATMAP_MAX_ZOOM, tile_cells
+from .ingest import MAX_BATCH_SIZE, ingest_reports
+from .media import serve_file
+from .pagination import paginate_request
+from .replica import replica_reads
+from .search import SEARCH_ORDERING, search_reports
+from .spatial import get_center_index
+from .streaming import stream_for
+from .writebuffer import get_buffer
+from collections import Counter
+from functools import wraps
 import json
+import math
+
+
+NEARBY_DEFAULT_RESULTS = 5
+NEARBY_MAX_RESULTS = 100
+NEARBY_MAX_RADIUS_KM = 500
+MAP_MAX_MARKERS = 500
+MAP_CLUSTER_MAX_ZOOM = 15
+
+STATUS_MAX_REPORTS = 100
+
+# Keyset orderings for paginated lists; each ends in a unique column
+REPORT_ORDERING = ('-created_at', '-id')
+USER_ORDERING = ('username', 'id')
+CENTER_ORDERING = ('name', 'id')
+
+
+def async_cache_control(**kwargs):
+    """``cache_control`` for async views, which Django 4.2's decorator does not support"""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kw):
+            response = await view_func(request, *args, **kw)
+            patch_cache_control(response, **kwargs)
+            return response
+        return wrapper
+    return decorator
 
 
 # Home view
@@ -32,14 +81,15 @@ def home(request):
 def citizen_dashboard(request):
     """Citizen dashboard showing their reports summary"""
     reports = WasteReport.objects.filter(citizen=request.user)
+    counts = get_counts('citizen', request.user.id)
     
     recent_reports = reports.order_by('-created_at')[:5]
     
     context = {
-        'total_reports': reports.count(),
-        'pending_reports': reports.filter(status='pending').count(),
-        'in_progress_reports': reports.filter(status='in_progress').count(),
-        'completed_reports': reports.filter(status='completed').count(),
+        'total_reports': counts['total'],
+        'pending_reports': counts['pending'],
+        'in_progress_reports': counts['in_progress'],
+        'completed_reports': counts['completed'],
         'recent_reports': recent_reports,
     }
     return render(request, 'citizen/dashboard.html', context)
@@ -51,9 +101,31 @@ def submit_report(request):
     if request.method == 'POST':
         form = WasteReportForm(request.POST, request.FILES)
         if form.is_valid():
+            latitude = form.cleaned_data['latitude']
+            longitude = form.cleaned_data['longitude']
+            duplicate = find_duplicate(latitude, longitude)
+            if duplicate is not None:
+                existing, distance = duplicate
+                ReportConfirmation.objects.create(
+                    report=existing, citizen=request.user, description=form.cleaned_data['description'],
+                    latitude=latitude, longitude=longitude, distance=distance,
+                )
+                messages.info(
+                    request,
+                    f'Report #{existing.pk} about this spot is already open, so your report was added to it. Thank you!'
+                )
+                return redirect('track_reports')
+            
             report = form.save(commit=False)
             report.citizen = request.user
             
+            # Written in a batch by the committer thread, which assigns the center
+            buffer = get_buffer()
+            if buffer is not None:
+                buffer.submit(report)
+                messages.success(request, 'Your waste report has been received and will appear in your reports shortly.')
+                return redirect('track_reports')
+            
             # Try to assign to nearest recycling center
             latitude = float(form.cleaned_data['latitude'])
             longitude = float(form.cleaned_data['longitude'])
@@ -71,21 +143,123 @@ def submit_report(request):
 
 
 @citizen_required
+@replica_reads
 def track_reports(request):
     """Track all reports submitted by the citizen"""
     reports = WasteReport.objects.filter(citizen=request.user).select_related('center')
+    reports = paginate_request(request, reports, REPORT_ORDERING)
     return render(request, 'citizen/track_reports.html', {'reports': reports})
 
 
 @citizen_required
+@cache_control(private=True, max_age=300)
 def map_centers(request):
-    """Display all recycling centers on a map"""
-    centers = RecyclingCenter.objects.all()
+    """Display recycling centers on a map
     
-    # Serialize centers data for JavaScript
-    centers_data = []
-    for center in centers:
-        centers_data.append({
+    The page is a static shell; markers are loaded from ``map_centers_api``
+    for the visible viewport as the map pans and zooms.
+    """
+    return render(request, 'citizen/map_centers.html')
+
+
+@citizen_required
+@async_cache_control(private=True, max_age=60)
+async def map_centers_api(request):
+    """API endpoint returning the recycling centers inside a map viewport
+    
+    Query parameters: ``south``, ``west``, ``north``, ``east`` and ``zoom``.
+    When more than ``MAP_MAX_MARKERS`` centers are visible below
+    ``MAP_CLUSTER_MAX_ZOOM`` the response carries grid clusters instead.
+    """
+    try:
+        bbox = BoundingBox.from_query(request.GET)
+        zoom = parse_zoom(request.GET.get('zoom', MAP_CLUSTER_MAX_ZOOM))
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    centers = RecyclingCenter.objects.filter(bbox.q()).order_by()
+    visible = [center async for center in centers.values(
+        'id', 'name', 'address', 'latitude', 'longitude',
+        'materials_accepted', 'working_hours',
+    )[:MAP_MAX_MARKERS + 1]]
+    
+    if len(visible) > MAP_MAX_MARKERS and zoom < MAP_CLUSTER_MAX_ZOOM:
+        clusters = [
+            {
+                'id': cell_id(zoom, cell['cell_y'], cell['cell_x']),
+                'latitude': cell['avg_latitude'],
+                'longitude': cell['avg_longitude'],
+                'count': cell['count'],
+            }
+            async for cell in cluster(centers, zoom)
+        ]
+        return JsonResponse({'type': 'clusters', 'zoom': zoom, 'clusters': clusters})
+    
+    for center in visible:
+        center['latitude'] = float(center['latitude'])
+        center['longitude'] = float(center['longitude'])
+    
+    return JsonResponse({
+        'type': 'centers',
+        'zoom': zoom,
+        'centers': visible[:MAP_MAX_MARKERS],
+        'truncated': len(visible) > MAP_MAX_MARKERS,
+    })
+
+
+@citizen_required
+def center_detail(request, pk):
+    """Display details of a specific recycling center"""
+    center = get_object_or_404(RecyclingCenter, pk=pk)
+    return render(request, 'citizen/center_detail.html', {'center': center})
+
+
+@citizen_required
+async def nearby_centers_api(request):
+    """API endpoint returning the nearest recycling centers to a location
+    
+    Query parameters: ``lat`` and ``lon`` (required), ``k`` (number of
+    results), ``radius_km`` (only centers within this distance) and
+    ``material`` (repeatable; centers must accept every material listed).
+    At most ``NEARBY_MAX_RESULTS`` centers are returned; ``truncated`` says
+    whether more matched.
+    """
+    try:
+        latitude = parse_coordinate(request.GET.get('lat'), 90)
+        longitude = parse_coordinate(request.GET.get('lon'), 180)
+        radius_km = request.GET.get('radius_km')
+        radius_km = float(radius_km) if radius_km else None
+        if radius_km is not None and not 0 < radius_km <= NEARBY_MAX_RADIUS_KM:
+            raise ValueError(f'radius_km must be between 0 and {NEARBY_MAX_RADIUS_KM}')
+        default_k = NEARBY_MAX_RESULTS if radius_km else NEARBY_DEFAULT_RESULTS
+        k = int(request.GET.get('k') or default_k)
+        if not 1 <= k <= NEARBY_MAX_RESULTS:
+            raise ValueError(f'k must be between 1 and {NEARBY_MAX_RESULTS}')
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    # Rebuilding the index when centers changed queries the database
+    index = await sync_to_async(get_center_index)()
+    materials = request.GET.getlist('material')
+    centers = {}
+    checked = set()
+    # One more than asked for, to tell whether the results were cut off
+    wanted = k + 1
+    while True:
+        found = index.nearest(latitude, longitude, k=wanted, radius_km=radius_km, materials=materials)
+        ids = [center_id for center_id, _ in found if center_id not in checked]
+        centers.update(await RecyclingCenter.objects.ain_bulk(ids))
+        checked.update(ids)
+        # Centers deleted since the index was built are skipped and replaced by the next nearest
+        nearest = [(center_id, distance) for center_id, distance in found if center_id in centers]
+        if len(nearest) > k or len(found) < wanted:
+            break
+        wanted += len(found) - len(nearest)
+    
+    results = []
+    for center_id, distance in nearest[:k]:
+        center = centers[center_id]
+        results.append({
             'id': center.id,
             'name': center.name,
             'address': center.address,
@@ -93,21 +267,80 @@ def map_centers(request):
             'longitude': float(center.longitude),
             'materials_accepted': center.materials_accepted,
             'working_hours': center.working_hours,
+            'distance_km': round(distance, 3),
         })
     
-    context = {
-        'centers': centers,
-        'centers_json': json.dumps(centers_data),
-    }
-    
-    return render(request, 'citizen/map_centers.html', context)
+    return JsonResponse({'count': len(results), 'truncated': len(nearest) > k, 'results': results})
 
 
 @citizen_required
-def center_detail(request, pk):
-    """Display details of a specific recycling center"""
-    center = get_object_or_404(RecyclingCenter, pk=pk)
-    return render(request, 'citizen/center_detail.html', {'center': center})
+@replica_reads
+async def report_status_api(request):
+    """API endpoint returning the current status of the citizen's reports
+    
+    Query parameter: ``ids``, comma-separated report ids (at most
+    ``STATUS_MAX_REPORTS``). Ids of other citizens' reports are left out.
+    Lets pages poll for status changes without reloading.
+    """
+    try:
+        ids = [int(value) for value in request.GET.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        return JsonResponse({'error': 'ids must be comma-separated report ids'}, status=400)
+    if not 1 <= len(ids) <= STATUS_MAX_REPORTS:
+        return JsonResponse({'error': f'ids must list between 1 and {STATUS_MAX_REPORTS} reports'}, status=400)
+    
+    reports = (
+        WasteReport.objects.filter(citizen=request.user, pk__in=ids)
+        .order_by('id')
+        .values('id', 'status', 'updated_at')
+    )
+    results = [
+        {
+            'id': report['id'],
+            'status': report['status'],
+            'updated_at': report['updated_at'].isoformat(),
+        }
+        async for report in reports
+    ]
+    return JsonResponse({'reports': results})
+
+
+@citizen_required
+@require_POST
+def batch_reports_api(request):
+    """API endpoint creating many reports from a JSON array in one request
+    
+    Each item has ``description``, ``latitude`` and ``longitude``, and may
+    include a base64 ``image`` with an ``image_name``. Valid items are created
+    even when others are invalid, unless they duplicate an open report; see
+    ``core.dedupe``. ``results`` holds one entry per item. The whole body,
+    images included, must fit in ``MAX_UPLOAD_SIZE``.
+    """
+    # Read directly, so only this endpoint goes past DATA_UPLOAD_MAX_MEMORY_SIZE
+    limit = settings.MAX_UPLOAD_SIZE
+    body = request.read(limit + 1) if limit is not None else request.read()
+    if limit is not None and len(body) > limit:
+        return JsonResponse(
+            {'error': f'The request body is larger than {filesizeformat(limit)}; send fewer reports at once'},
+            status=413
+        )
+    try:
+        items = json.loads(body)
+    except (UnicodeDecodeError, ValueError):
+        return JsonResponse({'error': 'The request body must be a JSON array of reports'}, status=400)
+    if not isinstance(items, list) or not items:
+        return JsonResponse({'error': 'The request body must be a non-empty JSON array of reports'}, status=400)
+    if len(items) > MAX_BATCH_SIZE:
+        return JsonResponse({'error': f'At most {MAX_BATCH_SIZE} reports can be sent at once'}, status=400)
+    
+    results = ingest_reports(request.user, items)
+    statuses = Counter(result['status'] for result in results)
+    return JsonResponse({
+        'created': statuses['created'],
+        'duplicate': statuses['duplicate'],
+        'invalid': statuses['invalid'],
+        'results': results,
+    })
 
 
 # ===================================
@@ -115,23 +348,25 @@ def center_detail(request, pk):
 # ===================================
 
 @staff_required
+@replica_reads
 def staff_dashboard(request):
     """Staff dashboard showing assigned reports"""
-    try:
-        center = request.user.assigned_center.get()
+    center = get_actor(request).center
+    if center is not None:
         reports = WasteReport.objects.filter(center=center).select_related('citizen')
+        counts = get_counts('center', center.id)
         
         recent_reports = reports.order_by('-created_at')[:10]
         
         context = {
             'center': center,
-            'total_reports': reports.count(),
-            'pending_reports': reports.filter(status='pending').count(),
-            'in_progress_reports': reports.filter(status='in_progress').count(),
-            'completed_reports': reports.filter(status='completed').count(),
+            'total_reports': counts['total'],
+            'pending_reports': counts['pending'],
+            'in_progress_reports': counts['in_progress'],
+            'completed_reports': counts['completed'],
             'recent_reports': recent_reports,
         }
-    except RecyclingCenter.DoesNotExist:
+    else:
         context = {
             'center': None,
             'total_reports': 0,
@@ -146,10 +381,11 @@ def staff_dashboard(request):
 
 
 @staff_required
+@replica_reads
 def view_reports(request):
     """View all reports assigned to staff's center"""
-    try:
-        center = request.user.assigned_center.get()
+    center = get_actor(request).center
+    if center is not None:
         reports = WasteReport.objects.filter(center=center).select_related('citizen')
         
         # Filter by status if provided
@@ -159,10 +395,10 @@ def view_reports(request):
         
         context = {
             'center': center,
-            'reports': reports,
+            'reports': paginate_request(request, reports, REPORT_ORDERING),
             'status_filter': status_filter,
         }
-    except RecyclingCenter.DoesNotExist:
+    else:
         context = {
             'center': None,
             'reports': [],
@@ -175,17 +411,16 @@ def view_reports(request):
 @staff_required
 def update_report_status(request, pk):
     """Update the status of a report"""
-    report = get_object_or_404(WasteReport, pk=pk)
+    report = get_object_or_404(WasteReport.objects.select_related('citizen'), pk=pk)
     
     # Verify staff can only update reports assigned to their center
-    try:
-        center = request.user.assigned_center.get()
-        if report.center != center:
-            messages.error(request, 'You can only update reports assigned to your center.')
-            return redirect('view_reports')
-    except RecyclingCenter.DoesNotExist:
+    center = get_actor(request).center
+    if center is None:
         messages.error(request, 'You are not assigned to any recycling center.')
         return redirect('staff_dashboard')
+    if report.center_id != center.id:
+        messages.error(request, 'You can only update reports assigned to your center.')
+        return redirect('view_reports')
     
     if request.method == 'POST':
         form = ReportStatusForm(request.POST, instance=report)
@@ -196,15 +431,17 @@ def update_report_status(request, pk):
     else:
         form = ReportStatusForm(instance=report)
     
-    return render(request, 'staff/update_status.html', {'form': form, 'report': report})
+    confirmations = report.confirmations.select_related('citizen')
+    return render(request, 'staff/update_status.html', {
+        'form': form, 'report': report, 'confirmations': confirmations,
+    })
 
 
 @staff_required
 def update_center_info(request):
     """Update recycling center information"""
-    try:
-        center = request.user.assigned_center.get()
-    except RecyclingCenter.DoesNotExist:
+    center = get_actor(request).center
+    if center is None:
         messages.error(request, 'You are not assigned to any recycling center.')
         return redirect('staff_dashboard')
     
@@ -225,13 +462,15 @@ def update_center_info(request):
 # ===================================
 
 @admin_required
+@replica_reads
 def admin_dashboard(request):
     """Admin dashboard with statistics"""
+    counts = get_counts('global')
     stats = {
-        'total_reports': WasteReport.objects.count(),
-        'pending': WasteReport.objects.filter(status='pending').count(),
-        'in_progress': WasteReport.objects.filter(status='in_progress').count(),
-        'completed': WasteReport.objects.filter(status='completed').count(),
+        'total_reports': counts['total'],
+        'pending': counts['pending'],
+        'in_progress': counts['in_progress'],
+        'completed': counts['completed'],
         'total_centers': RecyclingCenter.objects.count(),
         'total_users': User.objects.count(),
         'total_citizens': User.objects.filter(role='citizen').count(),
@@ -243,11 +482,13 @@ def admin_dashboard(request):
     context = {
         'stats': stats,
         'recent_reports': recent_reports,
+        'heatmap_max_zoom': HEATMAP_MAX_ZOOM,
     }
     return render(request, 'admin_panel/dashboard.html', context)
 
 
 @admin_required
+@replica_reads
 def manage_reports(request):
     """Manage all waste reports"""
     reports = WasteReport.objects.select_related('citizen', 'center')
@@ -257,22 +498,39 @@ def manage_reports(request):
     if status_filter:
         reports = reports.filter(status=status_filter)
     
-    # Search
+    # Search, ranked by relevance
     search_query = request.GET.get('search')
+    ordering = REPORT_ORDERING
     if search_query:
-        reports = reports.filter(
-            Q(citizen__username__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        reports = search_reports(reports, search_query)
+        ordering = SEARCH_ORDERING
     
     context = {
-        'reports': reports,
+        'reports': paginate_request(request, reports, ordering),
         'status_filter': status_filter,
         'search_query': search_query,
     }
     return render(request, 'admin_panel/manage_reports.html', context)
 
 
+@admin_required
+@replica_reads
+def export_reports(request):
+    """Stream filtered reports as a CSV or JSON Lines download"""
+    export_format = request.GET.get('format', 'csv')
+    try:
+        filters = parse_filters(request.GET)
+        chunks = stream_reports(export_format, **filters)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(chunks, content_type=f'{content_type}; charset=utf-8')
+    filename = f'reports-{timezone.now():%Y%m%d-%H%M%S}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return stream_for(request, response)
+
+
 @admin_required
 def delete_report(request, pk):
     """Delete a waste report"""
@@ -283,6 +541,7 @@ def delete_report(request, pk):
 
 
 @admin_required
+@replica_reads
 def manage_centers(request):
     """Manage all recycling centers"""
     centers = RecyclingCenter.objects.select_related('assigned_staff')
@@ -296,7 +555,7 @@ def manage_centers(request):
         )
     
     context = {
-        'centers': centers,
+        'centers': paginate_request(request, centers, CENTER_ORDERING),
         'search_query': search_query,
     }
     return render(request, 'admin_panel/manage_centers.html', context)
@@ -344,6 +603,7 @@ def delete_center(request, pk):
 
 
 @admin_required
+@replica_reads
 def manage_users(request):
     """Manage all users"""
     users = User.objects.all()
@@ -364,7 +624,7 @@ def manage_users(request):
         )
     
     context = {
-        'users': users,
+        'users': paginate_request(request, users, USER_ORDERING),
         'role_filter': role_filter,
         'search_query': search_query,
     }
@@ -389,23 +649,26 @@ def assign_role(request, pk):
 
 
 @admin_required
-def statistics_api(request):
+@replica_reads
+async def statistics_api(request):
     """API endpoint for dashboard statistics"""
     # Reports by status
+    counts = await aget_counts('global')
     status_stats = {
-        'pending': WasteReport.objects.filter(status='pending').count(),
-        'in_progress': WasteReport.objects.filter(status='in_progress').count(),
-        'completed': WasteReport.objects.filter(status='completed').count(),
+        'pending': counts['pending'],
+        'in_progress': counts['in_progress'],
+        'completed': counts['completed'],
     }
     
     # Reports by area (simplified - grouping by center)
-    area_stats = []
-    centers = RecyclingCenter.objects.annotate(report_count=Count('reports'))
-    for center in centers:
-        area_stats.append({
-            'name': center.name,
-            'count': center.report_count,
-        })
+    center_totals = await aget_center_totals()
+    area_stats = [
+        {
+            'name': name,
+            'count': center_totals.get(center_id, 0),
+        }
+        async for center_id, name in RecyclingCenter.objects.values_list('id', 'name')
+    ]
     
     data = {
         'status_stats': status_stats,
@@ -415,30 +678,67 @@ def statistics_api(request):
     return JsonResponse(data)
 
 
+@admin_required
+def report_heatmap_api(request, z, x, y):
+    """API endpoint returning clustered waste reports for one map tile
+    
+    Reports are aggregated into grid cells with their count and a breakdown
+    by status. Tiles are cached and evicted as reports change.
+    """
+    if z > HEATMAP_MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        return JsonResponse({'error': f'Tile {z}/{x}/{y} is out of range'}, status=400)
+    
+    return JsonResponse({'z': z, 'x': x, 'y': y, 'cells': tile_cells(z, x, y)})
+
+
+# ===================================
+# MEDIA
+# ===================================
+
+def visible_reports(user):
+    """Reports whose images ``user`` may see"""
+    if user.is_admin_user():
+        return WasteReport.objects.all()
+    if user.is_staff_user():
+        return WasteReport.objects.filter(center__assigned_staff=user)
+    return WasteReport.objects.filter(citizen=user)
+
+
+def serve_media(request, name):
+    """Serve a report image, thumbnail or preview to users allowed to see the report"""
+    if not request.user.is_authenticated:
+        raise Http404('File not found')
+    referenced = visible_reports(request.user).filter(
+        Q(image=name) | Q(image_thumbnail=name) | Q(image_preview=name)
+    )
+    if not referenced.exists():
+        raise Http404('File not found')
+    return serve_file(request, WasteReport._meta.get_field('image').storage, name)
+
+
 # ===================================
 # UTILITY FUNCTIONS
 # ===================================
 
 def find_nearest_center(latitude, longitude):
-    """Find the nearest recycling center using Haversine formula"""
-    centers = RecyclingCenter.objects.all()
+    """Find the nearest recycling center using the in-process spatial index"""
+    nearest = get_center_index().nearest(latitude, longitude)
     
-    if not centers:
+    if not nearest:
         return None
     
-    min_distance = float('inf')
-    nearest_center = None
-    
-    for center in centers:
-        distance = calculate_distance(
-            latitude, longitude,
-            float(center.latitude), float(center.longitude)
-        )
-        if distance < min_distance:
-            min_distance = distance
-            nearest_center = center
-    
-    return nearest_center
+    center_id = nearest[0][0]
+    return RecyclingCenter.objects.filter(pk=center_id).first()
+
+
+def parse_coordinate(value, limit):
+    """Parse a latitude or longitude query parameter"""
+    if value is None or value == '':
+        raise ValueError('lat and lon are required')
+    coordinate = float(value)
+    if not -limit <= coordinate <= limit:
+        raise ValueError(f'Coordinate {value} is out of range')
+    return coordinate
 
 
 def calculate_distance(lat1, lon1, lat2, lon2):
@@ -0,0 +1,391 @@
+"""
+Group commit for report submissions.
+
+With ``SUBMISSION_BUFFER`` configured, ``submit_report`` does not write the
+report itself. The submission is appended to a log file and synced to disk,
+the citizen gets an answer, and a committer thread writes the buffered
+reports in one transaction every ``FLUSH_INTERVAL_MS``, or as soon as
+``MAX_BATCH`` are waiting. A burst of submissions then costs a few write
+transactions instead of one each, and no request waits for the database
+write lock.
+
+Each process appends to its own segment file in ``DIRECTORY`` and holds an
+exclusive ``flock`` on it while it lives. A segment is emptied once all of
+its submissions are committed; past ``MAX_SEGMENT_BYTES`` a fresh one is
+started and the old one deleted when drained. A segment whose lock can be
+taken was left by a process that died. Buffers replay such segments when
+they start and every ``RECOVERY_INTERVAL`` seconds after that, and
+``manage.py replay_submissions`` does the same on demand. Every submission
+carries a ``submission_id`` that is stored on its report, so a segment
+replayed after its batch was committed creates nothing twice.
+
+A batch that fails ``MAX_ATTEMPTS`` times in a row, or a replayed batch
+that fails at all, is committed one submission at a time. Submissions that
+fail on their own data are moved to a dead-letter file (``*.failed``, one
+JSON record per line, never replayed automatically) and logged, so one bad
+submission cannot hold up the rest. Errors such as a lost connection are
+retried instead.
+
+Buffered submissions appear once committed, normally within a fraction of
+a second, and duplicate detection only sees them from then on. Photos are
+stored before the submission is logged. Submissions committed late, e.g.
+on replay, keep their submission time as ``created_at``.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import User
+from .ingest import assign_centers, save_reports
+from .models import WasteReport
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.log'
+MAX_SEGMENT_BYTES = 64 * 1024 * 1024
+RECOVERY_INTERVAL = 60
+RETRY_DELAY = 5
+# Failed commits of a batch before it is split up to find the bad submissions
+MAX_ATTEMPTS = 3
+DEAD_LETTER_SUFFIX = '.failed'
+# Failures that say nothing about the submissions, so they are retried
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+# Commits later than this after submission restore the submission time
+LATE_COMMIT = timedelta(seconds=1)
+
+
+def submission_record(report):
+    """The log record for an unsaved report, storing its photo first"""
+    if report.image and not report.image._committed:
+        report.image.save(report.image.name, report.image.file, save=False)
+    return {
+        'submission_id': uuid.uuid4().hex,
+        'citizen_id': report.citizen_id,
+        'description': report.description,
+        'latitude': str(report.latitude),
+        'longitude': str(report.longitude),
+        'image': report.image.name if report.image else '',
+        'submitted_at': timezone.now().isoformat(),
+    }
+
+
+def commit_records(records):
+    """Create reports for logged submissions; returns the reports created
+
+    Submissions that were already committed, and those of citizens deleted
+    since, are skipped.
+    """
+    ids = [record['submission_id'] for record in records]
+    committed = {value.hex for value in WasteReport.objects.filter(submission_id__in=ids).values_list('submission_id', flat=True)}
+    citizens = set(User.objects.filter(pk__in={record['citizen_id'] for record in records}).values_list('pk', flat=True))
+
+    reports = []
+    submitted_at = {}
+    for record in records:
+        submission_id = record['submission_id']
+        if submission_id in committed or submission_id in submitted_at or record['citizen_id'] not in citizens:
+            continue
+        submitted_at[submission_id] = parse_datetime(record['submitted_at'])
+        reports.append(WasteReport(
+            submission_id=uuid.UUID(submission_id),
+            citizen_id=record['citizen_id'],
+            description=record['description'],
+            latitude=Decimal(record['latitude']),
+            longitude=Decimal(record['longitude']),
+            image=record['image'] or None,
+        ))
+
+    assign_centers(reports)
+    with transaction.atomic():
+        save_reports(reports)
+        late = []
+        for report in reports:
+            submitted = submitted_at[report.submission_id.hex]
+            if report.created_at - submitted > LATE_COMMIT:
+                report.created_at = submitted
+                late.append(report)
+        WasteReport.objects.bulk_update(late, ['created_at'])
+    return reports
+
+
+def dead_letter(directory, records):
+    """Set aside submissions that cannot be committed; returns the file written"""
+    path = os.path.join(directory, f'{os.getpid()}-{uuid.uuid4().hex}{DEAD_LETTER_SUFFIX}')
+    with open(path, 'wb') as file:
+        for record in records:
+            file.write((json.dumps(record, separators=(',', ':')) + '\n').encode())
+        file.flush()
+        os.fsync(file.fileno())
+    logger.error('Moved %d submissions that cannot be committed to %s', len(records), path)
+    return path
+
+
+def commit_each(records, directory):
+    """Commit submissions one at a time, setting aside those that fail
+
+    Returns how many were set aside. Transient errors are raised, leaving
+    the remaining submissions to be retried.
+    """
+    failed = []
+    for record in records:
+        try:
+            commit_records([record])
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception:
+            logger.exception('Submission %s cannot be committed', record.get('submission_id'))
+            failed.append(record)
+    if failed:
+        dead_letter(directory, failed)
+    return len(failed)
+
+
+def read_records(file):
+    """Records in a segment; a torn last line from a crash is ignored"""
+    records = []
+    for number, line in enumerate(file, 1):
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            if line.endswith(b'\n'):
+                logger.error('Skipping unreadable line %d of %s', number, file.name)
+    return records
+
+
+def recover_segments(directory, batch_size=500):
+    """Replay the segments in ``directory`` left by processes that died
+
+    Returns ``(segments, submissions)`` replayed. Segments still locked by
+    a live process are left alone.
+    """
+    if fcntl is None:
+        raise ImproperlyConfigured('The submission buffer needs fcntl.flock, which this platform lacks')
+    segments = submissions = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(SEGMENT_SUFFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            continue
+        with file:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            try:
+                if os.stat(path).st_ino != os.fstat(file.fileno()).st_ino:
+                    continue
+            except FileNotFoundError:
+                # Replayed by another process while we waited for the lock
+                continue
+            records = read_records(file)
+            for start in range(0, len(records), batch_size):
+                batch = records[start:start + batch_size]
+                try:
+                    commit_records(batch)
+                except TRANSIENT_ERRORS:
+                    raise
+                except Exception:
+                    commit_each(batch, directory)
+            os.unlink(path)
+        segments += 1
+        submissions += len(records)
+        if records:
+            logger.info('Replayed %d submissions from %s', len(records), path)
+    return segments, submissions
+
+
+class Segment:
+    """A log file this process appends to, locked for as long as it is open"""
+
+    def __init__(self, directory):
+        name = f'{os.getpid()}-{uuid.uuid4().hex}'
+        temporary = os.path.join(directory, name + '.tmp')
+        self.path = os.path.join(directory, name + SEGMENT_SUFFIX)
+        self.file = open(temporary, 'ab')
+        # Locked before it gets a name recovery looks at, so it is never taken for a dead one
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        os.rename(temporary, self.path)
+        self.size = 0
+        self.outstanding = 0
+
+    def append(self, line):
+        self.file.write(line)
+        self.file.flush()
+        self.size += len(line)
+        self.outstanding += 1
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+
+    def truncate(self):
+        self.file.truncate(0)
+        self.size = 0
+
+    def remove(self):
+        os.unlink(self.path)
+        self.file.close()
+
+
+class SubmissionBuffer:
+    """Logs submissions and commits them in batches from a background thread"""
+
+    def __init__(self, directory, flush_interval=0.2, max_batch=500, fsync=True):
+        if fcntl is None:
+            raise ImproperlyConfigured('The submission buffer needs fcntl.flock, which this platform lacks')
+        self.directory = str(directory)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        # (segment, record) pairs waiting to be committed
+        self.pending = []
+        self.segment = Segment(self.directory)
+        self.retired = []
+        self.thread = None
+        self.stopping = False
+        # Failed commits of the batch at the head of pending
+        self.attempts = 0
+
+    @classmethod
+    def from_settings(cls, config):
+        return cls(
+            config['DIRECTORY'],
+            flush_interval=config.get('FLUSH_INTERVAL_MS', 200) / 1000,
+            max_batch=config.get('MAX_BATCH', 500),
+            fsync=config.get('FSYNC', True),
+        )
+
+    def submit(self, report):
+        """Log an unsaved report; it is durable once this returns"""
+        record = submission_record(report)
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        with self.lock:
+            if self.segment.size > MAX_SEGMENT_BYTES:
+                self.retired.append(self.segment)
+                self.segment = Segment(self.directory)
+            segment = self.segment
+            segment.append(line)
+            self.pending.append((segment, record))
+            if len(self.pending) >= self.max_batch:
+                self.wakeup.notify()
+        if self.fsync:
+            # Outside the lock, so concurrent submissions share disk flushes
+            segment.sync()
+        return record['submission_id']
+
+    def flush(self):
+        """Commit up to ``max_batch`` pending submissions; returns how many"""
+        with self.lock:
+            batch = self.pending[:self.max_batch]
+            del self.pending[:self.max_batch]
+        if not batch:
+            return 0
+        records = [record for _, record in batch]
+        try:
+            try:
+                commit_records(records)
+            except Exception:
+                self.attempts += 1
+                if self.attempts < MAX_ATTEMPTS:
+                    raise
+                # The batch keeps failing; find the submissions at fault
+                commit_each(records, self.directory)
+        except Exception:
+            with self.lock:
+                self.pending[:0] = batch
+            raise
+        self.attempts = 0
+
+        with self.lock:
+            for segment, _ in batch:
+                segment.outstanding -= 1
+            for segment in [segment for segment in self.retired if not segment.outstanding]:
+                self.retired.remove(segment)
+                segment.remove()
+            if not self.segment.outstanding and self.segment.size:
+                self.segment.truncate()
+        return len(batch)
+
+    def start(self):
+        """Replay segments of dead processes and start committing in the background"""
+        self.thread = threading.Thread(target=self.run, name='submission-committer', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=10):
+        """Commit what is pending and stop the committer"""
+        with self.lock:
+            self.stopping = True
+            self.wakeup.notify()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        with self.lock:
+            if not self.pending and not self.retired and not self.segment.file.closed:
+                # Nothing left to replay
+                self.segment.remove()
+
+    def run(self):
+        next_recovery = time.monotonic()
+        while True:
+            with self.lock:
+                if len(self.pending) < self.max_batch and not self.stopping:
+                    self.wakeup.wait(self.flush_interval)
+                stopping = self.stopping
+            close_old_connections()
+            try:
+                if time.monotonic() >= next_recovery:
+                    recover_segments(self.directory, self.max_batch)
+                    next_recovery = time.monotonic() + RECOVERY_INTERVAL
+                while self.flush():
+                    pass
+            except Exception:
+                # Pending submissions stay logged and queued; try again shortly
+                logger.exception('Committing buffered submissions failed')
+                if stopping:
+                    return
+                time.sleep(RETRY_DELAY)
+                continue
+            if stopping:
+                return
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """This process's submission buffer, started on first use; None unless configured"""
+    global _buffer
+    config = getattr(settings, 'SUBMISSION_BUFFER', None)
+    if not config:
+        return None
+    with _buffer_lock:
+        # A forked process must not share its parent's segment
+        if _buffer is None or _buffer.pid != os.getpid():
+            _buffer = SubmissionBuffer.from_settings(config)
+            _buffer.start()
+    return _buffer
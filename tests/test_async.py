@@ -0,0 +1,128 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from accounts.models import User
+from core.models import RecyclingCenter, WasteReport
+from decimal import Decimal
+from io import StringIO
+import importlib.util
+import unittest
+
+
+class AsyncViewsTest(TestCase):
+    """Test cases for the async JSON endpoints, served through the ASGI handler"""
+
+    def setUp(self):
+        """Set up users, a center and reports"""
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@test.com',
+            password='testpass123',
+            role='admin'
+        )
+        self.center = RecyclingCenter.objects.create(
+            name='Test Center',
+            address='123 Test St',
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0'),
+            materials_accepted='Plastic, Paper',
+            working_hours='24/7'
+        )
+        self.report = WasteReport.objects.create(
+            citizen=self.citizen,
+            center=self.center,
+            description='Mine',
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0'),
+            status='in_progress'
+        )
+        self.other_report = WasteReport.objects.create(
+            citizen=self.other,
+            description='Not mine',
+            latitude=Decimal('41.7'),
+            longitude=Decimal('-74.0')
+        )
+
+    async def login(self, user):
+        await sync_to_async(self.async_client.force_login)(user)
+
+    async def test_statistics(self):
+        """Test the statistics API reads the counters and centers"""
+        await self.login(self.admin)
+        response = await self.async_client.get(reverse('statistics_api'))
+        data = response.json()
+        self.assertEqual(data['status_stats'], {'pending': 1, 'in_progress': 1, 'completed': 0})
+        self.assertEqual(data['area_stats'], [{'name': 'Test Center', 'count': 1}])
+
+    async def test_role_required(self):
+        """Test the async decorators redirect anonymous users and other roles"""
+        response = await self.async_client.get(reverse('statistics_api'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        await self.login(self.citizen)
+        response = await self.async_client.get(reverse('statistics_api'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+    async def test_map_and_nearby_centers(self):
+        """Test the center endpoints answer and keep their cache headers"""
+        await self.login(self.citizen)
+        response = await self.async_client.get(reverse('map_centers_api'), {
+            'south': '40', 'west': '-75', 'north': '41', 'east': '-73', 'zoom': '12',
+        })
+        self.assertEqual([center['name'] for center in response.json()['centers']], ['Test Center'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        response = await self.async_client.get(reverse('nearby_centers_api'), {'lat': '40.71', 'lon': '-74.0'})
+        self.assertEqual(response.json()['results'][0]['id'], self.center.pk)
+
+    async def test_report_status(self):
+        """Test citizens get the status of their own reports only"""
+        await self.login(self.citizen)
+        ids = f'{self.report.pk},{self.other_report.pk}'
+        response = await self.async_client.get(reverse('report_status_api'), {'ids': ids})
+        reports = response.json()['reports']
+        self.assertEqual([(report['id'], report['status']) for report in reports], [(self.report.pk, 'in_progress')])
+
+        for ids in ('', 'a,b', ','.join(str(i) for i in range(101))):
+            response = await self.async_client.get(reverse('report_status_api'), {'ids': ids})
+            self.assertEqual(response.status_code, 400)
+
+    def test_sync_client(self):
+        """Test the async views also serve WSGI requests"""
+        self.client.force_login(self.citizen)
+        response = self.client.get(reverse('report_status_api'), {'ids': self.report.pk})
+        self.assertEqual(response.json()['reports'][0]['status'], 'in_progress')
+
+    @override_settings(REPLICA_DATABASE='replica', DEBUG=True)
+    def test_middleware_runs_async(self):
+        """Test no middleware needs adapting to the async handler"""
+        # The handler logs each adapted middleware when DEBUG is on
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+
+@unittest.skipUnless(importlib.util.find_spec('uvicorn'), 'The load test needs uvicorn')
+class LoadTestCommandTest(TestCase):
+    """Test the load test command runs against both servers"""
+
+    def test_loadtest(self):
+        """Test a short run measures WSGI and uvicorn"""
+        out = StringIO()
+        call_command('loadtest', seconds=0.5, slow_clients=2, fast_clients=1, threads=2, stdout=out)
+        self.assertIn('WSGI, 2 threads', out.getvalue())
+        self.assertIn('uvicorn (ASGI)', out.getvalue())
+        self.assertIn('Scratch database removed', out.getvalue())
@@ -0,0 +1,130 @@
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import User
+from core import geohash
+from core.dedupe import find_duplicate, find_duplicates
+from core.models import ReportConfirmation, WasteReport
+from datetime import timedelta
+from decimal import Decimal
+import json
+import math
+
+
+class GeohashTest(TestCase):
+    """Test cases for geohash cells"""
+
+    def test_encode(self):
+        """Test hashes match the reference implementation"""
+        self.assertEqual(geohash.encode(42.6, -5.6, 5), 'ezs42')
+        self.assertEqual(geohash.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_cells_within_cover_the_circle(self):
+        """Test every point within the radius falls in one of the cells"""
+        for latitude, longitude in ((40.7, -74.0), (59.9, 10.75), (-33.9, 151.2), (0.0, 179.9995)):
+            cells = geohash.cells_within(latitude, longitude, 50)
+            self.assertLessEqual(len(cells), 9)
+            for bearing in range(0, 360, 15):
+                offset = 49 / geohash.METERS_PER_DEGREE
+                lat = latitude + offset * math.cos(math.radians(bearing))
+                lon = longitude + offset * math.sin(math.radians(bearing)) / math.cos(math.radians(latitude))
+                self.assertIn(geohash.encode(lat, (lon + 180) % 360 - 180), cells)
+        self.assertGreater(len(geohash.cells_within(40.7, -74.0, 1000)), 9)
+
+
+class DuplicateReportTest(TestCase):
+    """Test cases for near-duplicate report detection"""
+
+    def setUp(self):
+        """Set up a citizen and an open report"""
+        self.client = Client()
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.client.login(username='citizen', password='testpass123')
+        self.report = WasteReport.objects.create(
+            citizen=self.citizen,
+            description='Pile of bags',
+            latitude=Decimal('40.712776'),
+            longitude=Decimal('-74.005974')
+        )
+
+    def submit(self, latitude, longitude, description='Same pile'):
+        return self.client.post(reverse('submit_report'), {
+            'description': description,
+            'latitude': latitude,
+            'longitude': longitude,
+        })
+
+    def test_geohash_follows_location(self):
+        """Test the stored cell is set on create and kept current on save"""
+        self.assertEqual(self.report.geohash, geohash.encode(40.712776, -74.005974))
+        self.report.latitude = Decimal('51.5')
+        self.report.save(update_fields=['latitude'])
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.geohash, geohash.encode(51.5, -74.005974))
+
+    def test_nearby_submission_is_linked(self):
+        """Test a submission next to an open report confirms it instead of creating a report"""
+        response = self.submit('40.713000', '-74.006100')
+        self.assertRedirects(response, reverse('track_reports'))
+        self.assertEqual(WasteReport.objects.count(), 1)
+
+        confirmation = ReportConfirmation.objects.get()
+        self.assertEqual((confirmation.report, confirmation.citizen), (self.report, self.citizen))
+        self.assertEqual(confirmation.description, 'Same pile')
+        self.assertLess(confirmation.distance, 50)
+
+    def test_distinct_reports_are_created(self):
+        """Test far away spots, closed reports and old reports do not count as duplicates"""
+        self.submit('40.714000', '-74.005974')
+        self.assertEqual(WasteReport.objects.count(), 2)
+
+        WasteReport.objects.all().update(status='completed')
+        self.submit('40.712776', '-74.005974')
+        self.assertEqual(WasteReport.objects.count(), 3)
+
+        WasteReport.objects.all().update(created_at=timezone.now() - timedelta(hours=7))
+        self.submit('40.712776', '-74.005974')
+        self.assertEqual(WasteReport.objects.count(), 4)
+        self.assertFalse(ReportConfirmation.objects.exists())
+
+    @override_settings(DUPLICATE_RADIUS_M=0)
+    def test_disabled(self):
+        """Test a radius of 0 turns detection off"""
+        self.submit('40.712776', '-74.005974')
+        self.assertEqual(WasteReport.objects.count(), 2)
+
+    def test_nearest_open_report_wins(self):
+        """Test a point between two open reports is linked to the closer one"""
+        closer = WasteReport.objects.create(
+            citizen=self.citizen, description='Other pile',
+            latitude=Decimal('40.713100'), longitude=Decimal('-74.005974')
+        )
+        report, distance = find_duplicate(40.713050, -74.005974)
+        self.assertEqual(report, closer)
+        self.assertLess(distance, 10)
+
+    def test_batch_lookup_is_one_query(self):
+        """Test a batch of nearby points is checked with a single query"""
+        points = [(40.7127 + i / 100000, -74.0059) for i in range(40)] + [(51.5, -0.12)]
+        with self.assertNumQueries(1):
+            matches = find_duplicates(points)
+        self.assertTrue(all(match[0] == self.report for match in matches[:-1]))
+        self.assertIsNone(matches[-1])
+
+    def test_batch_api_reports_duplicates(self):
+        """Test batch items near an open report are returned as duplicates"""
+        response = self.client.post(reverse('batch_reports_api'), json.dumps([
+            {'description': 'Same pile', 'latitude': '40.712800', 'longitude': '-74.005900'},
+            {'description': 'Elsewhere', 'latitude': '40.80', 'longitude': '-74.00'},
+        ]), content_type='application/json')
+        data = response.json()
+        self.assertEqual((data['created'], data['duplicate'], data['invalid']), (1, 1, 0))
+        self.assertEqual(data['results'][0], {'index': 0, 'status': 'duplicate', 'duplicate_of': self.report.id})
+        self.assertEqual(ReportConfirmation.objects.get().report, self.report)
+        created = WasteReport.objects.get(pk=data['results'][1]['id'])
+        self.assertEqual(created.geohash, geohash.encode('40.80', '-74.00'))
@@ -0,0 +1,314 @@
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import User
+from core.analytics import export_snapshot, read_state
+from core.exports import EXPORT_COLUMNS, stream_reports
+from core.models import RecyclingCenter, WasteReport
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+from io import StringIO
+from unittest.mock import patch
+import csv
+import json
+import os
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import shutil
+import tempfile
+import tracemalloc
+
+
+class ExportReportsTest(TestCase):
+    """Test cases for the report export endpoint and command"""
+
+    def setUp(self):
+        """Set up users, a center and reports"""
+        self.client = Client()
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@test.com',
+            password='testpass123',
+            role='admin'
+        )
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.center = RecyclingCenter.objects.create(
+            name='Export Center',
+            address='1 Export St',
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0'),
+            materials_accepted='All',
+            working_hours='24/7'
+        )
+        self.old = WasteReport.objects.create(
+            citizen=self.citizen,
+            description='Old report, with "quotes"\nand a newline',
+            latitude=Decimal('40.712776'),
+            longitude=Decimal('-74.005974'),
+            status='completed',
+            center=self.center
+        )
+        WasteReport.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=10))
+        self.new = WasteReport.objects.create(
+            citizen=self.citizen,
+            description='New report',
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0')
+        )
+        self.client.login(username='admin', password='testpass123')
+
+    def download(self, **params):
+        response = self.client.get(reverse('export_reports'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        """Test the CSV download has a header and round-trips values"""
+        rows = list(csv.reader(StringIO(self.download(format='csv'))))
+        self.assertEqual(rows[0], [name for name, _ in EXPORT_COLUMNS])
+        self.assertEqual(len(rows), 3)
+        record = dict(zip(rows[0], rows[1]))
+        self.assertEqual(record['description'], self.old.description)
+        self.assertEqual(record['latitude'], '40.712776')
+        self.assertEqual(record['center_name'], 'Export Center')
+        self.assertNotIn('citizen@test.com', self.download(format='csv'))
+
+    def test_jsonl_export_filters(self):
+        """Test status, center and date filters"""
+        def ids(**params):
+            return [json.loads(line)['id'] for line in self.download(format='jsonl', **params).splitlines()]
+
+        self.assertEqual(ids(), [self.old.id, self.new.id])
+        self.assertEqual(ids(status='pending'), [self.new.id])
+        self.assertEqual(ids(center=self.center.id), [self.old.id])
+        today = timezone.now().date()
+        self.assertEqual(ids(since=str(today - timedelta(days=1))), [self.new.id])
+        self.assertEqual(ids(until=str(today - timedelta(days=5))), [self.old.id])
+
+    def test_invalid_parameters(self):
+        """Test invalid filters are rejected before streaming"""
+        for params in ({'format': 'xml'}, {'status': 'lost'}, {'center': 'x'}, {'since': 'yesterday'}):
+            response = self.client.get(reverse('export_reports'), params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_admin_only(self):
+        """Test citizens cannot export reports"""
+        self.client.login(username='citizen', password='testpass123')
+        response = self.client.get(reverse('export_reports'))
+        self.assertNotEqual(response.status_code, 200)
+
+    def test_export_command(self):
+        """Test the command writes a file or standard output"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'reports.csv')
+            call_command('export_reports', output=path, status='completed', stdout=StringIO())
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(len(rows), 2)
+
+        out = StringIO()
+        call_command('export_reports', format='jsonl', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+        with self.assertRaises(CommandError):
+            call_command('export_reports', status='lost', stdout=StringIO())
+
+
+class ExportMemoryTest(TestCase):
+    """Test exports stream in constant memory"""
+
+    def setUp(self):
+        """Set up a citizen"""
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+
+    def add_reports(self, count):
+        WasteReport.objects.bulk_create([
+            WasteReport(
+                citizen=self.citizen,
+                description=f'Report number {i} ' + 'x' * 200,
+                latitude=Decimal('40.7'),
+                longitude=Decimal('-74.0')
+            )
+            for i in range(count)
+        ], batch_size=1000)
+
+    def peak_memory(self, export_format):
+        tracemalloc.start()
+        try:
+            size = 0
+            for chunk in stream_reports(export_format, chunk_size=200):
+                size += len(chunk)
+            return tracemalloc.get_traced_memory()[1], size
+        finally:
+            tracemalloc.stop()
+
+    def test_memory_is_flat(self):
+        """Test peak memory does not grow with the number of rows"""
+        self.add_reports(1000)
+        small = {export_format: self.peak_memory(export_format) for export_format in ('csv', 'jsonl')}
+        self.add_reports(9000)
+        for export_format, (small_peak, small_size) in small.items():
+            large_peak, large_size = self.peak_memory(export_format)
+            self.assertGreater(large_size, 9 * small_size)
+            self.assertLess(large_peak, small_peak * 1.5)
+            self.assertLess(large_peak, large_size / 5)
+
+    async def test_asgi_memory_is_bounded(self):
+        """Test the export endpoint streams under ASGI instead of buffering the whole file"""
+        admin = await sync_to_async(User.objects.create_user)(
+            username='admin', email='admin@test.com', password='testpass123', role='admin'
+        )
+        await sync_to_async(self.add_reports)(10000)
+        await sync_to_async(self.async_client.force_login)(admin)
+        with patch('core.views.stream_reports', partial(stream_reports, chunk_size=200)):
+            response = await self.async_client.get(reverse('export_reports'))
+        self.assertTrue(response.is_async)
+
+        tracemalloc.start()
+        try:
+            size = 0
+            # Iterated the way the ASGI handler sends it
+            async for chunk in response:
+                size += len(chunk)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(size, 10000 * 200)
+        self.assertLess(peak, size / 5)
+
+
+class ParquetSnapshotTest(TestCase):
+    """Test cases for the partitioned Parquet analytics snapshot"""
+
+    def setUp(self):
+        """Set up users, a center, reports and a snapshot directory"""
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.center = RecyclingCenter.objects.create(
+            name='Snapshot Center',
+            address='1 Snapshot St',
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0'),
+            materials_accepted='All',
+            working_hours='24/7'
+        )
+        self.assigned = WasteReport.objects.create(
+            citizen=self.citizen,
+            description='Assigned report',
+            latitude=Decimal('40.712776'),
+            longitude=Decimal('-74.005974'),
+            center=self.center
+        )
+        self.unassigned = WasteReport.objects.create(
+            citizen=self.citizen,
+            description='Unassigned report',
+            latitude=Decimal('-33.868820'),
+            longitude=Decimal('151.209290')
+        )
+        WasteReport.objects.filter(pk=self.unassigned.pk).update(
+            created_at=timezone.now() - timedelta(days=62)
+        )
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def export(self, **kwargs):
+        return export_snapshot(self.directory, settle_delay=timedelta(0), **kwargs)
+
+    def reports(self):
+        return ds.dataset(os.path.join(self.directory, 'reports'), partitioning='hive').to_table()
+
+    def test_partitions_and_types(self):
+        """Test reports are partitioned by month and center with exact types"""
+        result = self.export()
+        self.assertEqual(result['reports'], 2)
+        self.assertEqual(result['files'], 2)
+
+        table = self.reports()
+        self.assertEqual(table.schema.field('latitude').type, pa.decimal128(9, 6))
+        self.assertEqual(table.schema.field('created_at').type, pa.timestamp('us', tz='UTC'))
+        rows = {row['id']: row for row in table.to_pylist()}
+        self.assertEqual(rows[self.assigned.id]['latitude'], Decimal('40.712776'))
+        self.assertEqual(rows[self.assigned.id]['center'], self.center.id)
+        self.assertEqual(rows[self.unassigned.id]['center'], 0)
+        self.assertNotEqual(rows[self.assigned.id]['month'], rows[self.unassigned.id]['month'])
+        self.assertEqual(rows[self.assigned.id]['created_at'], self.assigned.created_at)
+
+    def test_users_without_personal_data(self):
+        """Test the user table has roles but no names or emails"""
+        self.export()
+        users = pq.read_table(os.path.join(self.directory, 'users.parquet'))
+        self.assertEqual(users.column('role').to_pylist(), ['citizen'])
+        self.assertNotIn('email', users.column_names)
+        self.assertNotIn('username', users.column_names)
+        centers = pq.read_table(os.path.join(self.directory, 'centers.parquet'))
+        self.assertEqual(centers.column('name').to_pylist(), ['Snapshot Center'])
+
+    def test_incremental_runs(self):
+        """Test later runs append only changed reports"""
+        self.export()
+        self.assertEqual(self.export()['reports'], 0)
+
+        self.assigned.status = 'completed'
+        self.assigned.save()
+        result = self.export()
+        self.assertEqual(result['reports'], 1)
+
+        rows = self.reports().to_pylist()
+        self.assertEqual(len(rows), 3)
+        latest = max((row for row in rows if row['id'] == self.assigned.id), key=lambda row: row['updated_at'])
+        self.assertEqual(latest['status'], 'completed')
+
+    def test_settle_delay_and_full_rebuild(self):
+        """Test recent changes wait for the next run and full rebuilds drop history"""
+        result = export_snapshot(self.directory, settle_delay=timedelta(hours=1))
+        self.assertEqual(result['reports'], 0)
+        self.assertIn('reports_cutoff', read_state(self.directory))
+
+        self.export()
+        self.assigned.save()
+        self.export()
+        self.assertEqual(self.reports().num_rows, 3)
+        self.export(full=True)
+        self.assertEqual(self.reports().num_rows, 2)
+
+    def test_failed_full_rebuild_keeps_reports(self):
+        """Test a full rebuild that fails leaves the previous reports in place"""
+        self.export()
+        with patch('core.analytics.write_table', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.export(full=True)
+        self.assertEqual(self.reports().num_rows, 2)
+        self.export(full=True)
+        self.assertEqual(self.reports().num_rows, 2)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['_state.json', 'centers.parquet', 'reports', 'users.parquet'])
+
+    def test_deleted_center(self):
+        """Test reports of a deleted center are written again as unassigned"""
+        self.export()
+        self.center.delete()
+        self.assertEqual(self.export()['reports'], 1)
+        latest = max(
+            (row for row in self.reports().to_pylist() if row['id'] == self.assigned.id),
+            key=lambda row: row['updated_at']
+        )
+        self.assertEqual((latest['center_id'], latest['center']), (None, 0))
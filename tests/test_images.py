@@ -0,0 +1,546 @@
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from accounts.models import User
+from core.blobs import collect_garbage, sweep_untracked
+from core.forms import WasteReportForm
+from core.derivatives import PREVIEW_SIZE, THUMBNAIL_SIZE, generate_derivatives, render_derivatives
+from core.models import ImageBlob, RecyclingCenter, WasteReport
+from core.normalization import ImageNormalizer
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from PIL import Image
+from unittest.mock import patch
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+
+def make_image(size=(2000, 1000), image_format='JPEG', mode='RGB', orientation=None, gps=False, **options):
+    """Encoded test image bytes"""
+    image = Image.new(mode, size, (200, 30, 30, 128)[:len(mode)])
+    output = BytesIO()
+    if orientation or gps:
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        if gps:
+            exif[0x8825] = {1: 'N', 2: (40.0, 42.0, 46.0)}
+        options['exif'] = exif
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+class MediaTestCase(TestCase):
+    """Test case writing uploads to a temporary MEDIA_ROOT"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, DERIVATIVE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+
+    def create_report(self, content=None, name='photo.jpg'):
+        return WasteReport.objects.create(
+            citizen=self.citizen,
+            description='Report with a photo',
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0'),
+            image=SimpleUploadedFile(name, content or make_image(), content_type='image/jpeg')
+        )
+
+
+class DerivativeRenderTest(TestCase):
+    """Test cases for rendering thumbnails and previews"""
+
+    def open(self, data):
+        return Image.open(BytesIO(data))
+
+    def test_sizes(self):
+        """Test the thumbnail is cropped exactly and the preview fits its box"""
+        thumbnail, preview = render_derivatives(BytesIO(make_image((3000, 1500))), 'WEBP')
+        self.assertEqual(self.open(thumbnail).size, THUMBNAIL_SIZE)
+        self.assertEqual(self.open(thumbnail).format, 'WEBP')
+        self.assertEqual(self.open(preview).size, (PREVIEW_SIZE[0], PREVIEW_SIZE[0] // 2))
+
+    def test_exif_orientation_applied(self):
+        """Test rotated phone photos come out upright"""
+        _, preview = render_derivatives(BytesIO(make_image((2000, 1000), orientation=6)), 'JPEG')
+        self.assertEqual(self.open(preview).size, (PREVIEW_SIZE[1] // 2, PREVIEW_SIZE[1]))
+
+    def test_small_images_not_upscaled(self):
+        """Test previews never exceed the original size"""
+        _, preview = render_derivatives(BytesIO(make_image((300, 200))), 'JPEG')
+        self.assertEqual(self.open(preview).size, (300, 200))
+
+    def test_transparency(self):
+        """Test transparent PNGs keep alpha in WebP and are flattened in JPEG"""
+        source = make_image((400, 400), 'PNG', 'RGBA')
+        thumbnail, _ = render_derivatives(BytesIO(source), 'WEBP')
+        self.assertEqual(self.open(thumbnail).mode, 'RGBA')
+        thumbnail, _ = render_derivatives(BytesIO(source), 'JPEG')
+        self.assertEqual(self.open(thumbnail).mode, 'RGB')
+
+
+class DerivativePipelineTest(MediaTestCase):
+    """Test cases for generating derivatives after reports are saved"""
+
+    def test_generated_after_submit(self):
+        """Test submitting a report renders its derivatives once committed"""
+        client = Client()
+        client.login(username='citizen', password='testpass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('submit_report'), {
+                'description': 'Overflowing bin',
+                'latitude': '40.7',
+                'longitude': '-74.0',
+                'image': SimpleUploadedFile('bin.jpg', make_image(), content_type='image/jpeg'),
+            })
+        self.assertEqual(response.status_code, 302)
+
+        report = WasteReport.objects.get()
+        digest = os.path.splitext(os.path.basename(report.image.name))[0]
+        self.assertEqual(report.image_thumbnail.name, f'waste_reports/thumbnails/{digest[:2]}/{digest[2:4]}/{digest}.webp')
+        self.assertTrue(os.path.exists(report.image_preview.path))
+        self.assertEqual(report.thumbnail_url, report.image_thumbnail.url)
+
+        response = client.get(reverse('track_reports'))
+        self.assertContains(response, report.image_thumbnail.url)
+        self.assertNotContains(response, f'src="{report.image.url}"')
+
+    def test_original_used_until_ready(self):
+        """Test templates fall back to the original image"""
+        report = self.create_report()
+        self.assertEqual(report.thumbnail_url, report.image.url)
+        self.assertEqual(report.preview_url, report.image.url)
+
+    def test_replaced_image_regenerates(self):
+        """Test a new image replaces the derivatives, and the old files go with the old image"""
+        with self.captureOnCommitCallbacks(execute=True):
+            report = self.create_report()
+        report.refresh_from_db()
+        old_thumbnail = report.image_thumbnail.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            report.image = SimpleUploadedFile('new.jpg', make_image((800, 800)), content_type='image/jpeg')
+            report.save()
+        report.refresh_from_db()
+        stem = os.path.splitext(os.path.basename(report.image.name))[0]
+        self.assertTrue(report.image_thumbnail.name.endswith(f'/{stem}.webp'))
+        self.assertTrue(os.path.exists(old_thumbnail))
+        collect_garbage(grace_period=timedelta(0))
+        self.assertFalse(os.path.exists(old_thumbnail))
+        self.assertTrue(os.path.exists(report.image_thumbnail.path))
+
+    def test_shared_image_shares_derivatives(self):
+        """Test reports with the same photo reuse one rendered set of derivatives"""
+        content = make_image()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_report(content)
+        with patch('core.derivatives.render_derivatives') as render, self.captureOnCommitCallbacks(execute=True):
+            second = self.create_report(content)
+        render.assert_not_called()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        for field_name in ('image_thumbnail', 'image_preview'):
+            name = getattr(second, field_name).name
+            self.assertEqual(name, getattr(first, field_name).name)
+            self.assertLessEqual(len(name), WasteReport._meta.get_field(field_name).max_length)
+
+        first.delete()
+        self.assertTrue(os.path.exists(second.image_thumbnail.path))
+        second.delete()
+        self.assertEqual(collect_garbage(grace_period=timedelta(0)), 1)
+        self.assertFalse(os.path.exists(second.image_thumbnail.path))
+        self.assertFalse(os.path.exists(second.image_preview.path))
+
+    def test_stale_derivatives_discarded(self):
+        """Test derivatives of an image replaced mid-render are not attached"""
+        report = self.create_report()
+
+        def render_then_replace(source, image_format):
+            WasteReport.objects.filter(pk=report.pk).update(image='waste_reports/replaced.jpg')
+            return render_derivatives(source, image_format)
+
+        with patch('core.derivatives.render_derivatives', render_then_replace):
+            self.assertFalse(generate_derivatives(report.pk))
+        report.refresh_from_db()
+        self.assertFalse(report.image_thumbnail)
+
+    def test_backfill_command(self):
+        """Test the backfill renders derivatives for existing images only once"""
+        report = self.create_report()
+        self.create_report(make_image((10, 10)))
+        out = StringIO()
+        call_command('generate_derivatives', workers=1, stdout=out)
+        self.assertIn('2 of 2', out.getvalue())
+        report.refresh_from_db()
+        self.assertTrue(report.image_thumbnail)
+
+        out = StringIO()
+        call_command('generate_derivatives', workers=1, stdout=out)
+        self.assertIn('already has derivatives', out.getvalue())
+
+
+class ContentAddressedStorageTest(MediaTestCase):
+    """Test cases for deduplicated, reference-counted image storage"""
+
+    def blob(self, report):
+        return ImageBlob.objects.get(name=report.image.name)
+
+    def test_identical_uploads_share_a_file(self):
+        """Test the same photo is stored once under its hash in a sharded path"""
+        content = make_image()
+        first = self.create_report(content, name='first.JPG')
+        second = self.create_report(content, name='second.jpg')
+
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(first.image.name, f'waste_reports/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(self.blob(first).references, 2)
+        with first.image.open('rb') as f:
+            self.assertEqual(f.read(), content)
+
+        other = self.create_report(make_image((100, 100)))
+        self.assertNotEqual(other.image.name, first.image.name)
+        shard = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(shard), [os.path.basename(first.image.name)])
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'waste_reports', '.incoming')), [])
+
+    def test_references_follow_reports(self):
+        """Test replacing and deleting images adjusts the reference counts"""
+        content = make_image()
+        first = self.create_report(content)
+        second = self.create_report(content)
+        name = first.image.name
+
+        second.image = SimpleUploadedFile('other.jpg', make_image((100, 100)), content_type='image/jpeg')
+        second.save()
+        self.assertEqual(ImageBlob.objects.get(name=name).references, 1)
+        self.assertEqual(self.blob(second).references, 1)
+
+        first.delete()
+        self.assertEqual(ImageBlob.objects.get(name=name).references, 0)
+        second.status = 'completed'
+        second.save()
+        self.assertEqual(self.blob(second).references, 1)
+
+    def test_garbage_collection(self):
+        """Test unreferenced files are deleted after the grace period only"""
+        shared = make_image()
+        kept = self.create_report(shared)
+        removed = self.create_report(shared)
+        orphan = self.create_report(make_image((100, 100)))
+        orphan_path = orphan.image.path
+        removed.delete()
+        orphan.delete()
+
+        self.assertEqual(collect_garbage(), 0)
+        self.assertTrue(os.path.exists(orphan_path))
+
+        self.assertEqual(collect_garbage(batch_size=1, grace_period=timedelta(0)), 1)
+        self.assertFalse(os.path.exists(orphan_path))
+        self.assertTrue(os.path.exists(kept.image.path))
+        self.assertEqual(list(ImageBlob.objects.values_list('references', flat=True)), [1])
+
+    def test_recent_upload_survives_collection(self):
+        """Test a file uploaded again during the grace period is not deleted"""
+        content = make_image()
+        report = self.create_report(content)
+        path = report.image.path
+        report.delete()
+        ImageBlob.objects.update(updated_at=report.created_at - timedelta(days=1))
+
+        self.assertEqual(collect_garbage(), 0)
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(ImageBlob.objects.exists())
+
+        again = self.create_report(content)
+        self.assertEqual(self.blob(again).references, 1)
+
+    def test_sweep_untracked(self):
+        """Test files without a reference count are swept, derivatives are not"""
+        with self.captureOnCommitCallbacks(execute=True):
+            report = self.create_report()
+        report.refresh_from_db()
+        stray = self.create_report(make_image((100, 100)))
+        stray_path = stray.image.path
+        ImageBlob.objects.filter(name=stray.image.name).delete()
+        WasteReport.objects.filter(pk=stray.pk).update(image='')
+
+        self.assertEqual(sweep_untracked(), 0)
+        self.assertEqual(sweep_untracked(grace_period=timedelta(0)), 1)
+        self.assertFalse(os.path.exists(stray_path))
+        for field in (report.image, report.image_thumbnail, report.image_preview):
+            self.assertTrue(os.path.exists(field.path))
+
+    def test_collect_command(self):
+        """Test the command rebuilds counts and collects images"""
+        report = self.create_report()
+        path = report.image.path
+        WasteReport.objects.filter(pk=report.pk).delete()
+        ImageBlob.objects.update(references=5)
+
+        out = StringIO()
+        call_command('collect_images', rebuild=True, grace_minutes=0, stdout=out)
+        self.assertIn('Deleted 1 unreferenced images', out.getvalue())
+        self.assertFalse(os.path.exists(path))
+
+
+class ImageNormalizationTest(MediaTestCase):
+    """Test cases for normalizing uploads before they are stored"""
+
+    def upload(self, content, name='photo.jpg'):
+        return SimpleUploadedFile(name, content, content_type='image/jpeg')
+
+    def test_large_photo_normalized(self):
+        """Test uploads are oriented, stripped of metadata, downscaled and smaller"""
+        content = make_image((4000, 3000), orientation=6, gps=True, quality=100)
+        normalizer = ImageNormalizer(max_edge=1024, quality=80)
+        with self.assertLogs('core.normalization', 'INFO') as logs:
+            result = normalizer.normalize(self.upload(content, 'IMG_0001.JPEG'))
+
+        self.assertEqual(result.name, 'IMG_0001.jpg')
+        self.assertLess(result.size, len(content))
+        self.assertEqual(logs.records[0].bytes_saved, len(content) - result.size)
+        with Image.open(result) as image:
+            self.assertEqual(image.size, (768, 1024))
+            self.assertEqual(dict(image.getexif()), {})
+            self.assertNotIn('exif', image.info)
+
+    def test_clean_small_photo_kept(self):
+        """Test an upload that needs no change is not re-encoded larger"""
+        output = BytesIO()
+        Image.effect_noise((400, 300), 64).convert('RGB').save(output, 'JPEG', quality=30)
+        upload = self.upload(output.getvalue())
+        self.assertIs(ImageNormalizer(quality=95).normalize(upload), upload)
+
+    def test_transparency_kept_as_png(self):
+        """Test images with alpha are stored as PNG"""
+        result = ImageNormalizer(max_edge=100).normalize(
+            self.upload(make_image((400, 400), 'PNG', 'RGBA'), 'logo.png')
+        )
+        self.assertEqual(result.name, 'logo.png')
+        with Image.open(result) as image:
+            self.assertEqual((image.format, image.mode, image.size), ('PNG', 'RGBA', (100, 100)))
+
+    def form(self, content, **kwargs):
+        return WasteReportForm(
+            {'description': 'Bin', 'latitude': '40.7', 'longitude': '-74.0'},
+            {'image': self.upload(content)},
+            **kwargs
+        )
+
+    @override_settings(IMAGE_NORMALIZATION={'MAX_EDGE': 800, 'QUALITY': 70})
+    def test_form_uses_settings(self):
+        """Test the report form normalizes uploads as configured"""
+        form = self.form(make_image((3000, 1500), gps=True))
+        self.assertTrue(form.is_valid())
+        form.instance.citizen = self.citizen
+        report = form.save()
+        with report.image.open('rb') as f, Image.open(f) as image:
+            self.assertEqual(image.size, (800, 400))
+            self.assertNotIn('exif', image.info)
+
+    @override_settings(IMAGE_NORMALIZATION=None)
+    def test_normalization_disabled(self):
+        """Test uploads are stored unchanged when normalization is off"""
+        content = make_image((3000, 1500), gps=True)
+        form = self.form(content)
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['image'].size, len(content))
+
+        form = self.form(content, normalizer=ImageNormalizer(max_edge=500))
+        self.assertTrue(form.is_valid())
+        self.assertLess(form.cleaned_data['image'].size, len(content))
+
+
+class UploadLimitTest(MediaTestCase):
+    """Test cases for the upload size advertised to and enforced on the submit page"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.login(username='citizen', password='testpass123')
+
+    @override_settings(MAX_UPLOAD_SIZE=5 * 1024 * 1024, IMAGE_NORMALIZATION={'MAX_EDGE': 1600, 'QUALITY': 80})
+    def test_limits_advertised(self):
+        """Test the submit page tells the browser how far to shrink photos"""
+        response = self.client.get(reverse('submit_report'))
+        self.assertContains(response, 'data-max-bytes="5242880"')
+        self.assertContains(response, 'data-max-edge="1600"')
+        self.assertContains(response, 'data-quality="0.8"')
+
+    @override_settings(MAX_UPLOAD_SIZE=10000)
+    def test_oversized_body_rejected(self):
+        """Test bodies over the limit are refused before the view runs"""
+        response = self.client.post(reverse('submit_report'), {
+            'description': 'Huge photo',
+            'latitude': '40.7',
+            'longitude': '-74.0',
+            'image': SimpleUploadedFile('big.jpg', make_image((1000, 1000), quality=100), content_type='image/jpeg'),
+        })
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(WasteReport.objects.exists())
+
+        response = self.client.post(reverse('submit_report'), {'description': 'Small'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_oversized_image_invalid(self):
+        """Test the form rejects photos over the limit"""
+        content = make_image((500, 500))
+        with self.settings(MAX_UPLOAD_SIZE=len(content) - 1):
+            form = WasteReportForm(
+                {'description': 'Bin', 'latitude': '40.7', 'longitude': '-74.0'},
+                {'image': SimpleUploadedFile('photo.jpg', content, content_type='image/jpeg')},
+            )
+            self.assertFalse(form.is_valid())
+        self.assertIn('too large', form.errors['image'][0])
+
+
+class MediaServingTest(MediaTestCase):
+    """Test cases for serving report media after a permission check"""
+
+    def setUp(self):
+        super().setUp()
+        self.content = make_image((600, 400))
+        self.report = self.create_report(self.content)
+        self.url = self.report.image.url
+        self.client = Client()
+        self.client.login(username='citizen', password='testpass123')
+
+    def login(self, username, role):
+        user = User.objects.create_user(
+            username=username, email=f'{username}@test.com', password='testpass123', role=role
+        )
+        client = Client()
+        client.login(username=username, password='testpass123')
+        return user, client
+
+    def test_permissions(self):
+        """Test only the reporter, the center's staff and admins get the image"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertTrue(response['ETag'])
+
+        self.assertEqual(Client().get(self.url).status_code, 404)
+        _, other = self.login('other', 'citizen')
+        self.assertEqual(other.get(self.url).status_code, 404)
+        staff, staff_client = self.login('staff', 'staff')
+        self.assertEqual(staff_client.get(self.url).status_code, 404)
+        self.report.center = RecyclingCenter.objects.create(
+            name='Media Center', address='1 Media St', latitude=Decimal('40.7'), longitude=Decimal('-74.0'),
+            materials_accepted='All', working_hours='24/7', assigned_staff=staff
+        )
+        self.report.save()
+        self.assertEqual(staff_client.get(self.url).status_code, 200)
+        _, admin = self.login('admin', 'admin')
+        self.assertEqual(admin.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get('/media/waste_reports/missing.jpg').status_code, 404)
+
+    def test_derivatives_served(self):
+        """Test thumbnails and previews are served like the original"""
+        generate_derivatives(self.report.pk)
+        self.report.refresh_from_db()
+        response = self.client.get(self.report.thumbnail_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+
+    def test_ranges(self):
+        """Test single byte ranges, suffix ranges and unsatisfiable ranges"""
+        size = len(self.content)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{size}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={size - 3}-')
+        self.assertEqual(response['Content-Length'], '3')
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-1,5-6').status_code, 200)
+
+    async def test_asgi_streaming(self):
+        """Test whole files and ranges are read chunk by chunk under ASGI"""
+        await sync_to_async(self.async_client.force_login)(self.citizen)
+        response = await self.async_client.get(self.url)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response]), self.content)
+
+        response = await self.async_client.get(self.url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response]), self.content[10:20])
+
+    def test_conditional_requests(self):
+        """Test ETag revalidation and If-Range"""
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_front_server_handoff(self):
+        """Test X-Accel-Redirect and X-Sendfile responses carry no body"""
+        with self.settings(MEDIA_SENDFILE_BACKEND='nginx', MEDIA_ACCEL_PREFIX='/internal/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/internal/' + self.report.image.name)
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        with self.settings(MEDIA_SENDFILE_BACKEND='sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.report.image.path)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+
+
+class BatchImageTest(MediaTestCase):
+    """Test cases for images sent through the batch report endpoint"""
+
+    def test_batch_images(self):
+        """Test base64 images are normalized, stored, counted and get derivatives"""
+        client = Client()
+        client.login(username='citizen', password='testpass123')
+        content = base64.b64encode(make_image((3000, 1500), gps=True)).decode()
+        items = [
+            {'description': 'With photo', 'latitude': '40.7', 'longitude': '-74.0', 'image': content},
+            {'description': 'Same photo', 'latitude': '40.7', 'longitude': '-74.0', 'image': content,
+             'image_name': 'dup.jpg'},
+            {'description': 'Broken', 'latitude': '40.7', 'longitude': '-74.0', 'image': 'not base64!'},
+            {'description': 'Not an image', 'latitude': '40.7', 'longitude': '-74.0',
+             'image': base64.b64encode(b'hello').decode()},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('batch_reports_api'), json.dumps(items), content_type='application/json')
+        data = response.json()
+        self.assertEqual((data['created'], data['invalid']), (2, 2))
+        self.assertIn('image', data['results'][3]['errors'])
+
+        first, second = WasteReport.objects.order_by('id')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(ImageBlob.objects.get(name=first.image.name).references, 2)
+        self.assertTrue(first.image_thumbnail)
+        with first.image.open('rb') as f, Image.open(f) as image:
+            self.assertEqual(max(image.size), 2560)
+            self.assertNotIn('exif', image.info)
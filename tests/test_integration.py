@@ -3,6 +3,7 @@ from django.urls import reverse
 from accounts.models import User
 from core.models import RecyclingCenter
 from decimal import Decimal
+from unittest.mock import patch
 
 
 class MapIntegrationTest(TestCase):
@@ -43,13 +44,69 @@ class MapIntegrationTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'citizen/map_centers.html')
     
-    def test_map_centers_contains_data(self):
-        """Test that map centers page contains center data"""
+    def test_map_centers_page_is_data_free_shell(self):
+        """Test that the map page carries no center data and is cacheable"""
         response = self.client.get(reverse('map_centers'))
-        self.assertContains(response, 'Center 1')
-        self.assertContains(response, 'Center 2')
-        self.assertContains(response, '40.712776')
-        self.assertContains(response, '-74.005974')
+        self.assertNotContains(response, 'Center 1')
+        self.assertContains(response, reverse('map_centers_api'))
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+    
+    def test_map_centers_api_contains_data(self):
+        """Test that the map data endpoint returns the visible centers"""
+        response = self.client.get(reverse('map_centers_api'), {
+            'south': '40', 'west': '-75', 'north': '41', 'east': '-73', 'zoom': '10'
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['type'], 'centers')
+        names = {center['name'] for center in data['centers']}
+        self.assertEqual(names, {'Center 1', 'Center 2'})
+        latitudes = {center['latitude'] for center in data['centers']}
+        self.assertIn(40.712776, latitudes)
+    
+    def test_map_centers_api_excludes_outside_viewport(self):
+        """Test that centers outside the viewport are not returned"""
+        response = self.client.get(reverse('map_centers_api'), {
+            'south': '40.72', 'west': '-74', 'north': '41', 'east': '-73.9', 'zoom': '12'
+        })
+        names = [center['name'] for center in response.json()['centers']]
+        self.assertEqual(names, ['Center 2'])
+    
+    def test_map_centers_api_antimeridian(self):
+        """Test viewports crossing the antimeridian"""
+        RecyclingCenter.objects.create(
+            name='Fiji Center',
+            address='1 Suva Rd',
+            latitude=Decimal('-18.1248'),
+            longitude=Decimal('178.4501'),
+            materials_accepted='Plastic',
+            working_hours='24/7'
+        )
+        response = self.client.get(reverse('map_centers_api'), {
+            'south': '-30', 'west': '170', 'north': '0', 'east': '-170', 'zoom': '4'
+        })
+        names = [center['name'] for center in response.json()['centers']]
+        self.assertEqual(names, ['Fiji Center'])
+    
+    def test_map_centers_api_clusters_when_crowded(self):
+        """Test that crowded low-zoom viewports return grid clusters"""
+        with patch('core.views.MAP_MAX_MARKERS', 1):
+            response = self.client.get(reverse('map_centers_api'), {
+                'south': '-90', 'west': '-180', 'north': '90', 'east': '180', 'zoom': '2'
+            })
+        data = response.json()
+        self.assertEqual(data['type'], 'clusters')
+        self.assertEqual(sum(c['count'] for c in data['clusters']), 2)
+    
+    def test_map_centers_api_invalid_viewport(self):
+        """Test that malformed viewports are rejected"""
+        response = self.client.get(reverse('map_centers_api'), {'south': '10', 'zoom': '3'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('map_centers_api'), {
+            'south': '50', 'west': '0', 'north': '10', 'east': '1', 'zoom': '3'
+        })
+        self.assertEqual(response.status_code, 400)
     
     def test_map_contains_leaflet(self):
         """Test that Leaflet.js is loaded on map page"""
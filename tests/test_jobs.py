@@ -0,0 +1,122 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from core import jobs
+from core.derivatives import schedule_derivatives
+from core.models import Job
+from datetime import timedelta
+from io import StringIO
+
+
+CALLS = []
+
+
+@jobs.task('tests.record')
+def record(value):
+    CALLS.append(value)
+
+
+@jobs.task('tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+class JobQueueTest(TestCase):
+    """Test cases for the database job queue"""
+
+    def setUp(self):
+        CALLS.clear()
+
+    def test_enqueue_and_run(self):
+        """Test a queued job runs with its payload and is removed"""
+        job = jobs.enqueue('tests.record', value=42)
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(CALLS, [42])
+        self.assertFalse(Job.objects.exists())
+
+    def test_unknown_task(self):
+        """Test only registered tasks can be queued"""
+        with self.assertRaises(ValueError):
+            jobs.enqueue('tests.missing')
+
+    def test_delayed_job_waits(self):
+        """Test jobs are not claimed before they are due"""
+        jobs.enqueue('tests.record', delay=timedelta(minutes=1), value=1)
+        self.assertEqual(jobs.claim(), [])
+
+    def test_claims_are_exclusive(self):
+        """Test a claimed job is not handed out again until its visibility timeout passes"""
+        job = jobs.enqueue('tests.record', value=1)
+        [(job_id, token)] = jobs.claim()
+        self.assertEqual(job_id, job.id)
+        self.assertEqual(jobs.claim(), [])
+
+        # The worker stopped responding; another one takes over
+        Job.objects.filter(id=job_id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        [(_, new_token)] = jobs.claim()
+        self.assertNotEqual(new_token, token)
+
+        # The original worker's outcome no longer counts
+        self.assertFalse(jobs.run_job(job_id, token))
+        self.assertEqual(CALLS, [])
+        self.assertTrue(jobs.run_job(job_id, new_token))
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_retries_with_backoff(self):
+        """Test failures are retried later and kept once attempts run out"""
+        job = jobs.enqueue('tests.explode')
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreaterEqual(job.run_at, timezone.now() + jobs.BACKOFF_BASE / 2 - timedelta(seconds=1))
+        self.assertEqual(jobs.claim(), [])
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR') as logs:
+            jobs.run_pending()
+        self.assertIn('failed permanently', logs.output[-1])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        Job.objects.update(run_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(jobs.claim(), [])
+
+    def test_backoff_grows(self):
+        """Test retry delays grow exponentially up to the maximum"""
+        self.assertLessEqual(jobs.backoff(1), jobs.BACKOFF_BASE)
+        self.assertGreaterEqual(jobs.backoff(4), jobs.BACKOFF_BASE * 4)
+        self.assertLessEqual(jobs.backoff(30), jobs.BACKOFF_MAX)
+
+    def test_timed_out_last_attempt_fails(self):
+        """Test a job whose last attempt timed out is failed rather than run again"""
+        jobs.enqueue('tests.record', value=1)
+        Job.objects.update(status='running', attempts=5, locked_until=timezone.now() - timedelta(seconds=1))
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), 0)
+        self.assertEqual(Job.objects.get().status, 'failed')
+        self.assertEqual(CALLS, [])
+
+    def test_run_workers_command(self):
+        """Test the command drains the queue in burst mode"""
+        for value in range(3):
+            jobs.enqueue('tests.record', value=value)
+        jobs.enqueue('tests.explode')
+        out = StringIO()
+        with self.assertLogs('core.jobs', 'ERROR'):
+            call_command('run_workers', processes=0, burst=True, stdout=out)
+        self.assertIn('Ran 4 jobs (1 failed)', out.getvalue())
+        self.assertEqual(sorted(CALLS), [0, 1, 2])
+
+        with self.assertRaises(CommandError):
+            call_command('run_workers', processes=-1, stdout=StringIO())
+
+    @override_settings(USE_JOB_QUEUE=True)
+    def test_derivatives_deferred(self):
+        """Test report image derivatives are queued when the job queue is enabled"""
+        schedule_derivatives(7)
+        job = Job.objects.get()
+        self.assertEqual((job.task, job.payload), ('generate_derivatives', {'report_id': 7}))
+        self.assertEqual(jobs.run_pending(), 1)
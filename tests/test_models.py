@@ -1,7 +1,19 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.utils import timezone
 from accounts.models import User
-from core.models import RecyclingCenter, WasteReport
+from core.counters import get_counts, verify_counts
+from core.models import ImageBlob, RecyclingCenter, ReportCounter, WasteReport
+from core.search import SEARCH_ORDERING, fts_available, match_expression, search_reports
+from core.upsert import add_to_count
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+import unittest
 
 
 class UserModelTest(TestCase):
@@ -166,3 +178,242 @@ class WasteReportModelTest(TestCase):
         report_id = self.report.id
         self.citizen.delete()
         self.assertFalse(WasteReport.objects.filter(id=report_id).exists())
+
+
+class ReportCounterTest(TestCase):
+    """Test cases for the materialized report counters"""
+    
+    def setUp(self):
+        """Set up citizens, centers and reports"""
+        self.citizen = User.objects.create_user(
+            username='countcitizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.other_citizen = User.objects.create_user(
+            username='othercitizen',
+            email='other@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.center = RecyclingCenter.objects.create(
+            name='Count Center',
+            address='1 Count St',
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0'),
+            materials_accepted='All',
+            working_hours='24/7'
+        )
+        self.other_center = RecyclingCenter.objects.create(
+            name='Other Center',
+            address='2 Count St',
+            latitude=Decimal('41.7'),
+            longitude=Decimal('-74.0'),
+            materials_accepted='All',
+            working_hours='24/7'
+        )
+        self.report = self.create_report(self.citizen, self.center)
+        self.create_report(self.citizen, self.center, status='completed')
+        self.create_report(self.other_citizen, None)
+    
+    def create_report(self, citizen, center, status='pending'):
+        return WasteReport.objects.create(
+            citizen=citizen,
+            center=center,
+            description='Counted report',
+            latitude=Decimal('40.71'),
+            longitude=Decimal('-74.01'),
+            status=status
+        )
+    
+    def assertCountersExact(self):
+        self.assertEqual(verify_counts(), {})
+    
+    def test_counts_on_create(self):
+        """Test counters reflect newly created reports"""
+        self.assertEqual(get_counts('global'), {'pending': 2, 'in_progress': 0, 'completed': 1, 'total': 3})
+        self.assertEqual(get_counts('citizen', self.citizen.id)['total'], 2)
+        self.assertEqual(get_counts('center', self.center.id)['completed'], 1)
+        self.assertEqual(get_counts('center', 0)['pending'], 1)
+        self.assertCountersExact()
+    
+    def test_status_change(self):
+        """Test moving a report between statuses"""
+        report = WasteReport.objects.get(pk=self.report.pk)
+        report.status = 'in_progress'
+        report.save()
+        report.status = 'completed'
+        report.save()
+        self.assertEqual(get_counts('citizen', self.citizen.id)['completed'], 2)
+        self.assertEqual(get_counts('global')['pending'], 1)
+        self.assertCountersExact()
+    
+    def test_center_reassignment(self):
+        """Test moving a report between centers"""
+        report = WasteReport.objects.get(pk=self.report.pk)
+        report.center = self.other_center
+        report.save()
+        self.assertEqual(get_counts('center', self.center.id)['pending'], 0)
+        self.assertEqual(get_counts('center', self.other_center.id)['pending'], 1)
+        self.assertCountersExact()
+    
+    def test_stale_instances(self):
+        """Test two copies loaded before either was saved move the report once each"""
+        first = WasteReport.objects.get(pk=self.report.pk)
+        second = WasteReport.objects.get(pk=self.report.pk)
+        first.status = 'in_progress'
+        first.save()
+        second.status = 'completed'
+        second.save()
+        self.assertEqual(get_counts('global'), {'pending': 1, 'in_progress': 0, 'completed': 2, 'total': 3})
+        self.assertCountersExact()
+        
+        # A save leaving the status out does not count the stale status as a change
+        first.description = 'Edited'
+        first.save(update_fields=['description'])
+        self.assertEqual(get_counts('global')['completed'], 2)
+        self.assertCountersExact()
+    
+    def test_save_without_loaded_values(self):
+        """Test updating an instance that was not loaded from the database"""
+        report = WasteReport.objects.filter(pk=self.report.pk).values()[0]
+        report['status'] = 'completed'
+        WasteReport(**report).save()
+        self.assertCountersExact()
+    
+    def test_report_delete(self):
+        """Test deleting a report decrements its counters"""
+        self.report.delete()
+        self.assertEqual(get_counts('global')['pending'], 1)
+        self.assertCountersExact()
+    
+    def test_center_delete(self):
+        """Test reports of a deleted center are counted as unassigned"""
+        self.center.delete()
+        self.assertEqual(get_counts('center', 0)['total'], 3)
+        self.assertCountersExact()
+    
+    def test_citizen_delete(self):
+        """Test cascaded report deletion keeps the counters exact"""
+        self.citizen.delete()
+        self.assertEqual(get_counts('global')['total'], 1)
+        self.assertFalse(ReportCounter.objects.filter(scope='citizen', key=self.citizen.id).exists())
+        self.assertCountersExact()
+    
+    def test_rebuild_counters_command(self):
+        """Test the management command repairs drifted counters"""
+        WasteReport.objects.filter(pk=self.report.pk).update(status='completed')
+        self.assertNotEqual(verify_counts(), {})
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', '--verify-only', stdout=StringIO())
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertCountersExact()
+        self.assertEqual(get_counts('global')['completed'], 2)
+
+
+class AddToCountTest(TestCase):
+    """Test cases for the shared counter row upsert"""
+    
+    def test_create_then_increment(self):
+        """Test the first delta creates the row and later ones add to it"""
+        lookup = {'scope': 'global', 'key': 0, 'status': 'pending'}
+        add_to_count(ReportCounter, lookup, 'count', 2)
+        add_to_count(ReportCounter, lookup, 'count', -1)
+        self.assertEqual(ReportCounter.objects.get(**lookup).count, 1)
+    
+    def test_extra_updates(self):
+        """Test extra values are written when an existing row changes"""
+        blob = ImageBlob.objects.create(name='reports/a.jpg', references=1)
+        stamp = timezone.now() - timedelta(days=1)
+        add_to_count(ImageBlob, {'name': blob.name}, 'references', 1, updated_at=stamp)
+        blob.refresh_from_db()
+        self.assertEqual((blob.references, blob.updated_at), (2, stamp))
+    
+    def test_lost_insert_race(self):
+        """Test a writer that loses the race to create the row adds to the winner's"""
+        lookup = {'scope': 'global', 'key': 0, 'status': 'pending'}
+        ReportCounter.objects.create(count=5, **lookup)
+        update = QuerySet.update
+        calls = []
+        
+        def update_after_race(queryset, **values):
+            # The first update runs before the other writer's row exists
+            calls.append(values)
+            return 0 if len(calls) == 1 else update(queryset, **values)
+        
+        with transaction.atomic():
+            with patch.object(QuerySet, 'update', autospec=True, side_effect=update_after_race):
+                add_to_count(ReportCounter, lookup, 'count', 3)
+            # The failed insert did not break the surrounding transaction
+            self.assertEqual(ReportCounter.objects.get(**lookup).count, 8)
+        self.assertEqual(len(calls), 2)
+
+
+class ReportSearchTest(TestCase):
+    """Test cases for the full-text report search index"""
+    
+    def setUp(self):
+        """Set up a citizen and reports"""
+        if not fts_available():
+            raise unittest.SkipTest('FTS5 search index not available')
+        self.citizen = User.objects.create_user(
+            username='searchcitizen',
+            email='search@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.bottles = self.create_report('Plastic bottles scattered in the park')
+        self.glass = self.create_report('Broken glass near the bus stop')
+        self.mixed = self.create_report('Plastic bags and plastic bottles everywhere, plastic plastic')
+    
+    def create_report(self, description):
+        return WasteReport.objects.create(
+            citizen=self.citizen,
+            description=description,
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0')
+        )
+    
+    def search(self, query):
+        return list(search_reports(WasteReport.objects.all(), query).order_by(*SEARCH_ORDERING))
+    
+    def test_prefix_and_ranking(self):
+        """Test words match as prefixes and better matches rank first"""
+        self.assertEqual(self.search('plast'), [self.mixed, self.bottles])
+        self.assertEqual(self.search('bro gla'), [self.glass])
+        self.assertEqual(self.search('plastic glass'), [])
+    
+    def test_search_by_username(self):
+        """Test reports are found by the citizen's username"""
+        self.assertEqual(len(self.search('searchcit')), 3)
+    
+    def test_index_follows_writes(self):
+        """Test edits, bulk inserts, renames and deletes update the index"""
+        self.glass.description = 'Old tyres dumped by the river'
+        self.glass.save()
+        self.assertEqual(self.search('glass'), [])
+        self.assertEqual(self.search('tyres'), [self.glass])
+        
+        WasteReport.objects.bulk_create([WasteReport(
+            citizen=self.citizen,
+            description='Cardboard boxes left outside',
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0')
+        )])
+        self.assertEqual(len(self.search('cardboard')), 1)
+        
+        self.citizen.username = 'renamedcitizen'
+        self.citizen.save()
+        self.assertEqual(len(self.search('renamed')), 4)
+        self.assertEqual(self.search('searchcitizen'), [])
+        
+        self.bottles.delete()
+        self.assertEqual(self.search('plastic'), [self.mixed])
+    
+    def test_query_syntax_is_escaped(self):
+        """Test FTS5 operators in user input are matched as plain words"""
+        self.assertEqual(match_expression('glass OR "bus'), '"glass"* "OR"* "bus"*')
+        self.assertIsNone(match_expression('"*()'))
+        self.assertEqual(self.search('description:glass NEAR('), [])
+        self.assertEqual(self.search('"*()'), [])
@@ -0,0 +1,140 @@
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import User
+from core.dedupe import open_reports_in
+from core.geohash import cells_within
+from core.models import RecyclingCenter, WasteReport
+from decimal import Decimal
+from urllib.parse import parse_qs
+import os
+import re
+import tempfile
+import unittest
+
+
+# Tables that grow with usage; list and dashboard queries must not scan them
+HOT_TABLES = ('core_wastereport', 'accounts_user')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTest(TestCase):
+    """Check the hot list and dashboard queries are served by indexes"""
+    
+    def setUp(self):
+        """Set up users, a center and reports"""
+        self.client = Client()
+        self.citizen = User.objects.create_user(username='citizen', email='citizen@test.com', password='pass123', role='citizen')
+        self.staff = User.objects.create_user(username='staff', email='staff@test.com', password='pass123', role='staff')
+        self.admin = User.objects.create_user(username='admin', email='admin@test.com', password='pass123', role='admin')
+        self.center = RecyclingCenter.objects.create(
+            name='Test Center',
+            address='123 Test St',
+            latitude=Decimal('40.712776'),
+            longitude=Decimal('-74.005974'),
+            materials_accepted='Plastic',
+            working_hours='24/7',
+            assigned_staff=self.staff
+        )
+        for status in ('pending', 'in_progress', 'completed'):
+            WasteReport.objects.create(
+                citizen=self.citizen,
+                description=f'{status} report',
+                latitude=Decimal('40.7'),
+                longitude=Decimal('-74.0'),
+                status=status,
+                center=self.center
+            )
+    
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+    
+    def assertIndexedQueries(self, user, url, params=None):
+        """Fetch a page and check no query on a hot table scans it or sorts it"""
+        self.client.login(username=user.username, password='pass123')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        
+        checked = 0
+        for query in context.captured_queries:
+            sql = query['sql']
+            table = re.search(r'FROM "(\w+)"', sql)
+            if not sql.startswith('SELECT') or not table or table.group(1) not in HOT_TABLES:
+                continue
+            checked += 1
+            for line in self.query_plan(sql):
+                self.assertNotRegex(line, r'^SCAN \w+$', f'Full table scan for {url}: {sql}')
+                self.assertFalse(
+                    line.startswith('USE TEMP B-TREE') and 'ORDER BY' in line,
+                    f'Unindexed sort for {url}: {sql}'
+                )
+        self.assertGreater(checked, 0)
+        return response
+    
+    def assertIndexedPages(self, user, url, context_name, params=None):
+        """Check the first page and the pages reached by its cursors"""
+        params = dict(params or {}, page_size=1)
+        response = self.assertIndexedQueries(user, url, params)
+        page = response.context[context_name]
+        self.assertIsNotNone(page.next_query)
+        response = self.assertIndexedQueries(user, url, parse_qs(page.next_query))
+        self.assertIndexedQueries(user, url, parse_qs(response.context[context_name].previous_query))
+    
+    def test_citizen_dashboard(self):
+        """Test the citizen's recent reports use the citizen index"""
+        self.assertIndexedQueries(self.citizen, reverse('citizen_dashboard'))
+    
+    def test_track_reports(self):
+        """Test the citizen's report list uses the citizen index"""
+        self.assertIndexedPages(self.citizen, reverse('track_reports'), 'reports')
+    
+    def test_staff_dashboard(self):
+        """Test the center's recent reports use the center index"""
+        self.assertIndexedQueries(self.staff, reverse('staff_dashboard'))
+    
+    def test_view_reports(self):
+        """Test the center's report list, with and without a status filter"""
+        self.assertIndexedPages(self.staff, reverse('view_reports'), 'reports')
+        self.assertIndexedQueries(self.staff, reverse('view_reports'), {'status': 'pending'})
+    
+    def test_admin_dashboard(self):
+        """Test the admin dashboard counts and recent reports"""
+        self.assertIndexedQueries(self.admin, reverse('admin_dashboard'))
+    
+    def test_manage_reports(self):
+        """Test the report list, with and without a status filter"""
+        self.assertIndexedPages(self.admin, reverse('manage_reports'), 'reports')
+        self.assertIndexedQueries(self.admin, reverse('manage_reports'), {'status': 'completed'})
+    
+    def test_manage_users(self):
+        """Test the user list, with and without a role filter"""
+        self.assertIndexedPages(self.admin, reverse('manage_users'), 'users')
+        User.objects.create_user(username='citizen2', email='citizen2@test.com', password='pass123', role='citizen')
+        self.assertIndexedPages(self.admin, reverse('manage_users'), 'users', {'role': 'citizen'})
+    
+    def test_serve_media(self):
+        """Test media requests find the report by file name through an index"""
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            os.makedirs(os.path.join(media_root, 'waste_reports'))
+            with open(os.path.join(media_root, 'waste_reports', 'photo.jpg'), 'wb') as f:
+                f.write(b'jpeg')
+            WasteReport.objects.filter(status='pending').update(image='waste_reports/photo.jpg')
+            url = reverse('serve_media', args=['waste_reports/photo.jpg'])
+            for user in (self.citizen, self.staff, self.admin):
+                self.assertIndexedQueries(user, url)
+    
+    def test_duplicate_check(self):
+        """Test the near-duplicate check seeks the geohash index instead of scanning reports"""
+        cells = cells_within(40.7, -74.0, 50)
+        sql, params = open_reports_in(cells, timezone.now()).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(any('report_geohash_idx' in line for line in plan), plan)
+        for line in plan:
+            self.assertNotRegex(line, r'^SCAN \w+$')
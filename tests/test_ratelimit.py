@@ -0,0 +1,125 @@
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http.multipartparser import MultiPartParser
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from accounts.models import User
+from core.models import WasteReport
+from core.ratelimit import LocalBuckets, Rate, take
+from unittest import mock
+
+
+class TokenBucketTest(TestCase):
+    """Test cases for the token bucket arithmetic"""
+
+    def test_parse(self):
+        """Test rates are parsed from count/period strings"""
+        rate = Rate.parse('100/5m')
+        self.assertEqual((rate.capacity, rate.period), (100, 300))
+        self.assertEqual(Rate.parse('3/h').period, 3600)
+        for value in ('10', 'x/m', '10/w', '0/s'):
+            with self.assertRaises(ValueError):
+                Rate.parse(value)
+
+    def test_burst_then_refill(self):
+        """Test a full bucket allows a burst, then one request per refill interval"""
+        rate = Rate.parse('3/m')
+        state = None
+        for _ in range(3):
+            state, wait = take(state, rate, 0)
+            self.assertEqual(wait, 0)
+        state, wait = take(state, rate, 0)
+        self.assertAlmostEqual(wait, 20)
+        state, wait = take(state, rate, 19)
+        self.assertAlmostEqual(wait, 1)
+        self.assertEqual(take(state, rate, 20)[1], 0)
+
+    def test_local_buckets_are_bounded(self):
+        """Test the least recently used buckets are evicted past the limit"""
+        buckets = LocalBuckets(max_keys=2)
+        rate = Rate.parse('1/h')
+        buckets.take('a', rate)
+        buckets.take('b', rate)
+        self.assertGreater(buckets.take('a', rate), 0)
+        buckets.take('c', rate)
+        self.assertEqual(list(buckets.buckets), ['a', 'c'])
+
+
+@override_settings(RATE_LIMITS={'login': '2/m', 'submit_report': '1/h'}, RATE_LIMIT_CACHE=None)
+class RateLimitMiddlewareTest(TestCase):
+    """Test cases for the rate limiting middleware"""
+
+    def setUp(self):
+        """Set up a client and two citizens"""
+        self.client = Client()
+        for username in ('citizen', 'other'):
+            User.objects.create_user(
+                username=username,
+                email=f'{username}@test.com',
+                password='testpass123',
+                role='citizen'
+            )
+
+    def login(self, client=None, **extra):
+        return (client or self.client).post(
+            reverse('login'), {'username': 'citizen', 'password': 'wrong'}, **extra
+        )
+
+    def submit(self, client):
+        return client.post(reverse('submit_report'), {
+            'description': 'Overflowing bin',
+            'latitude': '40.712776',
+            'longitude': '-74.005974',
+        })
+
+    def test_refused_before_the_view(self):
+        """Test requests over the limit get a 429 without authenticating or querying"""
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login().status_code, 200)
+        with mock.patch('accounts.views.authenticate') as authenticate, self.assertNumQueries(0):
+            response = self.login()
+        authenticate.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 30)
+
+    def test_body_not_parsed_when_refused(self):
+        """Test a refused upload is never parsed, even with CSRF checks on"""
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='citizen', password='testpass123')
+        self.assertEqual(self.submit(client).status_code, 403)
+        photo = SimpleUploadedFile('photo.jpg', b'x' * 1024, content_type='image/jpeg')
+        with mock.patch.object(MultiPartParser, 'parse') as parse:
+            response = client.post(reverse('submit_report'), {'description': 'Bins', 'image': photo})
+        self.assertEqual(response.status_code, 429)
+        parse.assert_not_called()
+
+    def test_keys(self):
+        """Test addresses and users have separate buckets and safe methods are not limited"""
+        self.login()
+        self.login()
+        self.assertEqual(self.login().status_code, 429)
+        self.assertEqual(self.client.get(reverse('login')).status_code, 200)
+        self.assertEqual(self.login(REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+        first, second = Client(), Client()
+        first.login(username='citizen', password='testpass123')
+        second.login(username='other', password='testpass123')
+        self.assertEqual(self.submit(first).status_code, 302)
+        self.assertEqual(self.submit(first).status_code, 429)
+        self.assertEqual(self.submit(second).status_code, 302)
+        self.assertEqual(WasteReport.objects.filter(citizen__username='citizen').count(), 1)
+
+    @override_settings(RATE_LIMIT_CACHE='default')
+    def test_shared_buckets(self):
+        """Test buckets in the cache are shared by separately loaded middleware"""
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.login(Client())
+        self.login(Client())
+        self.assertEqual(self.login(Client()).status_code, 429)
+
+    @override_settings(RATE_LIMITS={})
+    def test_disabled(self):
+        """Test no limits are applied without RATE_LIMITS"""
+        for _ in range(5):
+            self.assertEqual(self.login().status_code, 200)
@@ -0,0 +1,175 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, Client, override_settings
+from django.urls import reverse
+from accounts.models import User
+from core import replica
+from core.models import RecyclingCenter, WasteReport
+from core.replica import PIN_KEY, ReplicaRouter, copy_database, reading_from_replica, replica_reads
+from core.streaming import stream_for
+from decimal import Decimal
+from unittest.mock import patch
+import os
+import sqlite3
+import tempfile
+import time
+
+
+def routed_to():
+    """The alias a read of reports would use"""
+    return ReplicaRouter().db_for_read(WasteReport)
+
+
+@override_settings(REPLICA_DATABASE='replica', REPLICA_MAX_LAG=30)
+class ReplicaRoutingTest(SimpleTestCase):
+    """Test cases for choosing between the replica and the primary"""
+
+    def setUp(self):
+        patcher = patch('core.replica.replica_heartbeat', return_value=time.time() - 5)
+        self.heartbeat = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fresh_replica(self):
+        """Test reads inside the block go to a fresh replica and writes to the primary"""
+        self.assertIsNone(routed_to())
+        with reading_from_replica() as alias:
+            self.assertEqual(alias, 'replica')
+            self.assertEqual(routed_to(), 'replica')
+            self.assertEqual(ReplicaRouter().db_for_write(WasteReport), 'default')
+        self.assertIsNone(routed_to())
+
+    def test_staleness_bound(self):
+        """Test a replica lagging more than REPLICA_MAX_LAG, or of unknown lag, is not used"""
+        self.heartbeat.return_value = time.time() - 31
+        with reading_from_replica():
+            self.assertIsNone(routed_to())
+        self.heartbeat.return_value = None
+        with reading_from_replica():
+            self.assertIsNone(routed_to())
+
+    def test_read_after_write(self):
+        """Test a client reads from the primary until the replica has their last write"""
+        with reading_from_replica(not_before=time.time()):
+            self.assertIsNone(routed_to())
+        with reading_from_replica(not_before=time.time() - 10):
+            self.assertEqual(routed_to(), 'replica')
+
+    @override_settings(REPLICA_DATABASE=None)
+    def test_disabled(self):
+        """Test nothing is routed without REPLICA_DATABASE"""
+        with reading_from_replica():
+            self.assertIsNone(routed_to())
+        self.assertIsNone(ReplicaRouter().db_for_write(WasteReport))
+        self.heartbeat.assert_not_called()
+
+    def test_decorator(self):
+        """Test decorated views read from the replica, including streamed content"""
+        def view(request):
+            return HttpResponse(routed_to())
+
+        def streaming_view(request):
+            return StreamingHttpResponse(routed_to() for _ in range(2))
+
+        request = RequestFactory().get('/')
+        request.session = {}
+        self.assertEqual(replica_reads(view)(request).content, b'replica')
+        self.assertEqual(b''.join(replica_reads(streaming_view)(request).streaming_content), b'replicareplica')
+
+        request.session = {PIN_KEY: time.time()}
+        self.assertEqual(replica_reads(view)(request).content, b'None')
+
+    async def test_decorator_asgi_streaming(self):
+        """Test content streamed chunk by chunk under ASGI still reads from the replica"""
+        def streaming_view(request):
+            return stream_for(request, StreamingHttpResponse(routed_to() for _ in range(2)))
+
+        request = AsyncRequestFactory().get('/')
+        request.session = {}
+        response = await sync_to_async(replica_reads(streaming_view))(request)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response]), b'replicareplica')
+
+    def test_migrations(self):
+        """Test migrations never run on the replica"""
+        self.assertIs(ReplicaRouter().allow_migrate('replica', 'core'), False)
+        self.assertIsNone(ReplicaRouter().allow_migrate('default', 'core'))
+
+
+class ReplicaHeartbeatTest(TestCase):
+    """Test cases for measuring replica lag"""
+
+    def setUp(self):
+        replica._heartbeats.clear()
+        self.addCleanup(replica._heartbeats.clear)
+
+    def test_heartbeat(self):
+        """Test the heartbeat written on the primary is read back and reused briefly"""
+        self.assertIsNone(replica.replica_heartbeat('default'))
+        replica._heartbeats.clear()
+        replica.write_heartbeat()
+        self.assertAlmostEqual(replica.replica_heartbeat('default'), time.time(), delta=5)
+        with self.assertNumQueries(0):
+            replica.replica_heartbeat('default')
+
+    def test_copy_database(self):
+        """Test a SQLite database is copied into a replica that is being read"""
+        with tempfile.TemporaryDirectory() as directory:
+            source, target = os.path.join(directory, 'primary.sqlite3'), os.path.join(directory, 'replica.sqlite3')
+            primary = sqlite3.connect(source)
+            primary.execute('CREATE TABLE report (id INTEGER PRIMARY KEY)')
+            primary.execute('INSERT INTO report VALUES (1)')
+            primary.commit()
+            copy_database(source, target)
+            reader = sqlite3.connect(target)
+            try:
+                self.assertEqual(reader.execute('SELECT COUNT(*) FROM report').fetchone()[0], 1)
+                primary.execute('INSERT INTO report VALUES (2)')
+                primary.commit()
+                copy_database(source, target)
+                self.assertEqual(reader.execute('SELECT COUNT(*) FROM report').fetchone()[0], 2)
+            finally:
+                reader.close()
+                primary.close()
+
+
+class ReplicaPinTest(TestCase):
+    """Test cases for sending clients that wrote to the primary"""
+
+    def setUp(self):
+        """Set up a citizen with a center to report to"""
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        RecyclingCenter.objects.create(
+            name='Test Center',
+            address='123 Test St',
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0'),
+            materials_accepted='All',
+            working_hours='24/7'
+        )
+
+    @override_settings(REPLICA_DATABASE='replica')
+    def test_submission_pins_to_primary(self):
+        """Test the report list right after a submission is read from the primary"""
+        client = Client()
+        client.login(username='citizen', password='testpass123')
+        self.assertNotIn(PIN_KEY, client.session)
+        with patch('core.replica.replica_heartbeat', return_value=time.time() - 1):
+            response = client.post(reverse('submit_report'), {
+                'description': 'Fresh report',
+                'latitude': '40.7',
+                'longitude': '-74.0',
+            }, follow=True)
+        self.assertContains(response, 'Fresh report')
+        self.assertGreater(client.session[PIN_KEY], time.time() - 5)
+
+    def test_disabled(self):
+        """Test sessions are left alone without a replica"""
+        client = Client()
+        client.login(username='citizen', password='testpass123')
+        client.post(reverse('submit_report'), {'description': 'Report', 'latitude': '40.7', 'longitude': '-74.0'})
+        self.assertNotIn(PIN_KEY, client.session)
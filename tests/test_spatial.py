@@ -0,0 +1,212 @@
+from django.test import TestCase
+from core.models import RecyclingCenter
+from core.distance import haversine, haversine_matrix
+from core.spatial import CenterIndex, get_center_index
+from core.views import find_nearest_center, calculate_distance
+from decimal import Decimal
+import numpy as np
+import random
+from unittest import mock
+
+
+class HaversineEngineTest(TestCase):
+    """Parity tests between the vectorized engine and calculate_distance"""
+
+    def setUp(self):
+        """Generate random coordinate pairs"""
+        rng = random.Random(3)
+        self.origins = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(20)]
+        self.destinations = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(50)]
+
+    def test_scalar_parity(self):
+        """Test scalar inputs give the same result as calculate_distance"""
+        for (lat1, lon1), (lat2, lon2) in zip(self.origins, self.destinations):
+            self.assertAlmostEqual(
+                float(haversine(lat1, lon1, lat2, lon2)),
+                calculate_distance(lat1, lon1, lat2, lon2),
+                places=9
+            )
+
+    def test_vector_parity(self):
+        """Test one origin against many destinations"""
+        lat, lon = self.origins[0]
+        destinations = np.array(self.destinations)
+        distances = haversine(lat, lon, destinations[:, 0], destinations[:, 1])
+        expected = [calculate_distance(lat, lon, d_lat, d_lon) for d_lat, d_lon in self.destinations]
+        np.testing.assert_allclose(distances, expected, rtol=1e-12, atol=1e-9)
+
+    def test_matrix_parity(self):
+        """Test the M x N distance matrix"""
+        matrix = haversine_matrix(self.origins, self.destinations)
+        self.assertEqual(matrix.shape, (20, 50))
+        expected = [
+            [calculate_distance(o_lat, o_lon, d_lat, d_lon) for d_lat, d_lon in self.destinations]
+            for o_lat, o_lon in self.origins
+        ]
+        np.testing.assert_allclose(matrix, expected, rtol=1e-12, atol=1e-9)
+
+    def test_decimal_inputs(self):
+        """Test model Decimal coordinates are accepted"""
+        distance = haversine(Decimal('40.7'), Decimal('-74.0'), Decimal('40.712'), Decimal('-74.006'))
+        self.assertAlmostEqual(float(distance), calculate_distance(40.7, -74.0, 40.712, -74.006), places=9)
+
+    def test_antipodal_points(self):
+        """Test half the circumference is returned for antipodes"""
+        self.assertAlmostEqual(float(haversine(0, 0, 0, 180)), calculate_distance(0, 0, 0, 180), places=6)
+
+
+class CenterIndexTest(TestCase):
+    """Test cases for the in-process spatial index"""
+
+    def setUp(self):
+        """Build an index over random points around the globe"""
+        rng = random.Random(7)
+        self.rows = [
+            (i, rng.uniform(-89, 89), rng.uniform(-180, 180))
+            for i in range(2000)
+        ]
+        self.index = CenterIndex(self.rows)
+
+    def linear_nearest(self, latitude, longitude):
+        return min(
+            self.rows,
+            key=lambda row: calculate_distance(latitude, longitude, row[1], row[2])
+        )[0]
+
+    def test_nearest_matches_linear_scan(self):
+        """Test index answers agree with a brute-force haversine scan"""
+        rng = random.Random(11)
+        for _ in range(200):
+            latitude, longitude = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            center_id, distance = self.index.nearest(latitude, longitude)[0]
+            expected_id = self.linear_nearest(latitude, longitude)
+            expected = self.rows[expected_id]
+            self.assertAlmostEqual(
+                distance,
+                calculate_distance(latitude, longitude, expected[1], expected[2]),
+                places=6
+            )
+
+    def test_k_nearest_sorted_by_distance(self):
+        """Test k-nearest results are ordered closest first"""
+        results = self.index.nearest(24.7, 46.7, k=10)
+        self.assertEqual(len(results), 10)
+        distances = [distance for _, distance in results]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_radius_matches_linear_scan(self):
+        """Test radius queries return exactly the centers within range"""
+        results = self.index.nearest(10, 20, k=len(self.rows), radius_km=1500)
+        expected = sorted(
+            row[0] for row in self.rows
+            if calculate_distance(10, 20, row[1], row[2]) <= 1500
+        )
+        self.assertEqual(sorted(center_id for center_id, _ in results), expected)
+        self.assertTrue(all(distance <= 1500 for _, distance in results))
+
+    def test_material_filter(self):
+        """Test results can be restricted to centers accepting materials"""
+        index = CenterIndex([
+            (1, 0, 0, 'Plastic, Glass'),
+            (2, 0, 0.1, 'Paper'),
+            (3, 0, 0.2, 'plastic, paper'),
+        ])
+        self.assertEqual([i for i, _ in index.nearest(0, 0, k=3, materials=['paper'])], [2, 3])
+        self.assertEqual([i for i, _ in index.nearest(0, 0, k=3, materials=['Plastic', 'paper'])], [3])
+
+    def test_material_filter_matches_linear_scan(self):
+        """Test filtered queries on the per-material trees find the same centers as a scan"""
+        rng = random.Random(11)
+        names = ['plastic', 'paper', 'glass', 'batteries']
+        rows = [
+            (i, rng.uniform(-60, 60), rng.uniform(-180, 180),
+             ', '.join(name for name in names if rng.random() < (0.02 if name == 'batteries' else 0.5)))
+            for i in range(2000)
+        ]
+        index = CenterIndex(rows)
+        for materials in (['batteries'], ['paper', 'glass'], ['Batteries', 'plastic']):
+            wanted = {material.lower() for material in materials}
+            expected = sorted(
+                (calculate_distance(10, 20, row[1], row[2]), row[0]) for row in rows
+                if wanted <= {name.strip() for name in row[3].split(',')}
+            )[:5]
+            results = index.nearest(10, 20, k=5, materials=materials)
+            self.assertEqual([center_id for center_id, _ in results], [center_id for _, center_id in expected])
+        self.assertEqual(index.nearest(10, 20, k=5, materials=['uranium']), [])
+        self.assertNotIn('uranium', index.material_trees)
+
+    def test_antimeridian(self):
+        """Test points on either side of the antimeridian are neighbours"""
+        index = CenterIndex([(1, 0, 179.9), (2, 0, 170)])
+        center_id, distance = index.nearest(0, -179.9)[0]
+        self.assertEqual(center_id, 1)
+        self.assertLess(distance, 25)
+
+    def test_empty_index(self):
+        """Test an empty index returns no results"""
+        self.assertEqual(CenterIndex([]).nearest(0, 0), [])
+        self.assertEqual(CenterIndex([]).nearest_many([0, 1], [0, 1]), [None, None])
+
+    def test_nearest_many_matches_linear_scan(self):
+        """Test batched lookups agree with a brute-force scan, across blocks"""
+        rng = random.Random(13)
+        points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(300)]
+        expected = [self.linear_nearest(latitude, longitude) for latitude, longitude in points]
+        self.assertEqual(self.index.nearest_many(*zip(*points)), expected)
+        with mock.patch('core.spatial.BLOCK_ELEMENTS', 7 * len(self.rows)):
+            self.assertEqual(self.index.nearest_many(*zip(*points)), expected)
+        self.assertEqual(self.index.nearest_many([], []), [])
+
+
+class FindNearestCenterTest(TestCase):
+    """Test cases for nearest center assignment"""
+
+    def setUp(self):
+        """Set up test centers"""
+        self.center = RecyclingCenter.objects.create(
+            name='Manhattan Center',
+            address='123 Main St',
+            latitude=Decimal('40.712776'),
+            longitude=Decimal('-74.005974'),
+            materials_accepted='Plastic, Glass',
+            working_hours='Mon-Fri: 9AM-5PM'
+        )
+
+    def test_no_centers(self):
+        """Test no center is returned when none exist"""
+        RecyclingCenter.objects.all().delete()
+        self.assertIsNone(find_nearest_center(40.7, -74.0))
+
+    def test_index_rebuilt_on_save(self):
+        """Test a newly created center is found without restarting"""
+        self.assertEqual(find_nearest_center(34.05, -118.24), self.center)
+        la_center = RecyclingCenter.objects.create(
+            name='LA Center',
+            address='456 Sunset Blvd',
+            latitude=Decimal('34.052235'),
+            longitude=Decimal('-118.243683'),
+            materials_accepted='Metal',
+            working_hours='24/7'
+        )
+        self.assertEqual(find_nearest_center(34.05, -118.24), la_center)
+
+    def test_index_rebuilt_on_move_and_delete(self):
+        """Test moved and deleted centers are reflected in the index"""
+        other = RecyclingCenter.objects.create(
+            name='Other Center',
+            address='789 Elm St',
+            latitude=Decimal('51.5'),
+            longitude=Decimal('-0.12'),
+            materials_accepted='Paper',
+            working_hours='24/7'
+        )
+        self.assertEqual(find_nearest_center(51.5, -0.1), other)
+
+        self.center.latitude = Decimal('51.501')
+        self.center.longitude = Decimal('-0.101')
+        self.center.save()
+        self.assertEqual(find_nearest_center(51.501, -0.101), self.center)
+
+        self.center.delete()
+        self.assertEqual(find_nearest_center(51.501, -0.101), other)
+        self.assertEqual(len(get_center_index()), 1)
@@ -0,0 +1,59 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from core.sqlite import apply_pragmas, pragma_statements
+from io import StringIO
+import os
+import sqlite3
+import tempfile
+import unittest
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite connection tuning')
+class SQLitePragmaTest(TestCase):
+    """Test cases for SQLite connection tuning"""
+
+    def test_connections_are_tuned(self):
+        """Test new connections get the configured pragmas"""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_wal_on_file_databases(self):
+        """Test the pragmas switch a database file to WAL with normal syncing"""
+        with tempfile.TemporaryDirectory() as directory:
+            raw = sqlite3.connect(os.path.join(directory, 'test.sqlite3'))
+            try:
+                apply_pragmas(raw, {'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+                self.assertEqual(raw.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+                self.assertEqual(raw.execute('PRAGMA synchronous').fetchone()[0], 1)
+            finally:
+                raw.close()
+
+
+class PragmaValidationTest(SimpleTestCase):
+    """Test cases for pragma settings validation"""
+
+    def test_statements(self):
+        """Test valid pragmas become statements and anything else is refused"""
+        self.assertEqual(
+            pragma_statements({'busy_timeout': 100, 'journal_mode': 'WAL'}),
+            ['PRAGMA busy_timeout = 100', 'PRAGMA journal_mode = WAL'],
+        )
+        for pragmas in ({'foreign_keys': 0}, {'journal_mode': 'WAL; DROP TABLE x'}, {'cache_size': True}):
+            with self.assertRaises(ImproperlyConfigured):
+                pragma_statements(pragmas)
+
+
+class BenchmarkSQLiteTest(SimpleTestCase):
+    """Test the SQLite benchmark command runs"""
+
+    def test_benchmark(self):
+        """Test both configurations are measured on scratch databases"""
+        out = StringIO()
+        call_command('benchmark_sqlite', readers=1, writers=1, seconds=0.2, rows=100, stdout=out)
+        self.assertIn('defaults', out.getvalue())
+        self.assertIn('Scratch databases removed', out.getvalue())
@@ -1,8 +1,25 @@
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from accounts.models import User
+from core.context import SESSION_KEY
+from core.counters import get_counts, verify_counts
+from core.grid import tile_for_point
+from core.heatmap import tile_cells
+from core.ingest import MAX_BATCH_SIZE
+from core.pagination import MAX_PAGE_SIZE
 from core.models import RecyclingCenter, WasteReport
+from core.spatial import CenterIndex
 from decimal import Decimal
+from unittest.mock import patch
+from urllib.parse import parse_qs
+import base64
+import json
+import os
+import shutil
+import tempfile
 
 
 class AuthenticationViewTest(TestCase):
@@ -125,6 +142,94 @@ class StaffViewTest(TestCase):
         self.assertTemplateUsed(response, 'staff/view_reports.html')
 
 
+class StaffCenterContextTest(TestCase):
+    """Test cases for the per-request staff center lookup and its session cache"""
+    
+    def setUp(self):
+        """Set up a staff member with a center holding one report, and a cache shared by processes"""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        settings_override = override_settings(STAFF_CENTER_SESSION_CACHE=True, CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cache_dir,
+        }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = Client()
+        self.staff = User.objects.create_user(username='staff', email='staff@test.com', password='testpass123', role='staff')
+        citizen = User.objects.create_user(username='citizen', email='citizen@test.com', password='testpass123', role='citizen')
+        self.center = RecyclingCenter.objects.create(
+            name='Test Center',
+            address='123 Test St',
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0'),
+            materials_accepted='All',
+            working_hours='24/7',
+            assigned_staff=self.staff
+        )
+        self.report = WasteReport.objects.create(
+            citizen=citizen, center=self.center, description='Bins',
+            latitude=Decimal('40.7'), longitude=Decimal('-74.0')
+        )
+        self.client.login(username='staff', password='testpass123')
+    
+    def assertPageQueries(self, url, count):
+        """Fetch a page twice and check the second, cached request makes ``count`` queries"""
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(count):
+            self.assertEqual(self.client.get(url).status_code, 200)
+    
+    def test_staff_pages_skip_the_center_lookup(self):
+        """Test staff pages only query the session, the user and their own data"""
+        # Session and user, plus the counters and recent reports
+        self.assertPageQueries(reverse('staff_dashboard'), 4)
+        # Session and user, plus one page of reports
+        self.assertPageQueries(reverse('view_reports'), 3)
+        # Session and user, plus the report with its citizen and its confirmations
+        self.assertPageQueries(reverse('update_report_status', args=[self.report.pk]), 4)
+        # Session and user; the form is bound to the cached center
+        self.assertPageQueries(reverse('update_center_info'), 2)
+    
+    def test_without_session_cache(self):
+        """Test the center is looked up once per request when not cached"""
+        with self.settings(STAFF_CENTER_SESSION_CACHE=False):
+            self.assertPageQueries(reverse('view_reports'), 4)
+    
+    def test_not_cached_with_local_memory_cache(self):
+        """Test a per-process cache cannot carry invalidations, so centers are not cached"""
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertPageQueries(reverse('view_reports'), 4)
+            self.assertNotIn(SESSION_KEY, self.client.session)
+    
+    def test_reassignment_invalidates(self):
+        """Test cached centers are dropped when a center is edited or reassigned"""
+        self.client.get(reverse('staff_dashboard'))
+        self.center.name = 'Renamed Center'
+        self.center.save()
+        self.assertContains(self.client.get(reverse('staff_dashboard')), 'Renamed Center')
+        
+        other = User.objects.create_user(username='other', email='other@test.com', password='testpass123', role='staff')
+        self.center.assigned_staff = other
+        self.center.save()
+        response = self.client.get(reverse('update_report_status', args=[self.report.pk]))
+        self.assertRedirects(response, reverse('staff_dashboard'))
+    
+    def test_cached_center_can_be_saved(self):
+        """Test the center form updates the row behind a center restored from the session"""
+        self.client.get(reverse('staff_dashboard'))
+        response = self.client.post(reverse('update_center_info'), {
+            'name': 'New Name',
+            'address': '1 New St',
+            'latitude': '40.700000',
+            'longitude': '-74.000000',
+            'materials_accepted': 'Glass',
+            'working_hours': '24/7',
+        })
+        self.assertRedirects(response, reverse('staff_dashboard'))
+        self.assertEqual(RecyclingCenter.objects.get().name, 'New Name')
+        self.assertEqual(RecyclingCenter.objects.count(), 1)
+
+
 class AdminViewTest(TestCase):
     """Test cases for admin views"""
     
@@ -199,3 +304,430 @@ class PermissionTest(TestCase):
         """Test unauthenticated users are redirected"""
         response = self.client.get(reverse('citizen_dashboard'))
         self.assertEqual(response.status_code, 302)  # Redirect to login
+
+
+class NearbyCentersAPITest(TestCase):
+    """Test cases for the nearby centers JSON endpoint"""
+    
+    def setUp(self):
+        """Set up test client, citizen and centers"""
+        self.client = Client()
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.client.login(username='citizen', password='testpass123')
+        self.near = RecyclingCenter.objects.create(
+            name='Near Center',
+            address='1 Near St',
+            latitude=Decimal('40.712776'),
+            longitude=Decimal('-74.005974'),
+            materials_accepted='Plastic, Glass',
+            working_hours='24/7'
+        )
+        self.middle = RecyclingCenter.objects.create(
+            name='Middle Center',
+            address='2 Middle St',
+            latitude=Decimal('40.730610'),
+            longitude=Decimal('-73.935242'),
+            materials_accepted='Paper, Metal',
+            working_hours='24/7'
+        )
+        self.far = RecyclingCenter.objects.create(
+            name='Far Center',
+            address='3 Far St',
+            latitude=Decimal('34.052235'),
+            longitude=Decimal('-118.243683'),
+            materials_accepted='Plastic',
+            working_hours='24/7'
+        )
+        self.url = reverse('nearby_centers_api')
+    
+    def test_k_nearest_sorted(self):
+        """Test k nearest centers are returned closest first"""
+        response = self.client.get(self.url, {'lat': '40.71', 'lon': '-74.0', 'k': '2'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([c['id'] for c in data['results']], [self.near.id, self.middle.id])
+        self.assertLessEqual(data['results'][0]['distance_km'], data['results'][1]['distance_km'])
+    
+    def test_radius_search(self):
+        """Test only centers inside the radius are returned"""
+        response = self.client.get(self.url, {'lat': '40.71', 'lon': '-74.0', 'radius_km': '10'})
+        ids = [c['id'] for c in response.json()['results']]
+        self.assertEqual(ids, [self.near.id, self.middle.id])
+    
+    def test_material_filter(self):
+        """Test centers not accepting the material are skipped"""
+        response = self.client.get(self.url, {'lat': '40.71', 'lon': '-74.0', 'k': '2', 'material': 'plastic'})
+        ids = [c['id'] for c in response.json()['results']]
+        self.assertEqual(ids, [self.near.id, self.far.id])
+    
+    def test_truncated(self):
+        """Test the response says when more centers matched than were returned"""
+        data = self.client.get(self.url, {'lat': '40.71', 'lon': '-74.0', 'radius_km': '10'}).json()
+        self.assertFalse(data['truncated'])
+        with patch('core.views.NEARBY_MAX_RESULTS', 1):
+            data = self.client.get(self.url, {'lat': '40.71', 'lon': '-74.0', 'radius_km': '10'}).json()
+        self.assertEqual(([c['id'] for c in data['results']], data['truncated']), ([self.near.id], True))
+        data = self.client.get(self.url, {'lat': '40.71', 'lon': '-74.0', 'k': '3'}).json()
+        self.assertEqual((data['count'], data['truncated']), (3, False))
+    
+    def test_stale_index(self):
+        """Test centers missing from the database are replaced by the next nearest"""
+        index = CenterIndex([
+            (center.id, center.latitude, center.longitude, center.materials_accepted)
+            for center in (self.near, self.middle, self.far)
+        ] + [(10 ** 6, Decimal('40.71'), Decimal('-74.0'), 'Plastic')])
+        with patch('core.views.get_center_index', return_value=index):
+            data = self.client.get(self.url, {'lat': '40.71', 'lon': '-74.0', 'k': '2'}).json()
+        self.assertEqual([c['id'] for c in data['results']], [self.near.id, self.middle.id])
+        self.assertTrue(data['truncated'])
+    
+    def test_invalid_parameters(self):
+        """Test missing or out-of-range parameters are rejected"""
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'lat': '91', 'lon': '0'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'lat': '0', 'lon': '0', 'k': '0'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'lat': '0', 'lon': '0', 'radius_km': '-1'}).status_code, 400)
+
+
+class BatchReportsAPITest(TestCase):
+    """Test cases for the batch report ingestion endpoint"""
+    
+    def setUp(self):
+        """Set up test client, citizen and two centers"""
+        self.client = Client()
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.client.login(username='citizen', password='testpass123')
+        self.new_york = RecyclingCenter.objects.create(
+            name='New York Center',
+            address='1 Broadway',
+            latitude=Decimal('40.712776'),
+            longitude=Decimal('-74.005974'),
+            materials_accepted='All',
+            working_hours='24/7'
+        )
+        self.london = RecyclingCenter.objects.create(
+            name='London Center',
+            address='1 Strand',
+            latitude=Decimal('51.507351'),
+            longitude=Decimal('-0.127758'),
+            materials_accepted='All',
+            working_hours='24/7'
+        )
+    
+    def post(self, items):
+        return self.client.post(reverse('batch_reports_api'), json.dumps(items), content_type='application/json')
+    
+    def items(self, count, latitude='40.7'):
+        return [
+            {'description': f'Survey point {i}', 'latitude': latitude, 'longitude': f'{-74.0 + i / 1000:.6f}'}
+            for i in range(count)
+        ]
+    
+    def test_mixed_batch(self):
+        """Test valid items are created with their nearest center and invalid ones reported"""
+        response = self.post([
+            {'description': 'Near Times Square', 'latitude': '40.758', 'longitude': '-73.985'},
+            {'description': 'Near the Thames', 'latitude': 51.5, 'longitude': -0.12},
+            {'description': '', 'latitude': '40.7', 'longitude': '-74.0'},
+            {'description': 'No location'},
+            'not an object',
+        ])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['created'], data['invalid']), (2, 3))
+        
+        results = data['results']
+        self.assertEqual([result['index'] for result in results], [0, 1, 2, 3, 4])
+        self.assertEqual(results[0]['center'], self.new_york.id)
+        self.assertEqual(results[1]['center'], self.london.id)
+        self.assertIn('description', results[2]['errors'])
+        self.assertIn('latitude', results[3]['errors'])
+        self.assertIn('__all__', results[4]['errors'])
+        
+        report = WasteReport.objects.get(pk=results[1]['id'])
+        self.assertEqual((report.citizen, report.center, report.status), (self.citizen, self.london, 'pending'))
+        self.assertEqual(get_counts('citizen', self.citizen.id)['pending'], 2)
+        self.assertEqual(get_counts('center', self.london.id)['total'], 1)
+        self.assertEqual(verify_counts(), {})
+    
+    def test_queries_do_not_grow_with_batch_size(self):
+        """Test a batch is validated, assigned and inserted in bulk"""
+        self.post(self.items(1))
+        # Batches elsewhere, so they do not duplicate the earlier reports
+        with CaptureQueriesContext(connection) as small:
+            self.post(self.items(5, latitude='40.8'))
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.post(self.items(50, latitude='40.9')).json()['created'], 50)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(WasteReport.objects.count(), 56)
+    
+    def test_invalid_requests(self):
+        """Test malformed bodies, empty and oversized batches and other roles are refused"""
+        response = self.client.post(reverse('batch_reports_api'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post({'description': 'x'}).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post(self.items(MAX_BATCH_SIZE + 1)).status_code, 400)
+        self.assertEqual(self.client.get(reverse('batch_reports_api')).status_code, 405)
+        
+        User.objects.create_user(username='staff', email='staff@test.com', password='testpass123', role='staff')
+        self.client.login(username='staff', password='testpass123')
+        self.assertEqual(self.post(self.items(1)).status_code, 302)
+        self.assertFalse(WasteReport.objects.exists())
+    
+    def test_body_size(self):
+        """Test batches with several photos fit, and larger bodies get a JSON 413"""
+        photo = base64.b64encode(os.urandom(1024 * 1024)).decode()
+        items = [dict(item, image=photo, image_name='photo.jpg') for item in self.items(3)]
+        response = self.post(items)
+        self.assertEqual(response.status_code, 200)
+        # Not images, but the body was read
+        self.assertEqual(response.json()['invalid'], 3)
+        
+        # Checked by the view too, for bodies the middleware cannot measure up front
+        with self.settings(MAX_UPLOAD_SIZE=1024 * 1024), \
+                self.modify_settings(MIDDLEWARE={'remove': 'core.middleware.RequestSizeLimitMiddleware'}):
+            client = Client()
+            client.force_login(self.citizen)
+            response = client.post(reverse('batch_reports_api'), json.dumps(items), content_type='application/json')
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('fewer reports', response.json()['error'])
+        self.assertFalse(WasteReport.objects.exists())
+        
+        # Other endpoints keep Django's limit on bodies read into memory
+        response = Client().post(reverse('login'), {'username': 'x' * (3 * 1024 * 1024), 'password': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ReportHeatmapAPITest(TestCase):
+    """Test cases for the clustered report heatmap endpoint"""
+    
+    def setUp(self):
+        """Set up admin client and reports"""
+        cache.clear()
+        self.client = Client()
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@test.com',
+            password='testpass123',
+            role='admin'
+        )
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.client.login(username='admin', password='testpass123')
+        self.reports = [
+            WasteReport.objects.create(
+                citizen=self.citizen,
+                description=f'Report {i}',
+                latitude=Decimal('40.712'),
+                longitude=Decimal('-74.006'),
+                status=status
+            )
+            for i, status in enumerate(['pending', 'pending', 'completed'])
+        ]
+        WasteReport.objects.create(
+            citizen=self.citizen,
+            description='Far away',
+            latitude=Decimal('-33.86'),
+            longitude=Decimal('151.2'),
+        )
+    
+    def get_cells(self, z, latitude=40.712, longitude=-74.006):
+        x, y = tile_for_point(z, latitude, longitude)
+        response = self.client.get(reverse('report_heatmap_api', args=[z, x, y]))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['cells']
+    
+    def test_world_tile_counts_every_report(self):
+        """Test the zoom 0 tile aggregates all reports"""
+        cells = self.get_cells(0)
+        self.assertEqual(sum(cell['count'] for cell in cells), 4)
+    
+    def test_cell_status_breakdown(self):
+        """Test a cell reports its count and status breakdown"""
+        cells = self.get_cells(12)
+        self.assertEqual(len(cells), 1)
+        self.assertEqual(cells[0]['count'], 3)
+        self.assertEqual(cells[0]['statuses'], {'pending': 2, 'in_progress': 0, 'completed': 1})
+    
+    def test_tiles_cached(self):
+        """Test a cached tile is served without querying reports"""
+        x, y = tile_for_point(8, 40.712, -74.006)
+        tile_cells(8, x, y)
+        with self.assertNumQueries(0):
+            tile_cells(8, x, y)
+    
+    def test_status_change_invalidates_tile(self):
+        """Test a status update evicts the tiles holding the report"""
+        self.get_cells(12)
+        report = WasteReport.objects.get(pk=self.reports[0].pk)
+        report.status = 'in_progress'
+        report.save()
+        cells = self.get_cells(12)
+        self.assertEqual(cells[0]['statuses'], {'pending': 1, 'in_progress': 1, 'completed': 1})
+    
+    def test_move_with_status_change_invalidates_each_point_once(self):
+        """Test a report changing status and location at once evicts both points, each once"""
+        report = WasteReport.objects.get(pk=self.reports[0].pk)
+        report.status = 'in_progress'
+        report.latitude = Decimal('41.0')
+        with patch('core.heatmap.invalidate_point') as invalidate_point:
+            report.save()
+        self.assertCountEqual(
+            [call.args for call in invalidate_point.call_args_list],
+            [(Decimal('41.0'), Decimal('-74.006')), (Decimal('40.712'), Decimal('-74.006'))]
+        )
+    
+    def test_new_and_deleted_reports_invalidate_tile(self):
+        """Test creating and deleting reports evicts their tiles"""
+        self.get_cells(12)
+        WasteReport.objects.create(
+            citizen=self.citizen,
+            description='New report',
+            latitude=Decimal('40.712'),
+            longitude=Decimal('-74.006'),
+        )
+        self.assertEqual(self.get_cells(12)[0]['count'], 4)
+        self.reports[0].delete()
+        self.assertEqual(self.get_cells(12)[0]['count'], 3)
+    
+    def test_out_of_range_tile(self):
+        """Test tiles outside the zoom grid are rejected"""
+        response = self.client.get(reverse('report_heatmap_api', args=[2, 4, 0]))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('report_heatmap_api', args=[30, 0, 0]))
+        self.assertEqual(response.status_code, 400)
+    
+    def test_citizen_cannot_access(self):
+        """Test the heatmap is admin only"""
+        self.client.login(username='citizen', password='testpass123')
+        response = self.client.get(reverse('report_heatmap_api', args=[0, 0, 0]))
+        self.assertNotEqual(response.status_code, 200)
+
+
+class KeysetPaginationTest(TestCase):
+    """Test cases for cursor pagination of the list views"""
+    
+    def setUp(self):
+        """Set up an admin and reports sharing timestamps"""
+        self.client = Client()
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@test.com',
+            password='testpass123',
+            role='admin'
+        )
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        for i in range(7):
+            WasteReport.objects.create(
+                citizen=self.citizen,
+                description=f'Report {i}',
+                latitude=Decimal('40.7'),
+                longitude=Decimal('-74.0'),
+                status='pending' if i % 2 else 'completed'
+            )
+        # Identical timestamps force the id tie-breaker to matter
+        first = WasteReport.objects.order_by('id').first()
+        WasteReport.objects.filter(id__lte=first.id + 3).update(created_at=first.created_at)
+        self.client.login(username='admin', password='testpass123')
+    
+    def walk(self, params, direction='next'):
+        """Follow cursors from the page at params, returning report ids per page"""
+        pages = []
+        while params is not None:
+            response = self.client.get(reverse('manage_reports'), params)
+            page = response.context['reports']
+            pages.append([report.id for report in page])
+            query = page.next_query if direction == 'next' else page.previous_query
+            params = parse_qs(query) if query else None
+        return pages
+    
+    def test_pages_cover_all_rows_in_order(self):
+        """Test following next cursors visits every report once, newest first"""
+        pages = self.walk({'page_size': 3})
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        expected = list(
+            WasteReport.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(sum(pages, []), expected)
+    
+    def test_previous_cursor_returns_same_pages(self):
+        """Test walking back from the last page retraces the forward pages"""
+        forward = self.walk({'page_size': 3})
+        response = self.client.get(reverse('manage_reports'), {'page_size': 3})
+        params = parse_qs(response.context['reports'].next_query)
+        response = self.client.get(reverse('manage_reports'), params)
+        params = parse_qs(response.context['reports'].next_query)
+        backward = self.walk(params, direction='previous')
+        self.assertEqual(backward, forward[::-1])
+    
+    def test_filters_carried_through(self):
+        """Test filter parameters are kept in the cursor links"""
+        response = self.client.get(reverse('manage_reports'), {'status': 'completed', 'page_size': 2})
+        page = response.context['reports']
+        self.assertIn('status=completed', page.next_query)
+        self.assertFalse(page.has_previous)
+        pages = self.walk({'status': 'completed', 'page_size': 2})
+        self.assertEqual(sum(len(page) for page in pages), 4)
+    
+    def test_invalid_cursor_starts_over(self):
+        """Test a tampered cursor shows the first page"""
+        for cursor in ('garbage', 'eyJrIjpbIngiLCJ5Il0sImIiOmZhbHNlfQ'):
+            response = self.client.get(reverse('manage_reports'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['reports']), 7)
+    
+    def test_page_size_is_clamped(self):
+        """Test oversized page sizes are limited"""
+        response = self.client.get(reverse('manage_reports'), {'page_size': 100000})
+        self.assertEqual(response.context['reports'].page_size, MAX_PAGE_SIZE)
+    
+    def test_search_paginates_by_rank(self):
+        """Test search results page in relevance order with the query kept"""
+        WasteReport.objects.filter(description='Report 3').update(description='Report 3 report report')
+        response = self.client.get(reverse('manage_reports'), {'search': 'report', 'page_size': 5})
+        page = response.context['reports']
+        self.assertEqual(page.items[0].description, 'Report 3 report report')
+        self.assertIn('search=report', page.next_query)
+        response = self.client.get(reverse('manage_reports'), parse_qs(page.next_query))
+        self.assertEqual(len(response.context['reports']), 2)
+    
+    def test_user_and_center_lists_paginate(self):
+        """Test the user and center lists page by name"""
+        for i in range(3):
+            RecyclingCenter.objects.create(
+                name=f'Center {i}',
+                address='Somewhere',
+                latitude=Decimal('40.7'),
+                longitude=Decimal('-74.0'),
+                materials_accepted='Plastic',
+                working_hours='24/7'
+            )
+        response = self.client.get(reverse('manage_centers'), {'page_size': 2})
+        self.assertEqual([c.name for c in response.context['centers']], ['Center 0', 'Center 1'])
+        response = self.client.get(reverse('manage_centers'), parse_qs(response.context['centers'].next_query))
+        self.assertEqual([c.name for c in response.context['centers']], ['Center 2'])
+        
+        response = self.client.get(reverse('manage_users'), {'page_size': 1})
+        self.assertEqual([u.username for u in response.context['users']], ['admin'])
+        self.assertContains(response, 'Next')
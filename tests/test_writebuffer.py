@@ -0,0 +1,229 @@
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import User
+from core.models import RecyclingCenter, WasteReport
+from core.writebuffer import MAX_ATTEMPTS, SubmissionBuffer, recover_segments
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+import json
+import os
+import tempfile
+import uuid
+
+
+class SubmissionBufferTest(TestCase):
+    """Test cases for buffered report submissions
+
+    Buffers are flushed from the test instead of a committer thread, which
+    would use a connection outside the test transaction.
+    """
+
+    def setUp(self):
+        """Set up a citizen, a center and a buffer directory"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.citizen = User.objects.create_user(
+            username='citizen',
+            email='citizen@test.com',
+            password='testpass123',
+            role='citizen'
+        )
+        self.center = RecyclingCenter.objects.create(
+            name='Test Center',
+            address='123 Test St',
+            latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0'),
+            materials_accepted='All',
+            working_hours='24/7'
+        )
+
+    def make_buffer(self, **options):
+        buffer = SubmissionBuffer(self.directory, fsync=False, **options)
+        self.addCleanup(buffer.stop)
+        return buffer
+
+    def make_report(self, latitude='40.7', description='Overflowing bins'):
+        return WasteReport(
+            citizen=self.citizen,
+            description=description,
+            latitude=Decimal(latitude),
+            longitude=Decimal('-74.0')
+        )
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.log'))
+
+    def write_segment(self, records, trailer=b''):
+        path = os.path.join(self.directory, 'dead.log')
+        with open(path, 'wb') as f:
+            for record in records:
+                f.write((json.dumps(record) + '\n').encode())
+            f.write(trailer)
+        return path
+
+    def record(self, **fields):
+        record = {
+            'submission_id': uuid.uuid4().hex,
+            'citizen_id': self.citizen.pk,
+            'description': 'Logged before a crash',
+            'latitude': '40.7',
+            'longitude': '-74.0',
+            'image': '',
+            'submitted_at': timezone.now().isoformat(),
+        }
+        record.update(fields)
+        return record
+
+    def test_submit_and_flush(self):
+        """Test submissions are logged, then committed in one batch and the log emptied"""
+        buffer = self.make_buffer()
+        ids = [buffer.submit(self.make_report(latitude=f'40.7{i}')) for i in range(3)]
+        self.assertFalse(WasteReport.objects.exists())
+        self.assertEqual(len(self.segments()), 1)
+        self.assertGreater(os.path.getsize(buffer.segment.path), 0)
+
+        self.assertEqual(buffer.flush(), 3)
+        reports = list(WasteReport.objects.order_by('id'))
+        self.assertEqual([report.submission_id.hex for report in reports], ids)
+        for report in reports:
+            self.assertEqual(report.center, self.center)
+            self.assertTrue(report.geohash)
+        self.assertEqual(os.path.getsize(buffer.segment.path), 0)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_batches_are_bounded(self):
+        """Test a flush commits at most max_batch submissions"""
+        buffer = self.make_buffer(max_batch=2)
+        for i in range(3):
+            buffer.submit(self.make_report(latitude=f'40.7{i}'))
+        self.assertEqual(buffer.flush(), 2)
+        self.assertGreater(os.path.getsize(buffer.segment.path), 0)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(WasteReport.objects.count(), 3)
+
+    def test_stop_removes_drained_segment(self):
+        """Test a stopped buffer leaves no segment once everything is committed"""
+        buffer = self.make_buffer()
+        buffer.submit(self.make_report())
+        buffer.flush()
+        buffer.stop()
+        buffer.stop()
+        self.assertEqual(self.segments(), [])
+
+    def test_recover_dead_segment(self):
+        """Test a dead process's segment is replayed once, skipping a torn last line"""
+        committed = self.record()
+        self.write_segment([self.record(), committed, committed], trailer=b'{"submission_id": "ab')
+        # Committed before the process died
+        WasteReport.objects.create(
+            citizen=self.citizen, description='Committed', latitude=Decimal('40.7'),
+            longitude=Decimal('-74.0'), submission_id=uuid.UUID(committed['submission_id'])
+        )
+
+        self.assertEqual(recover_segments(self.directory), (1, 3))
+        self.assertEqual(WasteReport.objects.count(), 2)
+        self.assertEqual(self.segments(), [])
+        self.assertEqual(recover_segments(self.directory), (0, 0))
+
+    def test_live_segments_are_left_alone(self):
+        """Test recovery skips segments locked by a running buffer"""
+        buffer = self.make_buffer()
+        buffer.submit(self.make_report())
+        self.assertEqual(recover_segments(self.directory), (0, 0))
+        self.assertFalse(WasteReport.objects.exists())
+        self.assertEqual(buffer.flush(), 1)
+
+    def test_late_commits_keep_submission_time(self):
+        """Test submissions replayed later are dated when they were submitted"""
+        submitted = timezone.now() - timedelta(hours=2)
+        self.write_segment([self.record(submitted_at=submitted.isoformat())])
+        recover_segments(self.directory)
+        self.assertEqual(WasteReport.objects.get().created_at, submitted)
+
+    def dead_letters(self):
+        names = [name for name in os.listdir(self.directory) if name.endswith('.failed')]
+        records = []
+        for name in names:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                records.extend(json.loads(line) for line in f)
+        return records
+
+    def test_bad_submission_is_set_aside(self):
+        """Test a submission that cannot be committed stops holding up the others"""
+        buffer = self.make_buffer()
+        buffer.submit(self.make_report(description='Before'))
+        bad = self.record(description=None)
+        with buffer.lock:
+            buffer.pending.append((buffer.segment, bad))
+            buffer.segment.outstanding += 1
+        buffer.submit(self.make_report(latitude='41.7', description='After'))
+
+        for _ in range(MAX_ATTEMPTS - 1):
+            with self.assertRaises(IntegrityError):
+                buffer.flush()
+            self.assertFalse(WasteReport.objects.exists())
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(sorted(WasteReport.objects.values_list('description', flat=True)), ['After', 'Before'])
+        self.assertEqual([record['submission_id'] for record in self.dead_letters()], [bad['submission_id']])
+        self.assertEqual(buffer.pending, [])
+
+    def test_transient_errors_are_retried(self):
+        """Test submissions are not set aside when the database is unavailable"""
+        buffer = self.make_buffer()
+        buffer.submit(self.make_report())
+        with patch('core.writebuffer.commit_records', side_effect=OperationalError('database is locked')):
+            for _ in range(MAX_ATTEMPTS + 1):
+                with self.assertRaises(OperationalError):
+                    buffer.flush()
+        self.assertEqual(self.dead_letters(), [])
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(WasteReport.objects.count(), 1)
+
+    def test_bad_replayed_submission_is_set_aside(self):
+        """Test replaying a dead segment commits everything but the bad submission"""
+        bad = self.record(latitude='not a number')
+        self.write_segment([self.record(), bad, self.record()])
+        self.assertEqual(recover_segments(self.directory), (1, 3))
+        self.assertEqual(WasteReport.objects.count(), 2)
+        self.assertEqual(self.dead_letters(), [bad])
+        self.assertEqual(self.segments(), [])
+
+    def test_deleted_citizens_are_skipped(self):
+        """Test submissions of citizens deleted since are dropped on replay"""
+        self.write_segment([self.record(citizen_id=self.citizen.pk + 100), self.record()])
+        recover_segments(self.directory)
+        self.assertEqual(WasteReport.objects.count(), 1)
+
+    def test_submit_view(self):
+        """Test the submit view logs the report and commits it on flush"""
+        buffer = self.make_buffer()
+        client = Client()
+        client.login(username='citizen', password='testpass123')
+        with override_settings(SUBMISSION_BUFFER={'DIRECTORY': self.directory}), \
+                patch('core.views.get_buffer', return_value=buffer):
+            response = client.post(reverse('submit_report'), {
+                'description': 'Buffered report',
+                'latitude': '40.7',
+                'longitude': '-74.0',
+            }, follow=True)
+        self.assertRedirects(response, reverse('track_reports'))
+        self.assertContains(response, 'will appear in your reports shortly')
+        self.assertFalse(WasteReport.objects.exists())
+
+        buffer.flush()
+        report = WasteReport.objects.get()
+        self.assertEqual((report.citizen, report.description), (self.citizen, 'Buffered report'))
+
+    def test_replay_command(self):
+        """Test replay_submissions commits leftover segments"""
+        self.write_segment([self.record(), self.record()])
+        out = StringIO()
+        call_command('replay_submissions', directory=self.directory, stdout=out)
+        self.assertIn('Replayed 2 submissions from 1 logs', out.getvalue())
+        self.assertEqual(WasteReport.objects.count(), 2)
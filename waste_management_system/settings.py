@@ -44,12 +44,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.RequestSizeLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RequestActorMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RateLimitMiddleware',
 ]
 
 ROOT_URLCONF = 'waste_management_system.urls'
@@ -80,7 +84,33 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Read replica for dashboards, statistics and lists (see core/replica.py). Locally a
+    # snapshot of the primary, refreshed with `python manage.py refresh_replica --every 5`.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_ROUTERS = ['core.replica.ReplicaRouter']
+
+# Alias read-only views read from, or None to read everything from the primary.
+# REPLICA_MAX_LAG is the staleness bound in seconds: an older replica is not used.
+REPLICA_DATABASE = None
+REPLICA_MAX_LAG = 30
+
+# Pragmas run on every new SQLite connection (see core/sqlite.py). WAL lets readers
+# work during writes, NORMAL sync drops the fsync per commit, and busy_timeout waits
+# for locks instead of raising "database is locked". Set to {} to leave the defaults.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Page cache per connection in KiB (negative), and bytes read through mmap
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
 }
 
 
@@ -125,6 +155,80 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Who sends media bytes once core.views.serve_media has checked permissions:
+# None streams them from Django, 'nginx' hands off with X-Accel-Redirect to the
+# internal location MEDIA_ACCEL_PREFIX (aliased to MEDIA_ROOT), and 'sendfile'
+# hands off with X-Sendfile (Apache mod_xsendfile, lighttpd)
+MEDIA_SENDFILE_BACKEND = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Queue post-submit work (image derivatives) as database jobs run by
+# `manage.py run_workers` instead of in-process threads (see core/jobs.py)
+USE_JOB_QUEUE = False
+
+# Report image derivatives (see core/derivatives.py)
+# Background threads generating thumbnails and previews; 0 runs them inline
+DERIVATIVE_WORKERS = 2
+# WEBP, or JPEG for older clients; WEBP falls back to JPEG if Pillow lacks it
+DERIVATIVE_FORMAT = 'WEBP'
+
+# Largest request body accepted, checked before it is read (see core/middleware.py).
+# The submit page shrinks photos in the browser to fit well within it.
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+# Upload normalization (see core/normalization.py); None stores uploads unchanged
+IMAGE_NORMALIZATION = {
+    # Longest side in pixels, and the JPEG/WebP quality uploads are recompressed to
+    'MAX_EDGE': 2560,
+    'QUALITY': 82,
+    # JPEG or WEBP; images with transparency are stored as PNG
+    'FORMAT': 'JPEG',
+}
+
+# Group commit for submit_report (see core/writebuffer.py). None writes each report in
+# its own transaction. When set, submissions are appended to a log in DIRECTORY and
+# acknowledged at once; a background thread writes them in one transaction every
+# FLUSH_INTERVAL_MS or MAX_BATCH reports, and logs left by a crashed process are
+# replayed. Needs fcntl (Linux, macOS).
+SUBMISSION_BUFFER = None
+# SUBMISSION_BUFFER = {
+#     'DIRECTORY': BASE_DIR / 'submission_log',
+#     'FLUSH_INTERVAL_MS': 200,
+#     'MAX_BATCH': 500,
+#     # fsync each submission before acknowledging it
+#     'FSYNC': True,
+# }
+
+# Near-duplicate reports (see core/dedupe.py): a submission within this many meters
+# of an open report created in the last DUPLICATE_WINDOW_HOURS is linked to it
+# instead of creating a new report. 0 disables the check.
+DUPLICATE_RADIUS_M = 50
+DUPLICATE_WINDOW_HOURS = 6
+
+# Token-bucket limits on POSTs to these views, per signed-in user or per client IP
+# (see core/middleware.py). Rates are requests per s/m/h/d, e.g. '10/m' or '100/5m';
+# a client may burst the full count and is then held to the average rate.
+RATE_LIMITS = {
+    'login': '10/m',
+    'register': '5/h',
+    'submit_report': '30/h',
+    'batch_reports_api': '20/h',
+}
+# Cache alias shared by all worker processes; None keeps buckets in each process,
+# at most RATE_LIMIT_MAX_KEYS of them
+RATE_LIMIT_CACHE = None
+RATE_LIMIT_MAX_KEYS = 10000
+# request.META key with the client address; behind a proxy use the header it sets,
+# e.g. 'HTTP_X_REAL_IP'. Never a header clients can set themselves.
+RATE_LIMIT_IP_META = 'REMOTE_ADDR'
+
+# Keep each staff member's assigned center in their session instead of looking it up
+# on every request (see core/context.py). Saving a center invalidates the cached
+# copies through a version token in the default cache, which must be shared by all
+# worker processes (e.g. Redis or Memcached); with the default per-process
+# LocMemCache the setting has no effect.
+STAFF_CENTER_SESSION_CACHE = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 